@@ -93,3 +93,76 @@ TASKS_SYNC_CACHE  = '%s/task_sync_cache' % RUNTIME_FILES_DIR
 
 # Automatically add nodes found with autodiscovery 
 MULTICAST_ALL = False 
+
+
+# Scheduling policy used by the Master to decide which task is given workers
+# first.  Policies included with pydra are in pydra.cluster.master.policies:
+#
+#   PriorityPolicy         - task priority, then time queued (default)
+#   AgingPolicy            - PriorityPolicy that raises the priority of tasks
+#                            that have waited for workers
+#   FairSharePolicy        - divides workers evenly between running tasks.
+#                            {'share':'task_key'} divides them between types
+#                            of tasks instead.
+#   ShortestJobFirstPolicy - favors tasks with the shortest expected remaining
+#                            runtime based on past workunit runtimes
+#
+# SCHEDULING_POLICY_ARGS are passed to the policy.  All policies accept 'aging',
+# the number of seconds a task may wait for a worker before its priority is
+# raised by one.
+SCHEDULING_POLICY = 'pydra.cluster.master.policies.PriorityPolicy'
+SCHEDULING_POLICY_ARGS = {}
+
+
+# Workunits are sent to workers in batches.  The size of a batch adapts to the
+# measured runtime of a subtask's workunits so that a batch takes roughly
+# BATCH_DURATION seconds to complete.  BATCH_SIZE is used until runtimes have
+# been measured, or always if BATCH_DURATION is None.
+BATCH_SIZE = 5
+BATCH_DURATION = 10
+
+
+# Status updates for tasks and workunits are written to the database in bulk.
+# PERSISTENCE_INTERVAL is the most seconds an update waits to be written.
+# Updates are written sooner once PERSISTENCE_LIMIT objects are waiting.
+PERSISTENCE_INTERVAL = 1
+PERSISTENCE_LIMIT = 1000
+
+
+# Allow idle workers to steal workunits that have not been started from the
+# batches of busy workers once no other work is waiting, so that a single slow
+# worker does not determine when a task completes.
+WORK_STEALING = False
+
+
+# Run duplicates of straggling workunits on idle workers once no other work is
+# waiting.  The result of whichever copy completes first is used and the other
+# copy is stopped.  A workunit straggles when it runs SPECULATION_FACTOR times
+# longer than the average runtime of its subtask, or well outside the usual
+# variation of runtimes.
+SPECULATIVE_EXECUTION = False
+SPECULATION_FACTOR = 3
+
+
+# Start a worker process for each core of a Node as soon as the Node is
+# initialized, and start a replacement whenever a worker exits.  Tasks are then
+# given to a worker that is already running instead of waiting for a new worker
+# process to start and connect.
+WORKER_POOL = True
+
+
+# Map workunits whose input is stored on a Node's local disk are given to
+# workers on that Node.  A workunit waits up to LOCALITY_DELAY seconds for a
+# local worker before it is given to a worker on another Node, unless no worker
+# is connected from its host, e.g. for input on a file server.  Other tasks are
+# still given idle workers while it waits.  0 never waits for a local worker
+# but still prefers one that is idle, None disables locality.
+LOCALITY_DELAY = 5
+
+
+# Intermediate results of MapReduce tasks using IntermediateResultsShuffle are
+# stored in SHUFFLE_DIR on the local disk of each Node.  Workers read results
+# stored on other Nodes through the Node connections, SHUFFLE_CHUNK_SIZE bytes
+# at a time.
+SHUFFLE_DIR = '%s/shuffle' % RUNTIME_FILES_DIR
+SHUFFLE_CHUNK_SIZE = 262144
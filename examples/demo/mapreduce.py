@@ -1,10 +1,11 @@
 from pydra.cluster.tasks.tasks import Task
 
 from pydra.cluster.tasks.mapreduce import MapReduceTask, \
-        IntermediateResultsFiles, IntermediateResultsSQL
+        IntermediateResultsFiles, IntermediateResultsSQL, \
+        IntermediateResultsShuffle
 
-from pydra.cluster.tasks.datasource import DatasourceDict, \
-        DatasourceDir, DatasourceSQL, SQLTableSlicer
+from pydra.cluster.tasks.slicer import DatasourceDir, SQLTableSlicer
+from pydra.cluster.tasks.datasource.backend import SQLBackend
 
 import logging
 logger = logging.getLogger('root')
@@ -28,52 +29,35 @@ class ReduceWords(Task):
     def work(self, input, output, **kwargs):
         """sum occurances of each word"""
 
-        d = {}
-
-        # WARNING the same key can appear more than once
-        for word, v in input:
-            try:
-                v = sum(v)
-            except:
-                pass
-
-            d[word] = int(v) + d.get(word, 0)
-
-        for word, num in d.iteritems():
+        for word, values in input:
             # emmit output (word, num)
-            output[word] = num
+            output[word] = sum(int(v) for v in values)
 
 
 class CountWords(MapReduceTask):
 
     datasources = \
             {
-            #'dict': DatasourceDict(
-            #    { 
-            #        "k1": ['one', 'two', 'four', 'two', 'four', 'seven'],
-            #        "k2": ['seven', 'four', 'seven', 'seven'],
-            #        "k3": ['seven', 'four', 'seven', 'seven'],
-            #    }),
-            #'sql': DatasourceSQL(user='pydra', passwd='pydra',
-            #    host='192.168.56.1', db='mapreduce'),
             'dir': DatasourceDir(dir='/var/lib/pydra/mapreduce/in'),
             'dir_i9e': DatasourceDir(dir='/var/lib/pydra/mapreduce/i9e'),
             }
 
-    #input = datasources['dict']
-
     input = datasources['dir']
 
+    #sql = SQLBackend('mysql', user='pydra', passwd='pydra',
+    #    host='192.168.56.1', db='mapreduce')
     #input = SQLTableSlicer(table='count_words_in')
-    #input.input = datasources['sql']
+    #input.input = sql
 
     output = {}
 
     map = MapWords
     reduce = ReduceWords
+    combine = ReduceWords
 
     intermediate = IntermediateResultsFiles(dir=datasources['dir_i9e'])
-    #intermediate = IntermediateResultsSQL(table='count_words_i9e', db=datasources['sql'])
+    #intermediate = IntermediateResultsSQL(table='count_words_i9e', db=sql)
+    #intermediate = IntermediateResultsShuffle()
 
     reducers = 2
     #sequential = True
@@ -41,6 +41,7 @@ class WorkerAvatar(ModuleAvatar, RSAAvatar):
     run_task_deferred = None # defered set if run_task must be delayed
     remote = None        # remote referenceable object
     finished = False     # flag indicating this worker is finished and stopping
+    pid_pending = False  # flag indicating pid must be requested from worker
 
     def __init__(self, server, name):
         self.server = server
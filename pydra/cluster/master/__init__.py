@@ -22,4 +22,5 @@ from pydra.cluster.master.node_connection_manager import NodeConnectionManager a
 from pydra.cluster.master.node_manager import NodeManager as NodeManager
 from pydra.cluster.master.worker_connection_manager import WorkerConnectionManager as WorkerConnectionManager
 from pydra.cluster.master.scheduler import TaskScheduler as TaskScheduler
+from pydra.cluster.master.shuffle import ShuffleRelay as ShuffleRelay
 
@@ -54,6 +54,7 @@ class Master(ModuleManager):
             TaskScheduler,
             TwistedWebInterface,
             NodeManager,
+            ShuffleRelay,
             MasterLogAggregator
         ]
 
@@ -0,0 +1,172 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import with_statement
+from threading import Lock
+
+from django.db import transaction
+from twisted.internet import task, threads
+
+from pydra.models import Batch
+
+# init logging
+import logging
+logger = logging.getLogger('root')
+
+
+class WriteBehindJournal(object):
+    """
+    Coalesces updates to saved models and writes them to the database in
+    bulk, outside of the thread that made the update.
+
+    Updates are recorded as the object and the names of the fields that
+    changed.  Field values are read when the journal is flushed, so repeated
+    updates to the same object are written once with its latest values.
+    Objects whose fields have the same values are written with a single
+    UPDATE, and each flush is a single transaction.
+
+    The journal is flushed every interval seconds, or sooner when more than
+    limit objects are pending.  Objects that have not been saved yet are
+    saved immediately because other records may need their id.
+    """
+
+    def __init__(self, interval=1, limit=1000):
+        """
+        @param interval - maximum seconds an update waits to be written
+        @param limit - number of pending objects that triggers a flush
+        """
+        self.interval = interval
+        self.limit = limit
+        self._lock = Lock()         # lock for pending updates
+        self._flush_lock = Lock()   # lock serializing flushes
+        self._pending = {}          # (model, id): [object, set of fields]
+        self._flush_pending = False
+        self._loop = None
+
+
+    def save(self, obj, *fields):
+        """
+        Records that fields of a model have changed.  A Batch records the
+        change for every WorkUnit it contains.
+
+        @param obj - model instance, or Batch
+        @param fields - names of the fields to write
+        """
+        if isinstance(obj, (Batch,)):
+            for workunit in obj.workunits.values():
+                self.save(workunit, *fields)
+            return
+
+        if obj.id is None:
+            obj.save()
+            return
+
+        key = (obj.__class__, obj.id)
+        with self._lock:
+            try:
+                self._pending[key][1].update(fields)
+            except KeyError:
+                self._pending[key] = [obj, set(fields)]
+            full = len(self._pending) >= self.limit
+
+        if full:
+            self.flush_later()
+
+
+    def flush_later(self):
+        """
+        Flushes the journal in a thread.  Requests made while a flush is
+        waiting to run are coalesced into it.
+        """
+        with self._lock:
+            if self._flush_pending or not self._pending:
+                return
+            self._flush_pending = True
+        threads.deferToThread(self.flush)
+
+
+    def flush(self):
+        """
+        Writes all pending updates to the database.
+
+        @returns number of objects written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flush_pending = False
+            if not pending:
+                return 0
+
+            # group objects by model and the values being written
+            updates = {}
+            for (model, id), (obj, fields) in pending.items():
+                fields = tuple(sorted(fields))
+                values = tuple([getattr(obj, field) for field in fields])
+                try:
+                    updates[(model, fields, values)].append(id)
+                except KeyError:
+                    updates[(model, fields, values)] = [id]
+
+            try:
+                self._write(updates)
+            except Exception, e:
+                # keep the updates so they are written on the next flush,
+                # unless the object has been updated again since.
+                logger.error('Failed to write %d updates: %s' % \
+                             (len(pending), e))
+                with self._lock:
+                    for key, value in pending.items():
+                        if key in self._pending:
+                            self._pending[key][1].update(value[1])
+                        else:
+                            self._pending[key] = value
+                return 0
+
+            logger.debug('Wrote %d updates in %d queries' % \
+                         (len(pending), len(updates)))
+            return len(pending)
+
+
+    @transaction.commit_on_success
+    def _write(self, updates):
+        """
+        Writes grouped updates within a single transaction
+        """
+        for (model, fields, values), ids in updates.items():
+            # limit the size of IN clauses for databases that restrict them
+            for i in range(0, len(ids), 500):
+                model.objects.filter(id__in=ids[i:i+500]) \
+                    .update(**dict(zip(fields, values)))
+
+
+    def start(self):
+        """
+        Starts flushing the journal periodically
+        """
+        self._loop = task.LoopingCall(self.flush_later)
+        self._loop.start(self.interval, now=False)
+
+
+    def stop(self):
+        """
+        Stops periodic flushes and writes any pending updates
+        """
+        if self._loop and self._loop.running:
+            self._loop.stop()
+        self.flush()
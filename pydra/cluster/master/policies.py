@@ -0,0 +1,253 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Scheduling policies used by the TaskScheduler to rank tasks.  A policy
+computes the score that orders the scheduler's queues; the task with the
+lowest score is given workers first.  The policy in use is selected with
+SCHEDULING_POLICY in pydra_settings, and configured with
+SCHEDULING_POLICY_ARGS.
+"""
+
+from datetime import datetime
+
+from twisted.internet import threads
+
+from pydra.cluster.tasks import STATUS_COMPLETE
+from pydra.models import WorkUnit
+from pydra.util import seconds
+
+# init logging
+import logging
+logger = logging.getLogger('root')
+
+
+def load_policy(path, scheduler, **kwargs):
+    """
+    Loads a SchedulingPolicy from its full class path.
+
+    @param path - path to the policy class, ie. module.Class
+    @param scheduler - TaskScheduler the policy will rank tasks for
+    @param kwargs - options passed to the policy
+    """
+    module, class_name = path.rsplit('.', 1)
+    m = __import__(module, {}, {}, [class_name])
+    return getattr(m, class_name)(scheduler, **kwargs)
+
+
+class SchedulingPolicy(object):
+    """
+    Base class for scheduling policies.  Subclasses override score() to change
+    how tasks are ranked.
+
+    All policies support aging to avoid starvation.  When aging is set, a task
+    with pending requests has its priority improved by one for every aging
+    seconds it has gone without being given a worker.
+    """
+
+    def __init__(self, scheduler, aging=None):
+        """
+        @param scheduler - TaskScheduler this policy ranks tasks for
+        @param aging - seconds without a worker that raise a task's priority
+                       by one.  None disables aging.
+        """
+        self.scheduler = scheduler
+        self.aging = aging
+
+    def dispatched(self, task_instance, job):
+        """
+        Called by the scheduler when a worker is assigned to a task.
+
+        @param task_instance - task that was given a worker
+        @param job - WorkUnit, Batch or TaskInstance that was assigned
+        """
+        task_instance.last_succ_time = datetime.now()
+
+    def priority(self, task_instance):
+        """
+        Returns the priority of a task, adjusted for the time it has been
+        starved of workers.
+        """
+        if not self.aging:
+            return task_instance.priority
+        last = task_instance.last_succ_time or task_instance.queued
+        if not last:
+            return task_instance.priority
+        starved = seconds(datetime.now() - last)
+        return task_instance.priority - int(starved / self.aging)
+
+    def score(self, task_instance):
+        """
+        Computes the score for a task.  Lower scores are scheduled first.
+        """
+        return (self.priority(task_instance), task_instance.queued)
+
+    def update(self):
+        """
+        Called periodically by the scheduler before the queues are rescored.
+        Policies that cache information should refresh it here.
+        """
+        pass
+
+
+class PriorityPolicy(SchedulingPolicy):
+    """
+    Ranks tasks by priority and then by the time they were queued.  This is
+    the default policy.
+    """
+    pass
+
+
+class AgingPolicy(PriorityPolicy):
+    """
+    PriorityPolicy with aging enabled by default, so that low priority tasks
+    are eventually scheduled while higher priority tasks are running.
+    """
+
+    def __init__(self, scheduler, aging=60):
+        PriorityPolicy.__init__(self, scheduler, aging)
+
+
+class FairSharePolicy(SchedulingPolicy):
+    """
+    Ranks tasks of equal priority by the number of workers already in use by
+    their group, so that each group receives an equal share of the cluster.
+    Tasks are grouped by task instance, or by task key when share='task_key'.
+    """
+
+    def __init__(self, scheduler, aging=None, share='task_instance'):
+        """
+        @param share - 'task_instance' gives each running task an equal share
+                       'task_key' gives each type of task an equal share
+        """
+        SchedulingPolicy.__init__(self, scheduler, aging)
+        if share not in ('task_instance', 'task_key'):
+            raise ValueError("FairSharePolicy can't share by %s" % share)
+        self.share = share
+        self._usage = {}
+
+    def group(self, task_instance):
+        if self.share == 'task_key':
+            return task_instance.task_key
+        return task_instance.id
+
+    def dispatched(self, task_instance, job):
+        SchedulingPolicy.dispatched(self, task_instance, job)
+        group = self.group(task_instance)
+        self._usage[group] = self._usage.get(group, 0) + 1
+
+    def score(self, task_instance):
+        usage = self._usage.get(self.group(task_instance), 0)
+        return (self.priority(task_instance), usage, task_instance.queued)
+
+    def update(self):
+        """
+        Recounts the workers in use by each group.  Counts are incremented as
+        workers are dispatched and recounted here to account for workers that
+        have been returned.
+        """
+        usage = {}
+        for task_instance in self.scheduler._active_tasks.values():
+            group = self.group(task_instance)
+            count = len(task_instance.running_workers)
+            if task_instance.worker:
+                count += 1
+            usage[group] = usage.get(group, 0) + count
+        self._usage = usage
+
+
+class ShortestJobFirstPolicy(SchedulingPolicy):
+    """
+    Ranks tasks of equal priority by their expected remaining runtime.  The
+    runtime is estimated from the pending workunits of the task multiplied by
+    the runtime of a workunit with the same task key.  Tasks without history
+    are expected to be short.
+
+    Workunit runtimes are taken from the moving averages recorded by running
+    tasks.  Task keys that have no running task with recorded runtimes use the
+    mean runtime of recently completed workunits, read from the database in a
+    thread.  score() never queries the database because it is called while the
+    scheduler's queue lock is held.
+    """
+
+    def __init__(self, scheduler, aging=None, history=100):
+        """
+        @param history - number of completed workunits per task key used to
+                         estimate workunit runtime
+        """
+        SchedulingPolicy.__init__(self, scheduler, aging)
+        self.history = history
+        self._runtimes = {}     # task_key: seconds per workunit
+        self._loading = set()   # task keys whose history is being read
+
+    def runtime(self, task_key):
+        """
+        Returns the expected runtime of a workunit for a task key, in seconds,
+        or 0 if it is not known yet
+        """
+        return self._runtimes.get(task_key, 0)
+
+    def load_history(self, task_keys):
+        """
+        Reads the mean runtime of recently completed workunits of task keys
+        from the database.  Runtimes already known from running tasks are
+        kept.
+
+        @param task_keys - task keys to read the history of
+        """
+        for task_key in task_keys:
+            try:
+                workunits = WorkUnit.objects \
+                    .filter(task_instance__task_key=task_key,
+                            status=STATUS_COMPLETE) \
+                    .exclude(started=None).exclude(completed=None) \
+                    .order_by('-completed') \
+                    .values_list('started', 'completed')[:self.history]
+                runtimes = [seconds(completed - started) for started, \
+                            completed in workunits]
+                if runtimes:
+                    self._runtimes.setdefault(task_key,
+                                              sum(runtimes) / len(runtimes))
+            finally:
+                self._loading.discard(task_key)
+
+    def score(self, task_instance):
+        expected = len(task_instance._worker_requests) * \
+                   self.runtime(task_instance.task_key)
+        return (self.priority(task_instance), expected, task_instance.queued)
+
+    def update(self):
+        """
+        Refreshes runtimes from the moving averages recorded by running tasks.
+        The history of other task keys is read in a thread, and is used from
+        the next update.
+        """
+        missing = set()
+        for task_instance in self.scheduler._active_tasks.values():
+            task_key = task_instance.task_key
+            averages = task_instance._runtimes.values()
+            if averages:
+                self._runtimes[task_key] = sum(averages) / len(averages)
+            elif task_key not in self._runtimes \
+                    and task_key not in self._loading:
+                missing.add(task_key)
+
+        if missing:
+            self._loading.update(missing)
+            threads.deferToThread(self.load_history, missing)
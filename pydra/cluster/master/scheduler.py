@@ -21,17 +21,21 @@ from threading import Lock
 
 
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import simplejson
 from heapq import heappush, heappop, heapify
 from twisted.internet import reactor, threads
-from twisted.internet.defer import Deferred, DeferredList
 
+from pydra.cluster.master.persistence import WriteBehindJournal
+from pydra.cluster.master.policies import load_policy
 from pydra.cluster.module import Module
 from pydra.cluster.tasks import *
 from pydra.cluster.tasks.task_manager import TaskManager
 from pydra.cluster.constants import *
-from pydra.models import TaskInstance, WorkUnit
+from pydra.models import Batch, TaskInstance, WorkUnit
+from pydra.util import seconds
+
+import pydra_settings
 
 # init logging
 import logging
@@ -67,9 +71,8 @@ class TaskScheduler(Module):
 
 
         == task status tracking ==
+        task_progress
         fetch_task_status
-        fetch_task_status_success
-        task_statuses        
     """
 
     _signals = [
@@ -79,7 +82,8 @@ class TaskScheduler(Module):
         'TASK_FINISHED',
         'WORKUNIT_REQUESTED',
         'WORKUNIT_COMPLETED',
-        'WORKUNIT_FAILED'
+        'WORKUNIT_FAILED',
+        'TASK_PROGRESS'
     ]
  
     _shared = [
@@ -100,7 +104,8 @@ class TaskScheduler(Module):
             ('NODE', self.request_worker),
             ('NODE', self.send_results),
             ('NODE', self.worker_stopped),
-            ('NODE', self.request_worker_release)
+            ('NODE', self.request_worker_release),
+            ('NODE', self.task_progress)
         ]
 
         self._friends = {
@@ -118,15 +123,17 @@ class TaskScheduler(Module):
         self._lock = Lock()         # general lock        
         self._worker_lock = Lock()  # lock for worker only transactions
         self._queue_lock = Lock()   # lock for queue only transactions
-        self._fetch_status_lock = Lock() # lock for retrieving statuses
+        self._schedule_lock = Lock() # lock for pending scheduling passes
 
-        # task statuses
-        self._task_statuses = {}
-        self._next_task_status_update = datetime.now()
+        # progress of running tasks, pushed by their main workers
+        self._task_progress = {}
 
         # a set containing all main workers
         self._main_workers = set()
 
+        # set while a scheduling pass is waiting to run in a thread
+        self._schedule_pending = False
+
         self.update_interval = 5 # seconds
 
 
@@ -134,13 +141,38 @@ class TaskScheduler(Module):
         Module._register(self, manager)
         
         self._queue = []
+        self._ready_queue = []      # heap of tasks with pending worker requests
+        self._ready_tasks = set()   # ids of tasks in the ready queue
         self._active_tasks = {}     # caching uncompleted task instances
         self._idle_workers = []     # all workers are seen equal
         self._active_workers = {}   # worker-job mappings
         self._waiting_workers = {}  # task-worker mappings
         
+        self.policy = load_policy(pydra_settings.SCHEDULING_POLICY, self, \
+                                  **pydra_settings.SCHEDULING_POLICY_ARGS)
+        self.batch_size = pydra_settings.BATCH_SIZE
+        self.batch_duration = pydra_settings.BATCH_DURATION
+        self.work_stealing = pydra_settings.WORK_STEALING
+        self._stealing = {}         # batches of workers with a pending
+                                    # steal request
+        self.speculative_execution = pydra_settings.SPECULATIVE_EXECUTION
+        self.speculation_factor = pydra_settings.SPECULATION_FACTOR
+        self._speculative = {}      # worker-worker mappings of duplicated jobs
+        self._superseded = set()    # workers running an unneeded duplicate
+        self.locality_delay = pydra_settings.LOCALITY_DELAY
+        self._locality_retry = False # set while a pass is scheduled for a
+                                     # request waiting for a local worker
+
+        # status updates are written to the database in bulk
+        self.journal = WriteBehindJournal(pydra_settings.PERSISTENCE_INTERVAL,
+                                          pydra_settings.PERSISTENCE_LIMIT)
+        self.journal.start()
+        self._journal_trigger = reactor.addSystemEventTrigger('before',
+                                            'shutdown', self.journal.stop)
+
         self._init_queue()
-        reactor.callLater(self.update_interval, self._update_queue)
+        self._update_call = reactor.callLater(self.update_interval,
+                                              self._update_queue)
 
     def _queue_task(self, task_key, args={}, priority=5):
         """
@@ -164,11 +196,12 @@ class TaskScheduler(Module):
         task_instance.queue_worker_request(task_instance)
         
         with self._queue_lock:
-            heappush(self._queue, [task_instance.compute_score(),task_instance])
+            heappush(self._queue, [self.policy.score(task_instance),task_instance])
             # cache this task
             self._active_tasks[task_instance.id] = task_instance
+            self._push_ready(task_instance)
 
-        threads.deferToThread(self._schedule)        
+        self._schedule_later()
         return task_instance
 
 
@@ -181,7 +214,7 @@ class TaskScheduler(Module):
         task_id = int(task_id)
         with self._queue_lock:
             task = self._active_tasks.get(task_id)
-            self._queue.remove([task.compute_score(), task])
+            self._remove_from_queue(task)
             # cancel any workers assigned to the task.  task is not
             # marked cancelled until all workers have reported they
             # stopped
@@ -196,9 +229,10 @@ class TaskScheduler(Module):
                 # cancelled
                 task = self._active_tasks[task_id]
                 del self._active_tasks[task_id]
+                self._task_progress.pop(task_id, None)
                 task.status = STATUS_CANCELLED
                 task.completed = datetime.now()
-                task.save()
+                self.journal.save(task, 'status', 'completed')
         return task != None
 
 
@@ -232,7 +266,7 @@ class TaskScheduler(Module):
                     status = STATUS_COMPLETE if task_status is None else task_status
                     task_instance.status = status
                     task_instance.completed = datetime.now()
-                    task_instance.save()
+                    self.journal.save(task_instance, 'status', 'completed')
                     
                     with self._worker_lock:
                         self._main_workers.remove(worker_key)
@@ -241,6 +275,7 @@ class TaskScheduler(Module):
                         
                     with self._queue_lock:
                         del self._active_tasks[job.task_id]
+                        self._task_progress.pop(job.task_id, None)
                         if status in (STATUS_CANCELLED, STATUS_COMPLETE, STATUS_FAILED):
                             # safe to remove the task
                             # release any unreleased workers
@@ -248,9 +283,7 @@ class TaskScheduler(Module):
                                 avatar = self.workers[key]
                                 avatar.remote.callRemote('release_worker')
 
-                            t = [job.compute_score(), job]
-                            if t in self._queue:
-                                self._queue.remove(t)
+                            if self._remove_from_queue(job):
                                 logger.info(
                                     'Task %d: %s is removed from the queue' % \
                                     (job.task_id, job.task_key))
@@ -279,6 +312,7 @@ class TaskScheduler(Module):
 
         @returns True if this operation succeeds and False otherwise.
         """
+        requeued = None
         with self._worker_lock:
             job = self.get_worker_job(worker_key) 
             if job is None:
@@ -290,6 +324,16 @@ class TaskScheduler(Module):
                 except ValueError:
                     pass 
 
+            elif worker_key in self._superseded:
+                self._superseded.discard(worker_key)
+
+            elif worker_key in self._speculative:
+                # the duplicate of this job is still running
+                twin_key = self._speculative.pop(worker_key)
+                del self._speculative[twin_key]
+                logger.warning('%s failed during task, duplicate on %s ' \
+                               'continues' % (worker_key, twin_key))
+
             elif job.subtask_key:
                 logger.warning('%s failed during task, returning work unit' % worker_key)
 
@@ -299,8 +343,13 @@ class TaskScheduler(Module):
                 if main_worker:
                     # requeue failed work.
                     task_instance.queue_worker_request(job)
-                
-            return False
+                    requeued = task_instance
+
+        # the ready queue is updated outside of the worker lock because
+        # _schedule() acquires the queue lock before the worker lock.
+        if requeued:
+            self._mark_ready(requeued)
+        return False
 
 
     def hold_worker(self, worker_key):
@@ -323,7 +372,7 @@ class TaskScheduler(Module):
 
 
 
-    def request_worker(self, requester_key, subtask, args, workunit):
+    def request_worker(self, requester_key, subtask, args, workunit, host=None):
         """
         Requests a worker for a workunit on behalf of a (main) worker.
         
@@ -334,6 +383,10 @@ class TaskScheduler(Module):
         @param args - arguments to pass to the task
         @param workunit - key that will retrieve additional data for this
                             workunit.
+        @param host - host storing the input of the workunit, if known.
+                            Workers on that host are preferred.  This may
+                            also be the key of the worker preferred, which
+                            is used only if it is idle.
         """
         task_instance = self.get_worker_job(requester_key)
         if task_instance:
@@ -348,8 +401,11 @@ class TaskScheduler(Module):
             job.args = simplejson.dumps(args)
             job.workunit = workunit
             job.save()
+            job.host = host
+            job.requested = time.time()
 
             task_instance.queue_worker_request(job)
+            self._mark_ready(task_instance)
             logger.debug('Work Request %s:  sub=%s  args=%s  w=%s ' % \
                          (requester_key, subtask, '--', workunit))
 
@@ -415,87 +471,503 @@ class TaskScheduler(Module):
         return -1
 
 
+    def _remove_from_queue(self, task_instance):
+        """
+        Removes a task from the queue.  The caller must hold _queue_lock.
+        Entries are matched by task rather than score because a policy may
+        score a task differently each time it is asked.
+
+        @returns True if the task was in the queue
+        """
+        for i, entry in enumerate(self._queue):
+            if entry[1] is task_instance:
+                del self._queue[i]
+                heapify(self._queue)
+                return True
+        return False
+
+
+    def _mark_ready(self, task_instance):
+        """
+        Marks a task as having pending worker requests.  The task is added to
+        the ready queue if it is not already in it.
+
+        @param task_instance - task that has had a worker request queued
+        """
+        with self._queue_lock:
+            self._push_ready(task_instance)
+
+
+    def _push_ready(self, task_instance):
+        """
+        Pushes a task onto the ready queue.  The caller must hold _queue_lock.
+
+        The ready queue is a heap ordered by policy score that only holds
+        tasks with outstanding worker requests.  Entries are removed lazily by
+        _poll_ready() once a task has no more requests or is no longer active.
+        """
+        if task_instance.id not in self._ready_tasks:
+            self._ready_tasks.add(task_instance.id)
+            heappush(self._ready_queue, [self.policy.score(task_instance),
+                                         task_instance.id, task_instance])
+
+
+    def _poll_ready(self):
+        """
+        Returns the highest ranked task with a pending worker request, and the
+        request itself, without removing either.  Stale entries at the head of
+        the ready queue are discarded.  The caller must hold _queue_lock.
+
+        @returns tuple of (task_instance, job) or (None, None)
+        """
+        while self._ready_queue:
+            task_instance = self._ready_queue[0][2]
+            if task_instance.id in self._active_tasks:
+                job = task_instance.poll_worker_request()
+                if job:
+                    return task_instance, job
+            heappop(self._ready_queue)
+            self._ready_tasks.discard(task_instance.id)
+        return None, None
+
+
+    def _schedule_later(self):
+        """
+        Runs a scheduling pass in a thread.  Requests made while a pass is
+        already pending are coalesced into it because a single pass
+        dispatches every worker that can be matched to a request.
+        """
+        with self._schedule_lock:
+            if self._schedule_pending:
+                return
+            self._schedule_pending = True
+        threads.deferToThread(self._schedule)
+
+
+    def _select_worker(self, task_instance, job):
+        """
+        Selects a worker for a worker request.  The caller must hold both
+        _queue_lock and _worker_lock.
+
+        Workers are chosen in order of preference: workers already held by
+        the task, the main worker for a local workunit, and then idle workers.
+        Held and idle workers on the host storing the input of the request
+        are preferred.  A request may wait up to locality_delay seconds for an
+        idle worker on its host before it is given a remote worker.
+
+        @param task_instance - task that made the request
+        @param job - the request
+        @returns worker key or None if no worker is available
+        """
+        worker_key = None
+        subtask = job.subtask_key
+        if subtask and task_instance.waiting_workers:
+            # consume waiting worker first
+            worker_key = self._local_worker(task_instance, job,
+                    task_instance.waiting_workers) \
+                    or task_instance.waiting_workers.pop()
+            logger.info('Re-dispatching waiting worker:%s to task:%s' % 
+                    (worker_key, task_instance.id))
+            task_instance.running_workers.append(worker_key)
+
+        elif subtask and not task_instance.local_workunit:
+            # the main worker can do a local execution
+            worker_key = task_instance.worker
+            logger.info('Main worker:%s assigned to task:%s' %
+                    (worker_key, task_instance.id))
+
+        elif self._idle_workers:
+            # dispatching to idle worker last
+            worker_key = self._local_worker(task_instance, job,
+                    self._idle_workers)
+            if not worker_key and self._may_run_remote(job):
+                worker_key = self._idle_workers.pop()
+            if worker_key:
+                task_instance.running_workers.append(worker_key)
+                logger.info('Worker:%s assigned to task:%s  key=%s' %
+                    (worker_key, task_instance.id, task_instance.task_key))
+        return worker_key
+
+
+    def _local_worker(self, task_instance, job, workers):
+        """
+        Removes and returns a worker from a list of workers that is on the
+        host storing the input of a request, or that is the worker named by
+        the request.  If none is, a later request of
+        the task that does have a worker on its host is moved to the front of
+        the task's requests and that worker is returned instead.  The caller
+        must hold _worker_lock.
+
+        @param task_instance - task that made the request
+        @param job - the request
+        @param workers - list of worker keys to choose from
+        @returns worker key or None if no worker is on the host
+        """
+        if getattr(job, 'host', None) is None or self.locality_delay is None:
+            return None
+
+        hosts = dict((key.split(':')[0], key) for key in workers)
+        hosts.update((key, key) for key in workers)
+        if job.host not in hosts:
+            job = task_instance.promote_worker_request(hosts)
+            if not job:
+                return None
+
+        worker_key = hosts[job.host]
+        workers.remove(worker_key)
+        logger.debug('Worker:%s is local to workunit:%s' % (worker_key,
+                job.workunit))
+        return worker_key
+
+
+    def _may_run_remote(self, job):
+        """
+        Returns whether a request may be given a worker that is not on the
+        host storing its input.  Requests wait locality_delay seconds for a
+        local worker first.  A scheduling pass is run when the delay expires.
+        """
+        if getattr(job, 'host', None) is None or not self.locality_delay:
+            return True
+
+        # input stored on a host without workers, such as a file server, can
+        # never be read locally.  A request naming a worker, which cached its
+        # input, only prefers that worker while it is idle: reading the input
+        # again is cheaper than waiting for the worker.
+        if job.host in self.workers or not self._host_connected(job.host):
+            return True
+
+        remaining = job.requested + self.locality_delay - time.time()
+        if remaining <= 0:
+            return True
+
+        with self._schedule_lock:
+            if self._locality_retry:
+                return False
+            self._locality_retry = True
+        reactor.callFromThread(reactor.callLater, remaining,
+                               self._locality_expired)
+        return False
+
+
+    def _host_connected(self, host):
+        """
+        Returns whether any connected worker is on a host, or is the worker
+        named by host.
+        """
+        for worker_key in self.workers.keys():
+            if worker_key == host or worker_key.split(':')[0] == host:
+                return True
+        return False
+
+
+    def _locality_expired(self):
+        """
+        Runs a scheduling pass for requests that waited for a local worker.
+        """
+        with self._schedule_lock:
+            self._locality_retry = False
+        self._schedule_later()
+
+
     def _schedule(self):
         """
-        Allocates a worker to a task/subtask.
+        Allocates workers to tasks/subtasks.
 
         Note that a main worker is a special worker resource for executing
         parallel tasks. At the extreme case, a single main worker can finish
         the whole task even without other workers, albeit probably in a slow
         way.
+
+        A single pass matches as many workers as possible against pending
+        requests, taking requests from the head of the ready queue until the
+        best ranked request cannot be given a worker.  Tasks whose best
+        request is waiting for a worker on the host storing its input are
+        skipped for the rest of the pass so that lower ranked tasks may use
+        the idle workers.  The run_task calls for all matched workers are
+        issued together once the locks are released.
         
         If no tasks are in the queue or no job is in the queue CLUSTER_IDLE is
         emited
+
+        @returns list of (worker_key, task_id) for each worker dispatched
         """
+        with self._schedule_lock:
+            self._schedule_pending = False
 
-        task, subtask, workunit = None, None, None
-        
-        finished_main_workers = []
+        dispatches = []
+        waiting = []    # ready queue entries waiting for a local worker
         with self._queue_lock:
-            logger.debug('Attempting to advance scheduler: q=%s' % (len(self._queue)))
-            
-            if self._queue:
-                # find taskinstance or a worker_request
-                task_instance, job = None, None
-                for item in self._queue:
-                    job = item[1].poll_worker_request()
-                    if job:
-                        task_instance = item[1]
+            logger.debug('Attempting to advance scheduler: q=%s ready=%s' % \
+                         (len(self._queue), len(self._ready_queue)))
+
+            with self._worker_lock:
+                while True:
+                    # find the taskinstance and worker_request with the best
+                    # score
+                    task_instance, job = self._poll_ready()
+                    if not job:
                         break
-                
-                if job:
-                    with self._worker_lock:
-                        worker_key = None
-                        task = task_instance.task_key
-                        subtask = job.subtask_key
-                        if subtask and task_instance.waiting_workers:
-                            # consume waiting worker first
-                            worker_key = task_instance.waiting_workers.pop()
-                            logger.info('Re-dispatching waiting worker:%s to task:%s' % 
-                                    (worker_key, task_instance.id))
-                            task_instance.running_workers.append(worker_key)
-
-                        elif subtask and not task_instance.local_workunit:
-                            # the main worker can do a local execution
-                            worker_key = task_instance.worker
-                            logger.info('Main worker:%s assigned to task:%s' %
-                                    (worker_key, task_instance.id))
-
-                        elif self._idle_workers:
-                            # dispatching to idle worker last
-                            worker_key = self._idle_workers.pop()
-                            task_instance.running_workers.append(worker_key)
-                            logger.info('Worker:%s assigned to task:%s  key=%s' %
-                                    (worker_key, task_instance.id, task))
-
-                    # was a worker found for the job
-                    if worker_key:
-                        job = task_instance.get_batch()
-                        job.worker = worker_key
-                        
-                        if not (subtask and job.on_main_worker):
-                            self._active_workers[worker_key] = job
-                        else:
-                            task_instance.local_workunit = job
-
-                        # notify remote worker to start     
-                        worker = self.workers[worker_key]
-                        pkg = self.task_manager.get_task_package(task)
-                        main_worker = task_instance.worker if task_instance.worker else worker_key
-                        d = worker.remote.callRemote('run_task', task, pkg.version,
-                                job.args, job.transmitable(), main_worker,
-                                task_instance.id)
-                        d.addCallback(self.run_task_successful, worker_key, subtask)
-                        d.addErrback(self.run_task_failed, worker_key)            
-            
-                        return worker_key, job.task_id
 
-                else:
-                    self.emit('CLUSTER_IDLE', self._idle_workers)
-            else:
+                    worker_key = self._select_worker(task_instance, job)
+                    if not worker_key and self._idle_workers:
+                        # the request is waiting for a local worker.  Set the
+                        # task aside so the idle workers go to other tasks.
+                        waiting.append(heappop(self._ready_queue))
+                        continue
+                    if not worker_key:
+                        # the best request must wait for a worker
+                        break
+                    # a request local to the worker may have been moved ahead
+                    job = task_instance.poll_worker_request()
+
+                    # workers that may share the pending work of this task
+                    workers = len(self._idle_workers) + 1 + \
+                              len(task_instance.running_workers) + \
+                              len(task_instance.waiting_workers)
+
+                    subtask = job.subtask_key
+                    job = task_instance.get_batch(self.batch_size, workers,
+                                                  self.batch_duration)
+                    job.worker = worker_key
+                    self.policy.dispatched(task_instance, job)
+
+                    # the batch consumed requests from the task.  Requeue it
+                    # with a fresh score if it still has requests pending.
+                    heappop(self._ready_queue)
+                    self._ready_tasks.discard(task_instance.id)
+                    if task_instance.poll_worker_request():
+                        self._push_ready(task_instance)
+
+                    if not (subtask and job.on_main_worker):
+                        self._active_workers[worker_key] = job
+                    else:
+                        task_instance.local_workunit = job
+                    dispatches.append((worker_key, task_instance, subtask, job))
+
+            for entry in waiting:
+                heappush(self._ready_queue, entry)
+            pending = task_instance or waiting
+
+            if not dispatches and not pending:
                 self.emit('CLUSTER_IDLE', self._idle_workers)
-                    
-        return None
+
+            # there are no pending requests for the remaining idle workers.
+            # take them from workers that are still busy with large batches.
+            steal = self.work_stealing and not pending and self._idle_workers
+            speculate = self.speculative_execution and not pending \
+                    and self._idle_workers
+
+        # notify remote workers to start
+        for worker_key, task_instance, subtask, job in dispatches:
+            self._run_job(worker_key, task_instance, subtask, job)
+
+        if steal:
+            self._steal_work()
+        if speculate:
+            self._speculate()
+
+        return [(worker_key, job.task_id) for worker_key, task_instance, \
+                subtask, job in dispatches]
+
+
+    def _run_job(self, worker_key, task_instance, subtask, job):
+        """
+        Notifies a remote worker to start a job.
+
+        @param worker_key - worker to run the job
+        @param task_instance - task the job belongs to
+        @param subtask - key of the subtask, or None for the root task
+        @param job - TaskInstance, WorkUnit or Batch to run
+        """
+        task = task_instance.task_key
+        worker = self.workers[worker_key]
+        pkg = self.task_manager.get_task_package(task)
+        main_worker = task_instance.worker if task_instance.worker else worker_key
+        d = worker.remote.callRemote('run_task', task, pkg.version,
+                job.args, job.transmitable(), main_worker,
+                task_instance.id)
+        d.addCallback(self.run_task_successful, worker_key, subtask)
+        d.addErrback(self.run_task_failed, worker_key)
+
+
+    def _get_running_batch(self, worker_key):
+        """
+        Returns the Batch a worker is running, or None if it is not running a
+        Batch.  For a main worker this is the batch it runs locally.
+        """
+        job = self._active_workers.get(worker_key, None)
+        if isinstance(job, (TaskInstance,)):
+            job = job.local_workunit
+        return job if isinstance(job, (Batch,)) else None
+
+
+    def _steal_work(self):
+        """
+        Steals workunits that have not been started from workers running
+        large batches, so that idle workers can run them.  One steal is made
+        per idle worker, from the batches expected to have the most workunits
+        remaining.  Half of the remaining workunits of a batch are stolen.
+
+        The remaining workunits are estimated from the time the batch has run
+        and the recorded runtime of its subtask.
+        """
+        steals = []
+        now = datetime.now()
+        with self._queue_lock:
+            with self._worker_lock:
+                available = len(self._idle_workers) - len(self._stealing)
+                if available < 1:
+                    return
+
+                candidates = []
+                for worker_key in self._active_workers.keys():
+                    job = self._get_running_batch(worker_key)
+                    if job is None or worker_key in self._stealing:
+                        continue
+                    remaining = job.size
+                    started = getattr(job, 'started', None)
+                    runtime = job.task_instance._runtimes.get(job.subtask_key)
+                    if started and runtime:
+                        remaining -= seconds(now - started) / runtime
+                    if remaining >= 2:
+                        candidates.append((remaining, worker_key, job))
+
+                candidates.sort(reverse=True)
+                for remaining, worker_key, job in candidates[:available]:
+                    self._stealing[worker_key] = job
+                    steals.append((worker_key, int(remaining / 2)))
+
+        for worker_key, count in steals:
+            logger.info('Stealing %d workunits from worker:%s' % \
+                        (count, worker_key))
+            worker = self.workers[worker_key]
+            d = worker.remote.callRemote('steal_work', count)
+            d.addCallback(self._work_stolen, worker_key)
+            d.addErrback(self._steal_failed, worker_key)
+
+
+    def _work_stolen(self, stolen, worker_key):
+        """
+        Callback for a steal request.  The stolen workunits are removed from
+        the batch they were stolen from and are queued as worker requests
+        ahead of other requests of their task.  The batch is the one the
+        worker was running when the steal was requested, so the workunits are
+        requeued even if the worker has since completed it.
+
+        @param stolen - dictionary of subtask keys and lists of workunit keys
+        @param worker_key - worker the workunits were stolen from
+        """
+        with self._queue_lock:
+            job = self._stealing.pop(worker_key, None)
+        if job is None:
+            logger.error('No steal was requested from worker:%s' % worker_key)
+            return
+
+        with self._worker_lock:
+            workunits = []
+            for subtask_key, workunit_keys in stolen.items():
+                for workunit_key in workunit_keys:
+                    try:
+                        workunits.append(job.remove(workunit_key))
+                    except KeyError:
+                        logger.error('Stolen workunit %s:%s is not in batch' \
+                            ' on worker:%s' % (subtask_key, workunit_key, \
+                            worker_key))
+
+        if workunits:
+            task_instance = job.task_instance
+            task_instance.requeue_worker_requests(workunits)
+            self._mark_ready(task_instance)
+            self._schedule()
+
+
+    def _steal_failed(self, failure, worker_key):
+        """
+        Errback for a steal request
+        """
+        logger.warning('Could not steal work from worker:%s - %s' % \
+                       (worker_key, failure))
+        with self._queue_lock:
+            self._stealing.pop(worker_key, None)
+
+
+    def _speculate(self):
+        """
+        Runs duplicates of straggling jobs on idle workers.  A job straggles
+        when it has run longer than the runtime limit of its subtask, computed
+        from the runtimes recorded for the task.  The stragglers that have
+        overrun their limit the most are duplicated first, one per idle worker.
+
+        Whichever copy of a job completes first is used, the other copy is
+        stopped.  Jobs run locally by a main worker are not duplicated because
+        stopping them would stop the whole task.
+        """
+        duplicates = []
+        now = datetime.now()
+        with self._queue_lock:
+            with self._worker_lock:
+                available = len(self._idle_workers) - len(self._stealing)
+                if available < 1:
+                    return
+
+                stragglers = []
+                for worker_key, job in self._active_workers.items():
+                    if isinstance(job, (TaskInstance,)) \
+                            or worker_key in self._speculative \
+                            or worker_key in self._superseded:
+                        continue
+                    started = getattr(job, 'started', None)
+                    limit = job.task_instance.runtime_limit(job.subtask_key,
+                                                    self.speculation_factor)
+                    if not (started and limit):
+                        continue
+                    overrun = seconds(now - started) / (limit * job.size)
+                    if overrun > 1:
+                        stragglers.append((overrun, worker_key))
+
+                stragglers.sort(reverse=True)
+                for overrun, worker_key in stragglers[:available]:
+                    job = self._active_workers[worker_key]
+                    workunits = job.workunits.values() \
+                            if isinstance(job, (Batch,)) else [job]
+                    duplicate = Batch(workunits)
+                    duplicate.args = job.args
+                    duplicate.task_instance = job.task_instance
+                    duplicate.size = job.size
+                    duplicate.subtask_key = job.subtask_key
+
+                    duplicate_key = self._idle_workers.pop()
+                    job.task_instance.running_workers.append(duplicate_key)
+                    self._active_workers[duplicate_key] = duplicate
+                    self._speculative[worker_key] = duplicate_key
+                    self._speculative[duplicate_key] = worker_key
+                    duplicates.append((worker_key, duplicate_key, duplicate))
+
+        for worker_key, duplicate_key, job in duplicates:
+            logger.info('Worker:%s is straggling, duplicating its work on ' \
+                        'worker:%s' % (worker_key, duplicate_key))
+            self._run_job(duplicate_key, job.task_instance, job.subtask_key,
+                          job)
+
+
+    def _supersede(self, worker_key):
+        """
+        Marks the copy of a duplicated job that did not complete first as
+        superseded and stops it.  Results or stop notifications from the
+        superseded worker are ignored.
+
+        @param worker_key - worker that completed the job first
+        """
+        with self._worker_lock:
+            twin_key = self._speculative.pop(worker_key, None)
+            if twin_key is None:
+                return
+            del self._speculative[twin_key]
+            self._superseded.add(twin_key)
+
+        logger.info('Worker:%s completed duplicated work first, stopping ' \
+                    'worker:%s' % (worker_key, twin_key))
+        self.workers[twin_key].remote.callRemote('stop_task')
 
 
     def _init_queue(self):
@@ -506,10 +978,10 @@ class TaskScheduler(Module):
             queued = TaskInstance.objects.queued()
             running = TaskInstance.objects.running()
             for t in running:
-                self._queue.append([t.compute_score(), t.id])
+                self._queue.append([self.policy.score(t), t.id])
                 self._active_tasks[t.id] = t
             for t in queued:
-                self._queue.append([t.compute_score(), t.id])
+                self._queue.append([self.policy.score(t), t.id])
                 self._active_tasks[t.id] = t
 
 
@@ -519,10 +991,22 @@ class TaskScheduler(Module):
         short-term queue and subsequently re-orders them.
         """
         with self._queue_lock:
+            self.policy.update()
             for task in self._queue:
-                task[0] = task[1].compute_score()
+                task[0] = self.policy.score(task[1])
             heapify(self._queue)
-            reactor.callLater(self.update_interval, self._update_queue)
+            for task in self._ready_queue:
+                task[0] = self.policy.score(task[2])
+            heapify(self._ready_queue)
+            # an update run early replaces the one scheduled
+            if self._update_call.active():
+                self._update_call.cancel()
+            self._update_call = reactor.callLater(self.update_interval,
+                                                  self._update_queue)
+
+        # stragglers are found as time passes, not only when jobs complete
+        if self.speculative_execution:
+            self._speculate()
 
 
     def return_work_success(self, results, worker_key):
@@ -606,7 +1090,7 @@ class TaskScheduler(Module):
             job.worker = worker_key
             job.status = STATUS_RUNNING
             job.started = datetime.now()
-            job.save()
+            self.journal.save(job, 'worker', 'status', 'started')
 
 
     def send_results(self, worker_key, results):
@@ -621,6 +1105,16 @@ class TaskScheduler(Module):
         with self._lock:
             job = self.get_worker_job(worker_key)
 
+            if worker_key in self._superseded:
+                # a duplicate of this job already completed.  The worker was
+                # asked to stop, so it is released rather than held.
+                logger.info('Worker:%s - results superseded' % worker_key)
+                self._superseded.discard(worker_key)
+                self.workers[worker_key].remote.callRemote('release_worker')
+                self.add_worker(worker_key)
+                return
+            self._supersede(worker_key)
+
             # check to make sure the task was still in the queue.  Its possible
             # this call was made at the same time a task was being canceled.  
             # Only worry about sending the results back to the Task Head 
@@ -640,7 +1134,7 @@ class TaskScheduler(Module):
                     # for this task, otherwise there will be nothing to advance.
                     # this reassigns the waiting worker quickly.
                     if len(task_instance._worker_requests) != 0:
-                        threads.deferToThread(self._schedule)
+                        self._schedule_later()
     
                     # if this was a subtask the main task needs the results and to 
                     # be informed
@@ -653,7 +1147,11 @@ class TaskScheduler(Module):
     
                     # save information about the workunits to the database
                     now = datetime.now()
-                    if len(results) > 1:
+                    started = getattr(job, 'started', None)
+                    if started:
+                        task_instance.record_runtime(job.subtask_key,
+                                            started, now, len(results))
+                    if isinstance(job, (Batch,)):
                         for workunit_key, results, failed in results:
                             status_msg = 'failed' if failed else 'completed'
                             workunit = job[workunit_key]
@@ -663,11 +1161,10 @@ class TaskScheduler(Module):
                                 workunit.subtask_key, workunit_key))
                             workunit.completed = now
                             workunit.status = status
-                            workunit.save()
+                            self.journal.save(workunit, 'status', 'completed')
                         job.size = len(results)
                         job.status = STATUS_COMPLETE
                         job.completed = now
-                        job.save()
                     else:
                         status_msg = 'failed' if results[0][2] else 'completed'
                         logger.info('Worker:%s - %s: %s:%s (%s)' %  \
@@ -676,7 +1173,7 @@ class TaskScheduler(Module):
                         status = STATUS_FAILED if results[0][2] else STATUS_COMPLETE
                         job.status = status
                         job.completed = now
-                        job.save()
+                        self.journal.save(job, 'status', 'completed')
     
                 else:
                     # this is the root task, so we can return the worker to the
@@ -694,11 +1191,15 @@ class TaskScheduler(Module):
         Called by workers when they have stopped due to a cancel task request.
         """
         job = self.get_worker_job(worker_key)
-        if job.subtask_key:
+        if worker_key in self._superseded:
+            # stopped because a duplicate of its job completed first
+            self._superseded.discard(worker_key)
+        elif job is not None and job.subtask_key:
+            # job is None if the worker already returned its results
             # save information about this workunit to the database
             job.completed = datetime.now()
             job.status = STATUS_CANCELLED
-            job.save()
+            self.journal.save(job, 'completed', 'status')
         
         logger.info(' Worker:%s - stopped' % worker_key)
         self.add_worker(worker_key, STATUS_CANCELLED)
@@ -772,80 +1273,44 @@ class TaskScheduler(Module):
         self.add_worker(worker_key)
 
 
-    def fetch_task_status(self):
+    def task_progress(self, worker_key, progress):
         """
-        updates the list of task statuses, a dictionary of task status and
-        progress.
-        
-        This function is a combination of tabulating statuses from queued task
-        objects and calls to workers.
+        Called by main workers when the progress of their task changes.  The
+        progress is stored so that statuses can be read without contacting
+        the workers, and TASK_PROGRESS is emitted for modules that subscribe
+        to progress updates.
 
-        For now, statuses are only queried for Main Workers.  Including 
-        statuses of subtasks requires additional logic and overhead to pass the
-        intermediate results to the main worker.
-        
-        @returns the current cached statuses, or a deferred if the statuses
-                are still being fetched
+        @param worker_key - main worker of the task
+        @param progress - progress completed as an integer 0 - 100
         """
+        job = self.get_worker_job(worker_key)
+        if job is None or job.task_instance.worker != worker_key:
+            # progress is only reported by the main worker of a task
+            return
 
-        # cache updates so multiple controllers won't cause excessive calls
-        # to the workers.  While a status update is in progress _task_statuses
-        # will be set to deferred so all requests will return the new statuses
-        # as soon as they are returned
-        now = datetime.now()
-        with self._fetch_status_lock:
-            if self._next_task_status_update > now:
-                return self._task_statuses
-            statuses_deferred = Deferred()
-            self._task_statuses = statuses_deferred
-        self.next_task_status_update = now + timedelta(0, 3)
-        
-        deferreds = []
+        task_id = job.task_id
+        self._task_progress[task_id] = progress
+        self.emit('TASK_PROGRESS', task_id, progress)
+
+
+    def fetch_task_status(self):
+        """
+        Returns a dictionary of task status and progress for all tasks in the
+        queue.
+
+        Progress is pushed to the scheduler by main workers as it changes, so
+        this only reads the statuses kept by the scheduler.  For now, progress
+        is only reported for the root task.
+        """
         statuses = {}
         for priority, task in self._queue:
             if task.status == STATUS_STOPPED:
                 statuses[task.id] = {'s':STATUS_STOPPED}
             else:
                 start = time.mktime(task.started.timetuple())
-                status = {'s':task.status, 't':start, 'p':-1}
-                statuses[task.id] = status
-                worker = self.workers[task.worker]
-                deferred = worker.remote.callRemote('task_status')
-                deferred.addCallback(self.fetch_task_status_success, status)
-                deferreds.append(deferred)
-
-        # Possible that there are only queued tasks, or nothing in the queue. In
-        # which case no deferreds from the worker will be pending, immediately 
-        # call the success method
-        if deferreds:
-            deferred_list = DeferredList(deferreds, consumeErrors=True)
-            deferred_list.addCallback(self.fetch_task_statuses_success,statuses)
-            return deferred_list
-        return self.fetch_task_statuses_success(None, statuses)
-
-
-    def fetch_task_status_success(self, progress, status):
-        """
-        updates task status list with response from worker used in conjunction
-        with fetch_task_status()
-        
-        @param progress - result from remote call to task_status.  progress
-                        completed as an integer 0 - 100
-        @param status - dictionary containing status of task
-        """
-        status['p'] = progress
-
-
-    def fetch_task_statuses_success(self, results, statuses):
-        """
-        Called when all workers have reported their status.  Saves the final
-        list of results as the current list and returns it.  This also triggers
-        the callback for any deferreds waiting for completion
-        
-        @param results - results from deferred list
-        @param statuses - completed list of statuses.
-        """
-        with self._fetch_status_lock:
-            self._task_statuses.callback(statuses)
-            self._task_statuses = statuses
+                statuses[task.id] = {
+                    's':task.status,
+                    't':start,
+                    'p':self._task_progress.get(task.id, -1)
+                }
         return statuses
@@ -0,0 +1,52 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from pydra.cluster.module import Module
+
+
+class ShuffleRelay(Module):
+    """
+    Relays requests for chunks of shuffle files between nodes.  Nodes are not
+    connected to each other, so a node reads a file stored on another node
+    through the master.
+    """
+
+    _shared = [
+        'nodes',
+    ]
+
+    def __init__(self):
+        self._remotes = [
+            ('NODE', self.fetch_shuffle),
+        ]
+
+
+    def fetch_shuffle(self, location, offset, size):
+        """
+        Reads a chunk of a shuffle file from the node storing it.
+
+        @param location - node key and name of the file, separated by a slash
+        @param offset - offset of the chunk
+        @param size - most bytes to read
+        @returns tuple of (size of the file, chunk)
+        """
+        node_key, name = location.rsplit('/', 1)
+        for node in self.nodes.values():
+            if '%s:%s' % (node.host, node.port) == node_key and node.ref:
+                return node.ref.callRemote('read_shuffle', name, offset, size)
+        raise KeyError('Node %s is not connected' % node_key)
@@ -0,0 +1,36 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from pydra.cluster.master.tests.persistence import suite as persistence_suite
+from pydra.cluster.master.tests.policies import suite as policies_suite
+from pydra.cluster.master.tests.scheduler import suite as scheduler_suite
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in master
+    """
+    master_suite = unittest.TestSuite()
+    master_suite.addTest(persistence_suite())
+    master_suite.addTest(policies_suite())
+    master_suite.addTest(scheduler_suite())
+
+    return master_suite
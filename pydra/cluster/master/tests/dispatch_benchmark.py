@@ -0,0 +1,95 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark for TaskScheduler dispatch throughput.  A task is given enough
+pending workunits to occupy every worker, all workers are made idle at once,
+and the scheduler is timed while it hands them out.  Two modes are measured:
+
+    pass   - a single scheduling pass dispatches every idle worker
+    single - one scheduling pass per idle worker, as happens when each
+             returning worker triggers its own pass
+
+usage: python dispatch_benchmark.py [worker_count ...]
+"""
+import sys
+import time
+
+#environment must be configured before loading tests
+from pydra.config import configure_django_settings
+configure_django_settings()
+
+from pydra.models import WorkUnit
+from proxies import SchedulerManager
+
+
+def setup_scheduler(worker_count, requests_per_worker=5):
+    """
+    Creates a scheduler with a running task that has pending requests for
+    every worker, and a full pool of idle workers.
+    """
+    manager = SchedulerManager(worker_count + 1)
+    scheduler = manager.scheduler
+    scheduler.add_worker('worker%d' % worker_count)
+    task_instance = scheduler._queue_task('demo.demo_task.TestParallelTask')
+    task_instance.worker = scheduler._schedule()[0][0]
+
+    # occupy the main worker with a local workunit so that only idle workers
+    # are dispatched.
+    task_instance.local_workunit = WorkUnit()
+
+    for i in range(worker_count * requests_per_worker):
+        job = WorkUnit()
+        job.task_instance = task_instance
+        job.subtask_key = 'TestTask'
+        job.workunit = i
+        task_instance.queue_worker_request(job)
+    scheduler._mark_ready(task_instance)
+
+    return manager, scheduler
+
+
+def benchmark(worker_count, mode):
+    """
+    Times the dispatch of worker_count idle workers.
+
+    @returns number of workers dispatched per second
+    """
+    manager, scheduler = setup_scheduler(worker_count)
+    workers = ['worker%d' % i for i in range(worker_count)]
+    start = time.time()
+    if mode == 'pass':
+        scheduler._idle_workers.extend(workers)
+        dispatched = len(scheduler._schedule())
+    else:
+        dispatched = 0
+        for worker_key in workers:
+            scheduler._idle_workers.append(worker_key)
+            dispatched += len(scheduler._schedule())
+    elapsed = time.time() - start
+    assert dispatched == worker_count
+    return worker_count / elapsed if elapsed else float('inf')
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1, 8, 64, 256, 1024]
+    print '%8s %16s %16s' % ('workers', 'pass (w/s)', 'single (w/s)')
+    for count in counts:
+        print '%8d %16.0f %16.0f' % (count, benchmark(count, 'pass'), \
+                                     benchmark(count, 'single'))
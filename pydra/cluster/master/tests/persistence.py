@@ -0,0 +1,123 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from datetime import datetime
+
+#environment must be configured before loading tests
+from pydra.config import configure_django_settings
+configure_django_settings()
+
+from django.db import connection
+
+from pydra.cluster.master.persistence import WriteBehindJournal
+from pydra.cluster.tasks import STATUS_COMPLETE, STATUS_RUNNING
+from pydra.models import Batch, TaskInstance, WorkUnit
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    persistence_suite = unittest.TestSuite()
+    persistence_suite.addTest(unittest.makeSuite(WriteBehindJournal_Test))
+    return persistence_suite
+
+
+class WriteBehindJournal_Test(unittest.TestCase):
+    """
+    Tests for verifying updates are coalesced and written by the journal
+    """
+    def setUp(self):
+        self.journal = WriteBehindJournal()
+        self.task_instance = TaskInstance()
+        self.task_instance.task_key = 'demo.demo_task.TestParallelTask'
+        self.task_instance.save()
+        self.workunits = []
+        for i in range(10):
+            workunit = WorkUnit()
+            workunit.task_instance = self.task_instance
+            workunit.subtask_key = 'TestTask'
+            workunit.workunit = i
+            workunit.save()
+            self.workunits.append(workunit)
+
+    def test_save_is_deferred(self):
+        """
+        Verifies updates are not written until the journal is flushed
+        """
+        workunit = self.workunits[0]
+        workunit.status = STATUS_RUNNING
+        self.journal.save(workunit, 'status')
+        self.assertEqual(WorkUnit.objects.get(id=workunit.id).status, None)
+        self.assertEqual(self.journal.flush(), 1)
+        self.assertEqual(WorkUnit.objects.get(id=workunit.id).status,
+                         STATUS_RUNNING)
+
+    def test_latest_values_written(self):
+        """
+        Verifies repeated updates are coalesced and the latest value is
+        written
+        """
+        workunit = self.workunits[0]
+        workunit.status = STATUS_RUNNING
+        self.journal.save(workunit, 'status')
+        workunit.status = STATUS_COMPLETE
+        workunit.completed = datetime.now()
+        self.journal.save(workunit, 'status', 'completed')
+        self.assertEqual(self.journal.flush(), 1)
+        saved = WorkUnit.objects.get(id=workunit.id)
+        self.assertEqual(saved.status, STATUS_COMPLETE)
+        self.assertTrue(saved.completed)
+
+    def test_batch_bulk_update(self):
+        """
+        Verifies workunits in a batch sharing the same values are written
+        with a single query
+        """
+        batch = Batch(self.workunits)
+        batch.completed = datetime.now()
+        for workunit in self.workunits:
+            workunit.status = STATUS_COMPLETE
+        self.journal.save(batch, 'status', 'completed')
+
+        queries = len(connection.queries)
+        self.assertEqual(self.journal.flush(), 10)
+        if queries:
+            # queries are only recorded when DEBUG is set
+            self.assertEqual(len(connection.queries) - queries, 1)
+        self.assertEqual(WorkUnit.objects.filter( \
+            task_instance=self.task_instance, status=STATUS_COMPLETE).count(),
+            10)
+
+    def test_unsaved_object(self):
+        """
+        Verifies objects without an id are saved immediately
+        """
+        workunit = WorkUnit()
+        workunit.task_instance = self.task_instance
+        workunit.subtask_key = 'TestTask'
+        workunit.workunit = 'new'
+        self.journal.save(workunit, 'status')
+        self.assertTrue(workunit.id)
+        self.assertEqual(self.journal.flush(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
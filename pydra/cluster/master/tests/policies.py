@@ -0,0 +1,173 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from twisted.internet import reactor
+
+#environment must be configured before loading tests
+from pydra.config import configure_django_settings
+configure_django_settings()
+
+from pydra.cluster.master.policies import *
+from pydra.cluster.tasks import STATUS_COMPLETE
+from pydra.models import TaskInstance, WorkUnit
+from proxies import SchedulerManager
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    policies_suite = unittest.TestSuite()
+    policies_suite.addTest(unittest.makeSuite(SchedulingPolicy_Test))
+    return policies_suite
+
+
+class SchedulingPolicy_Test(unittest.TestCase):
+    """
+    Tests for verifying the scores computed by scheduling policies
+    """
+    def setUp(self):
+        self.clear()
+        self.manager = SchedulerManager()
+        self.scheduler = self.manager.scheduler
+
+    def tearDown(self):
+        if self.scheduler._update_call.active():
+            self.scheduler._update_call.cancel()
+        self.scheduler.journal.stop()
+        reactor.removeSystemEventTrigger(self.scheduler._journal_trigger)
+        self.clear()
+
+    def clear(self):
+        """
+        Removes tasks and workunits saved by this or other tests, they would
+        otherwise be counted as history
+        """
+        WorkUnit.objects.all().delete()
+        TaskInstance.objects.all().delete()
+
+    def create_task(self, task_key='demo.demo_task.TestParallelTask', \
+                    priority=5, workunits=0):
+        task_instance = TaskInstance()
+        task_instance.task_key = task_key
+        task_instance.priority = priority
+        task_instance.queued = datetime.now()
+        task_instance.save()
+        for i in range(workunits):
+            job = WorkUnit()
+            job.task_instance = task_instance
+            job.subtask_key = 'TestTask'
+            job.workunit = i
+            task_instance.queue_worker_request(job)
+        return task_instance
+
+    def test_load_policy(self):
+        """
+        Verifies policies are loaded from their class path with options
+        """
+        policy = load_policy('pydra.cluster.master.policies.FairSharePolicy',
+                             self.scheduler, share='task_key')
+        self.assertTrue(isinstance(policy, FairSharePolicy))
+        self.assertEqual(policy.share, 'task_key')
+
+    def test_priority(self):
+        """
+        Verifies the default policy matches TaskInstance.compute_score()
+        """
+        policy = PriorityPolicy(self.scheduler)
+        task_instance = self.create_task()
+        self.assertEqual(policy.score(task_instance),
+                         task_instance.compute_score())
+
+    def test_aging(self):
+        """
+        Verifies a starved task overtakes a higher priority task
+        """
+        policy = AgingPolicy(self.scheduler, aging=60)
+        high = self.create_task(priority=1)
+        low = self.create_task(priority=5)
+        self.assertTrue(policy.score(high) < policy.score(low))
+        low.last_succ_time = datetime.now() - timedelta(0, 60*5)
+        policy.dispatched(high, high)
+        self.assertTrue(policy.score(low) < policy.score(high))
+
+    def test_fair_share(self):
+        """
+        Verifies a task using fewer workers is scheduled first
+        """
+        policy = FairSharePolicy(self.scheduler)
+        busy = self.create_task()
+        idle = self.create_task()
+        policy.dispatched(busy, busy)
+        self.assertTrue(policy.score(idle) < policy.score(busy))
+
+    def test_fair_share_task_key(self):
+        """
+        Verifies shares are computed per task key
+        """
+        policy = FairSharePolicy(self.scheduler, share='task_key')
+        busy = self.create_task(task_key='demo.demo_task.TestTask')
+        other = self.create_task(task_key='demo.demo_task.TestTask')
+        idle = self.create_task()
+        policy.dispatched(busy, busy)
+        self.assertTrue(policy.score(idle) < policy.score(other))
+
+    def test_shortest_job_first(self):
+        """
+        Verifies tasks with less expected work remaining are scheduled first
+        """
+        policy = ShortestJobFirstPolicy(self.scheduler)
+        history = self.create_task()
+        job = WorkUnit()
+        job.task_instance = history
+        job.subtask_key = 'TestTask'
+        job.workunit = 0
+        job.completed = datetime.now()
+        job.started = job.completed - timedelta(0, 10)
+        job.status = STATUS_COMPLETE
+        job.save()
+
+        longer = self.create_task(workunits=10)
+        shorter = self.create_task(workunits=2)
+        self.assertEqual(policy.runtime(longer.task_key), 0)
+        policy.load_history([longer.task_key])
+        self.assertTrue(policy.score(shorter) < policy.score(longer))
+        self.assertEqual(policy.runtime(longer.task_key), 10)
+
+    def test_shortest_job_first_running(self):
+        """
+        Verifies runtimes recorded by running tasks are used without reading
+        the history
+        """
+        policy = ShortestJobFirstPolicy(self.scheduler)
+        task_instance = self.create_task(workunits=2)
+        now = datetime.now()
+        task_instance.record_runtime('TestTask', now - timedelta(0, 8), now, 2)
+        self.scheduler._active_tasks[task_instance.id] = task_instance
+
+        policy.update()
+        self.assertEqual(policy.runtime(task_instance.task_key), 4)
+        self.assertFalse(policy._loading)
+
+
+if __name__ == "__main__":
+    unittest.main()
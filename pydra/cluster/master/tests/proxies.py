@@ -0,0 +1,75 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from twisted.internet.defer import Deferred
+
+from pydra.cluster.master.scheduler import TaskScheduler
+from pydra.cluster.module import ModuleManager
+
+
+class RemoteProxy():
+    """
+    Class for proxying the remote reference of a worker avatar.  Remote calls
+    are recorded instead of being sent.
+    """
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def callRemote(self, *args):
+        self.calls.append((self.name,) + args)
+        return Deferred()
+
+
+class WorkerAvatarProxy():
+    """
+    Class for proxying a worker avatar
+    """
+    def __init__(self, name, calls):
+        self.name = name
+        self.remote = RemoteProxy(name, calls)
+
+
+class PackageProxy():
+    version = 'version'
+
+
+class TaskManagerProxy():
+    """
+    Class for proxying TaskManager functions used by the scheduler
+    """
+    def get_task_package(self, task_key):
+        return PackageProxy()
+
+
+class SchedulerManager(ModuleManager):
+    """
+    ModuleManager that loads only a TaskScheduler, with proxies for the
+    workers and the TaskManager.
+    """
+    modules = [TaskScheduler]
+
+    def __init__(self, worker_count=0):
+        ModuleManager.__init__(self)
+        self.calls = []
+        self.scheduler = self._modules[0]
+        self.scheduler.task_manager = TaskManagerProxy()
+        self.scheduler.workers = dict([('worker%d' % i, \
+                WorkerAvatarProxy('worker%d' % i, self.calls)) \
+                for i in range(worker_count)])
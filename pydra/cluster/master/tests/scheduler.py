@@ -0,0 +1,398 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from twisted.internet import reactor
+
+#environment must be configured before loading tests
+from pydra.config import configure_django_settings
+configure_django_settings()
+
+from pydra.cluster.tasks import STATUS_COMPLETE, STATUS_RUNNING
+from pydra.models import WorkUnit
+from proxies import SchedulerManager, WorkerAvatarProxy
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    scheduler_suite = unittest.TestSuite()
+    scheduler_suite.addTest(unittest.makeSuite(TaskScheduler_Test))
+    return scheduler_suite
+
+
+class TaskScheduler_Test(unittest.TestCase):
+    """
+    Tests for verifying how the TaskScheduler matches workers to requests
+    """
+    def setUp(self):
+        self.manager = SchedulerManager(4)
+        self.scheduler = self.manager.scheduler
+
+    def tearDown(self):
+        if self.scheduler._update_call.active():
+            self.scheduler._update_call.cancel()
+        self.scheduler.journal.stop()
+        reactor.removeSystemEventTrigger(self.scheduler._journal_trigger)
+
+    def start_task(self, task_key='demo.demo_task.TestParallelTask'):
+        """
+        Queues a task and dispatches its root to an idle worker so that the
+        task may request workers for its workunits.
+        """
+        task_instance = self.scheduler._queue_task(task_key)
+        worker_key, task_id = self.scheduler._schedule()[0]
+        task_instance.worker = worker_key
+        return task_instance
+
+    def add_workers(self, count=4):
+        for i in range(count):
+            self.scheduler.add_worker('worker%d' % i)
+
+    def test_ready_queue_contains_only_tasks_with_requests(self):
+        """
+        Verifies tasks leave the ready queue once their requests are consumed
+        """
+        self.scheduler.add_worker('worker0')
+        task_instance = self.start_task()
+        self.assertEqual(self.scheduler._poll_ready(), (None, None))
+        self.assertFalse(self.scheduler._ready_tasks)
+        self.assertTrue(task_instance.id in self.scheduler._active_tasks)
+
+    def test_ready_queue_updated_by_request_worker(self):
+        """
+        Verifies a worker request places the task back in the ready queue
+        """
+        self.scheduler.add_worker('worker0')
+        task_instance = self.start_task()
+
+        # main worker executes the first workunit locally, the second stays
+        # queued because there are no idle workers left.
+        self.scheduler.request_worker(task_instance.worker, 'TestTask', {}, 1)
+        self.scheduler.request_worker(task_instance.worker, 'TestTask', {}, 2)
+        self.assertEqual(len(self.manager.calls), 2)
+        ready, job = self.scheduler._poll_ready()
+        self.assertEqual(ready, task_instance)
+        self.assertEqual(job.workunit, 2)
+
+    def test_ready_queue_order(self):
+        """
+        Verifies requests are dispatched in order of task score, not in the
+        order tasks were queued
+        """
+        self.add_workers(2)
+        low = self.start_task()
+        high = self.start_task()
+        high.priority = 1
+        self.scheduler._update_queue()
+
+        for task_instance in (low, high):
+            job = WorkUnit()
+            job.task_instance = task_instance
+            job.subtask_key = 'TestTask'
+            task_instance.queue_worker_request(job)
+            self.scheduler._mark_ready(task_instance)
+        self.assertEqual(self.scheduler._poll_ready()[0], high)
+
+    def test_schedule_dispatches_all_idle_workers(self):
+        """
+        Verifies a single scheduling pass hands out every idle worker that
+        can be matched to a request
+        """
+        self.add_workers(4)
+        task_instance = self.start_task()
+        for i in range(20):
+            job = WorkUnit()
+            job.task_instance = task_instance
+            job.subtask_key = 'TestTask'
+            job.workunit = i
+            task_instance.queue_worker_request(job)
+        self.scheduler._mark_ready(task_instance)
+
+        # main worker plus the 3 remaining idle workers.  Batches are sized
+        # to share the pending work so some requests remain queued.
+        dispatched = self.scheduler._schedule()
+        self.assertEqual(len(dispatched), 4)
+        self.assertEqual(len(self.manager.calls), 5)
+        self.assertFalse(self.scheduler._idle_workers)
+        self.assertEqual(self.scheduler._poll_ready()[0], task_instance)
+
+    def queue_workunits(self, task_instance, count):
+        for i in range(count):
+            job = WorkUnit()
+            job.task_instance = task_instance
+            job.subtask_key = 'TestTask'
+            job.workunit = i
+            task_instance.queue_worker_request(job)
+
+    def test_batch_size_from_runtime(self):
+        """
+        Verifies batches are sized to the target duration once workunit
+        runtimes have been recorded
+        """
+        self.scheduler.add_worker('worker0')
+        task_instance = self.start_task()
+        self.queue_workunits(task_instance, 100)
+        self.assertEqual(task_instance.batch_size('TestTask', 5, 1, 10), 5)
+
+        completed = datetime.now()
+        task_instance.record_runtime('TestTask', \
+                                     completed - timedelta(0, 2), completed, 4)
+        self.assertEqual(task_instance.batch_size('TestTask', 5, 1, 10), 20)
+        batch = task_instance.get_batch(5, 1, 10)
+        self.assertEqual(batch.size, 20)
+
+    def test_batch_size_guided(self):
+        """
+        Verifies batches shrink as the pending workunits drain
+        """
+        self.scheduler.add_worker('worker0')
+        task_instance = self.start_task()
+        self.queue_workunits(task_instance, 16)
+        sizes = []
+        while task_instance.poll_worker_request():
+            sizes.append(task_instance.get_batch(5, 4).size)
+        self.assertEqual(sizes, [4, 3, 3, 2, 1, 1, 1, 1])
+
+    def test_task_progress(self):
+        """
+        Verifies progress pushed by the main worker is returned by
+        fetch_task_status and emitted to listeners
+        """
+        received = []
+        self.manager.register_listener('TASK_PROGRESS', \
+                                       lambda *args: received.append(args))
+        self.add_workers(2)
+        task_instance = self.start_task()
+        task_instance.status = STATUS_RUNNING
+        task_instance.started = datetime.now()
+
+        # only the main worker may report progress
+        other = self.scheduler._idle_workers[0]
+        self.scheduler.task_progress(other, 10)
+        self.scheduler.task_progress(task_instance.worker, 25)
+        self.assertEqual(received, [(task_instance.id, 25)])
+        statuses = self.scheduler.fetch_task_status()
+        self.assertEqual(statuses[task_instance.id]['p'], 25)
+        self.assertEqual(statuses[task_instance.id]['s'], STATUS_RUNNING)
+        self.assertFalse(self.manager.calls[1:])
+
+    def test_work_stealing(self):
+        """
+        Verifies an idle worker is given workunits stolen from a busy worker
+        once there are no pending requests
+        """
+        self.add_workers(3)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+        self.queue_workunits(task_instance, 8)
+
+        # worker0 is busy with all of the workunits
+        batch = task_instance.get_batch(8)
+        batch.worker = 'worker0'
+        batch.started = datetime.now()
+        self.scheduler._idle_workers.remove('worker0')
+        self.scheduler._active_workers['worker0'] = batch
+
+        self.scheduler.work_stealing = True
+        self.scheduler._schedule()
+        self.assertEqual(self.manager.calls[-1], ('worker0', 'steal_work', 4))
+
+        self.scheduler._work_stolen({'TestTask':[4, 5, 6, 7]}, 'worker0')
+        self.assertEqual(batch.size, 4)
+        self.assertEqual(sorted(batch.transmitable()['TestTask']), [0,1,2,3])
+        self.assertEqual(self.manager.calls[-1][:2], ('worker1', 'run_task'))
+        self.assertFalse(self.scheduler._stealing)
+
+    def test_work_stealing_batch_completed(self):
+        """
+        Verifies stolen workunits are requeued when the batch they were
+        stolen from completes before the steal returns
+        """
+        self.add_workers(3)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+        self.queue_workunits(task_instance, 8)
+
+        batch = task_instance.get_batch(8)
+        batch.worker = 'worker0'
+        batch.started = datetime.now()
+        self.scheduler._idle_workers.remove('worker0')
+        self.scheduler._active_workers['worker0'] = batch
+
+        self.scheduler.work_stealing = True
+        self.scheduler._schedule()
+        self.assertEqual(self.manager.calls[-1], ('worker0', 'steal_work', 4))
+
+        # the batch completes and worker0 returns to the idle pool
+        del self.scheduler._active_workers['worker0']
+        self.scheduler._idle_workers.append('worker0')
+
+        calls = len(self.manager.calls)
+        self.scheduler._work_stolen({'TestTask':[4, 5, 6, 7]}, 'worker0')
+        dispatched = []
+        for call in self.manager.calls[calls:]:
+            self.assertEqual(call[1], 'run_task')
+            dispatched.extend(call[5]['TestTask'])
+        # workunits without an idle worker wait on the task
+        self.assertTrue(dispatched)
+        queued = [job.workunit for job in task_instance._worker_requests]
+        self.assertEqual(sorted(dispatched + queued), [4, 5, 6, 7])
+        self.assertFalse(self.scheduler._stealing)
+
+    def test_speculative_execution(self):
+        """
+        Verifies a straggling batch is duplicated on an idle worker and the
+        copy that completes last is stopped
+        """
+        self.add_workers(3)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+        self.queue_workunits(task_instance, 2)
+        completed = datetime.now()
+        task_instance.record_runtime('TestTask', \
+                                     completed - timedelta(0, 1), completed)
+
+        # worker0 has run two workunits for far longer than expected
+        batch = task_instance.get_batch(2)
+        batch.worker = 'worker0'
+        batch.started = completed - timedelta(0, 60)
+        self.scheduler._idle_workers.remove('worker0')
+        self.scheduler._active_workers['worker0'] = batch
+        task_instance.running_workers.append('worker0')
+
+        self.scheduler.speculative_execution = True
+        self.scheduler._schedule()
+        duplicate_key, call = self.manager.calls[-1][:2]
+        self.assertEqual(call, 'run_task')
+        self.assertEqual(self.scheduler._speculative['worker0'], duplicate_key)
+        duplicate = self.scheduler._active_workers[duplicate_key]
+        self.assertEqual(sorted(duplicate.transmitable()['TestTask']), [0,1])
+
+        # the duplicate completes first, the straggler is stopped
+        self.scheduler.send_results(duplicate_key, \
+                                    [(1, 'a', False), (0, 'b', False)])
+        self.assertTrue(('worker0', 'stop_task') in self.manager.calls)
+        self.assertEqual(batch[0].status, STATUS_COMPLETE)
+        self.assertFalse(self.scheduler._speculative)
+
+        self.scheduler.worker_stopped('worker0')
+        self.assertEqual(batch[0].status, STATUS_COMPLETE)
+        self.assertTrue('worker0' in self.scheduler._idle_workers)
+        self.assertFalse(self.scheduler._superseded)
+
+        # a stop arriving after the worker returned to the idle pool
+        self.scheduler.worker_stopped('worker0')
+        self.assertEqual(self.scheduler._idle_workers.count('worker0'), 1)
+
+    def test_locality(self):
+        """
+        Verifies workunits are given to workers on the host storing their
+        input, and wait for one before being given to a remote worker
+        """
+        for key in ('nodeA:11890:0', 'nodeB:11890:0', 'nodeB:11890:1'):
+            self.scheduler.workers[key] = WorkerAvatarProxy(key, \
+                                                            self.manager.calls)
+            self.scheduler.add_worker(key)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+        main_worker = task_instance.worker
+
+        # the worker on nodeC is busy, the request waits for it
+        self.scheduler.workers['nodeC:11890:0'] = WorkerAvatarProxy( \
+                'nodeC:11890:0', self.manager.calls)
+        self.scheduler.request_worker(main_worker, 'TestTask', {}, 0, 'nodeC')
+        self.assertEqual(len(self.manager.calls), 1)
+
+        # a later request with a local worker is run ahead of it
+        self.scheduler.request_worker(main_worker, 'TestTask', {}, 1, 'nodeA')
+        worker_key, call, task, version, args, workunits = \
+                self.manager.calls[-1][:6]
+        self.assertEqual(worker_key, 'nodeA:11890:0')
+        self.assertEqual(workunits, {'TestTask':[1]})
+
+        # once the delay expires the request is run remotely
+        task_instance.poll_worker_request().requested -= 10
+        self.scheduler._schedule()
+        worker_key, call, task, version, args, workunits = \
+                self.manager.calls[-1][:6]
+        self.assertEqual(workunits, {'TestTask':[0]})
+        self.assertFalse(self.scheduler._idle_workers)
+
+    def test_locality_unknown_host(self):
+        """
+        Verifies requests do not wait for a host without workers, such as the
+        file server storing their input
+        """
+        self.add_workers(2)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+
+        self.scheduler.request_worker(task_instance.worker, 'TestTask', {}, 0,
+                                      'fileserver')
+        self.assertEqual(len(self.manager.calls), 2)
+
+    def test_locality_skips_waiting_task(self):
+        """
+        Verifies a task waiting for a local worker does not hold idle workers
+        back from lower ranked tasks
+        """
+        self.add_workers(3)
+        self.scheduler.workers['nodeC:11890:0'] = WorkerAvatarProxy( \
+                'nodeC:11890:0', self.manager.calls)
+        first = self.start_task()
+        first.local_workunit = WorkUnit()
+        second = self.start_task()
+        second.local_workunit = WorkUnit()
+        calls = len(self.manager.calls)
+
+        self.scheduler.request_worker(first.worker, 'TestTask', {}, 0, 'nodeC')
+        self.assertEqual(len(self.manager.calls), calls)
+        self.scheduler.request_worker(second.worker, 'TestTask', {}, 1)
+        self.assertEqual(len(self.manager.calls), calls + 1)
+
+        # the waiting task is still queued
+        self.assertEqual(self.scheduler._poll_ready()[0], first)
+
+    def test_locality_worker(self):
+        """
+        Verifies a workunit may name the worker it prefers
+        """
+        self.add_workers(4)
+        task_instance = self.start_task()
+        task_instance.local_workunit = WorkUnit()
+
+        self.scheduler.request_worker(task_instance.worker, 'TestTask', {}, 0,
+                                      'worker1')
+        self.assertEqual(self.manager.calls[-1][0], 'worker1')
+
+        # a busy worker is not waited for
+        self.scheduler.workers['worker1'] = WorkerAvatarProxy('worker1', \
+                                                              self.manager.calls)
+        self.scheduler.request_worker(task_instance.worker, 'TestTask', {}, 1,
+                                      'worker1')
+        self.assertNotEqual(self.manager.calls[-1][0], 'worker1')
+        self.assertEqual(self.manager.calls[-1][5], {'TestTask':[1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -46,6 +46,7 @@ class NodeServer(ModuleManager):
             WorkerConnectionManager,
             MasterConnectionManager,
             TaskSyncClient,
+            ShuffleServer,
             NodeZeroConfService,
             NodeLogAggregator,
         ]
@@ -0,0 +1,99 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import with_statement
+import os
+
+from pydra_settings import SHUFFLE_DIR
+from pydra.cluster.module import Module
+
+import logging
+logger = logging.getLogger('root')
+
+
+def read_chunk(name, offset, size):
+    """
+    Reads a chunk of a shuffle file.
+
+    @param name - name of the file within SHUFFLE_DIR
+    @param offset - offset of the chunk
+    @param size - most bytes to read
+    @returns tuple of (size of the file, chunk)
+    """
+    if os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError('Invalid shuffle file: %s' % name)
+
+    with open(os.path.join(SHUFFLE_DIR, name), 'rb') as f:
+        f.seek(offset)
+        return os.fstat(f.fileno()).st_size, f.read(size)
+
+
+class ShuffleServer(Module):
+    """
+    Serves the shuffle files stored on this node.  Workers read shuffle files
+    in chunks.  Files stored on this node are read directly, requests for
+    files on other nodes are relayed through the master to the node storing
+    them.
+    """
+
+    _shared = [
+        'master',
+    ]
+
+    def __init__(self):
+        self._remotes = [
+            ('MASTER', self.read_shuffle),
+            ('WORKER', self.fetch_shuffle),
+        ]
+
+        self._listeners = {
+            'NODE_INITIALIZED':self.node_initialized,
+        }
+
+        self.node_key = None
+
+
+    def node_initialized(self, node_key):
+        self.node_key = node_key
+
+
+    def read_shuffle(self, master, name, offset, size):
+        """
+        Reads a chunk of a shuffle file for a worker on another node.
+        """
+        return read_chunk(name, offset, size)
+
+
+    def fetch_shuffle(self, worker, location, offset, size):
+        """
+        Reads a chunk of a shuffle file for a worker on this node.
+
+        @param worker - worker requesting the chunk
+        @param location - node key and name of the file, separated by a slash
+        @param offset - offset of the chunk
+        @param size - most bytes to read
+        @returns tuple of (size of the file, chunk)
+        """
+        node_key, name = location.rsplit('/', 1)
+        if node_key == self.node_key:
+            return read_chunk(name, offset, size)
+
+        logger.debug('Fetching shuffle chunk %s:%s from %s' % (name, offset, \
+                                                               node_key))
+        return self.master.remote.callRemote('fetch_shuffle', location, \
+                                             offset, size)
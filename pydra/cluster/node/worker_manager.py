@@ -21,6 +21,7 @@ from __future__ import with_statement
 from subprocess import Popen
 from threading import RLock
 
+from twisted.internet import reactor
 from twisted.internet.defer import Deferred
 
 import pydra
@@ -37,7 +38,7 @@ logger = logging.getLogger('root')
 
 class WorkerManager(Module):
 
-    _shared = ['master', 'workers', 'worker_connection_manager']
+    _shared = ['master', 'workers', 'worker_connection_manager', 'info']
 
     def __init__(self):
         self._remotes = [
@@ -53,13 +54,15 @@ class WorkerManager(Module):
             ('MASTER', self.receive_results),
             ('MASTER', self.release_worker),
             ('MASTER', self.subtask_started),
+            ('MASTER', self.steal_work),
 
             # master proxy - functions exposed to the workers that are passed
             # through to the Master
             ('WORKER', self.send_results),
             ('WORKER', self.request_worker),
             ('WORKER', self.worker_stopped),
-            ('WORKER', self.request_worker_release)
+            ('WORKER', self.request_worker_release),
+            ('WORKER', self.task_progress)
 
         ]
 
@@ -68,6 +71,7 @@ class WorkerManager(Module):
         }
 
         self._listeners = {
+            'NODE_INITIALIZED':self.start_pool,
             'WORKER_CONNECTED':self.run_task_delayed,
             'WORKER_DISCONNECTED':self.clean_up_finished_worker
         }
@@ -75,6 +79,7 @@ class WorkerManager(Module):
         self.__lock = RLock()
         self.workers_finishing = []
         self.initialized = False
+        self.pool = False
 
 
     def _register(self, manager):
@@ -102,6 +107,76 @@ class WorkerManager(Module):
                     except OSError:
                         logger.warn('Error cleaning up worker process, retrying')
 
+        # replace the worker so that a warm process is waiting for the next
+        # task assigned to this worker key
+        if self.pool:
+            with self.__lock:
+                if worker.name not in self.workers:
+                    self.spawn_worker(worker.name)
+
+
+    def start_pool(self, node_key):
+        """
+        Starts a pool of worker processes, one for each core of this node.
+        The workers start and connect to the node before they are assigned a
+        task so that tasks do not wait for the worker process to start.  The
+        pool is not started if pydra_settings.WORKER_POOL is False.
+
+        @param node_key - key of this node assigned by the master
+        """
+        if not pydra_settings.WORKER_POOL:
+            return
+        if not self.pool:
+            self.pool = True
+            reactor.addSystemEventTrigger('before', 'shutdown', self.stop_pool)
+
+        with self.__lock:
+            for i in range(self.info['cores']):
+                worker_key = '%s:%s' % (node_key, i)
+                if worker_key not in self.workers:
+                    self.spawn_worker(worker_key)
+
+
+    def stop_pool(self):
+        """
+        Stops replacing workers that exit.  Called when the node shuts down.
+        """
+        self.pool = False
+
+
+    def spawn_worker(self, worker_key):
+        """
+        Starts a worker process.  The worker is added to the pool of workers
+        but can not be sent remote calls until it has connected.
+
+        @param worker_key - key of worker to start
+        @returns worker avatar for the new worker
+        """
+        logger.debug('Spawning worker: %s', worker_key)
+        worker = WorkerAvatar(self.worker_connection_manager, worker_key)
+        worker.worker_key = worker_key
+        pydra_root = pydra.__file__[:pydra.__file__.rfind('/')]
+        try:
+            worker.popen = Popen(['python',
+                        '%s/cluster/worker/worker.py' % pydra_root,
+                        worker_key,
+                        pydra_settings.WORKER_PORT.__str__()])
+        except OSError:
+            # XXX ocassionally processes will have a communcation error
+            # while loading.  The process will be running but the POpen
+            # object is not constructed.  This means that we have no
+            # access to the subprocess functions.  Instead we must get
+            # the pid from the newly run process after it starts.  The
+            # pid can then be used instead of the Popen object.
+            #
+            # relevant bugs:
+            #    http://pydra-project.osuosl.org/ticket/158
+            #    http://bugs.python.org/issue1068268
+            logger.warn('OSError while spawning process, failing back to pid. see ticket #158')
+            worker.pid_pending = True
+        self.workers[worker_key] = worker
+        return worker
+
 
     def init_node(self, avatar_name, master_host, master_port, node_key):
         """
@@ -213,6 +288,10 @@ class WorkerManager(Module):
         return self.proxy_to_master('request_worker_release', *args, **kwargs)
 
 
+    def task_progress(self, *args, **kwargs):
+        return self.proxy_to_master('task_progress', *args, **kwargs)
+
+
     def retrieve_task_failed(self, *args, **kwargs):
         pass
 
@@ -253,41 +332,24 @@ class WorkerManager(Module):
         worker = None
 
         with self.__lock:
-            if worker_key in self.workers:
+            worker = self.workers.get(worker_key, None)
+            if worker and worker.authenticated:
                 # worker exists.  reuse it.
                 logger.debug('RunTask - Using existing worker %s' % worker_key)
-                worker = self.workers[worker_key]
                 worker.run_task_deferred = worker.remote.callRemote('run_task',\
                         key, version, args, workunits, main_worker, task_id)
             else:
-                # worker not running. start it saving the information required
-                # to start the subtask.  This function will return a deferred
-                # to the master.  The deferred will be
-                logger.debug('RunTask - Spawning worker: %s', worker_key)
-                worker = WorkerAvatar(self.worker_connection_manager, \
-                                                            worker_key)
-                worker.worker_key = worker_key
+                # worker not running or still starting.  save the information
+                # required to start the subtask.  This function will return a
+                # deferred to the master.  The deferred will be called once
+                # the worker has connected and started the task.
+                if not worker:
+                    worker = self.spawn_worker(worker_key)
+                else:
+                    logger.debug('RunTask - Waiting for worker %s' % worker_key)
                 worker.run_task_deferred = Deferred()
-                pydra_root = pydra.__file__[:pydra.__file__.rfind('/')]
-                try:
-                    worker.popen = Popen(['python',
-                                '%s/cluster/worker/worker.py' % pydra_root,
-                                worker_key,
-                                pydra_settings.WORKER_PORT.__str__()])
-                except OSError:
-                    # XXX ocassionally processes will have a communcation error
-                    # while loading.  The process will be running but the POpen
-                    # object is not constructed.  This means that we have no
-                    # access to the subprocess functions.  Instead we must get
-                    # the pid from the newly run process after it starts.  The
-                    # pid can then be used instead of the Popen object.
-                    #
-                    # relevant bugs:
-                    #    http://pydra-project.osuosl.org/ticket/158
-                    #    http://bugs.python.org/issue1068268
-                    debug.warn('OSError while spawning process, failing back to pid. see ticket #158')
+                if worker.pid_pending:
                     worker.run_task_deferred.addCallback(worker.get_pid)
-                self.workers[worker_key] = worker
 
             worker.key = key
             worker.version = version
@@ -308,8 +370,14 @@ class WorkerManager(Module):
         the deferred originally returned in run_task to the deferred returned
         from worker.run_task.  This will cause the result to propagate through
         the deferreds back to master.
+
+        Workers started by the pool have no task until one is assigned, they
+        wait for run_task to be called.
         """
         sent_deferred = worker.run_task_deferred
+        if sent_deferred is None:
+            logger.debug('Worker %s is ready' % worker.worker_key)
+            return
         deferred = self._run_task(worker.key, worker.version, None, None, \
                 worker.worker_key, worker.args, worker.workunits, \
                 worker.main_worker, worker.task_id)
@@ -369,6 +437,14 @@ class WorkerManager(Module):
                 self.workers_finishing.append(worker)
 
 
+    def steal_work(self, master, worker_id, *args):
+        """
+        Removes workunits that have not been started from the batch running
+        on a worker
+        """
+        return self.proxy_to_worker('steal_work', worker_id, *args)
+
+
     def stop_task(self, master, worker_id):
         return self.proxy_to_worker('stop_task', worker_id)
 
@@ -1,3 +1,9 @@
+from __future__ import with_statement
+
+from contextlib import contextmanager
+import threading
+import time
+
 database_names = {
     "sqlite2": "pysqlite2.dbapi2",
     "sqlite3": "sqlite3",
@@ -22,13 +28,148 @@ elif "sqlite2" in databases:
 
 from pydra.util.key import keyable
 
+class ConnectionPool(object):
+    """
+    Thread-safe pool of connections to a database.
+
+    Connections are created on demand, up to size connections, and are reused
+    once released. A connection that has been idle for more than
+    ping_interval seconds is checked with the ping query before it is reused,
+    and replaced if the check fails.
+    """
+
+    def __init__(self, dbapi, args, kwargs, size=5, ping="SELECT 1",
+        ping_interval=30):
+        self.dbapi = dbapi
+        self.args = args
+        self.kwargs = kwargs
+        self.size = size
+        self.ping = ping
+        self.ping_interval = ping_interval
+
+        # Idle connections, with the time they were released.
+        self.idle = []
+        self.count = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Take a connection from the pool, waiting for one to be released if
+        size connections are in use.
+        """
+
+        while True:
+            with self.condition:
+                while not self.idle and self.count >= self.size:
+                    self.condition.wait()
+                if self.idle:
+                    connection, released = self.idle.pop()
+                else:
+                    self.count += 1
+                    connection = None
+
+            if connection is None:
+                try:
+                    return self.dbapi.connect(*self.args, **self.kwargs)
+                except:
+                    with self.condition:
+                        self.count -= 1
+                        self.condition.notify()
+                    raise
+
+            if time.time() - released < self.ping_interval \
+                or self.healthy(connection):
+                return connection
+            self.discard(connection)
+
+    def release(self, connection):
+        """
+        Return a connection to the pool.
+        """
+
+        with self.condition:
+            self.idle.append((connection, time.time()))
+            self.condition.notify()
+
+    def healthy(self, connection):
+        """
+        Check that a connection is still usable.
+        """
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.ping)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except self.dbapi.Error:
+            return False
+
+    def discard(self, connection):
+        """
+        Close a broken connection, making room for a new one.
+        """
+
+        with self.condition:
+            self.count -= 1
+            self.condition.notify()
+        try:
+            connection.close()
+        except self.dbapi.Error:
+            pass
+
+    def close(self):
+        """
+        Close the idle connections.
+        """
+
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection, released in idle:
+            self.discard(connection)
+
+pools = {}
+pools_lock = threading.Lock()
+
+# DBAPI modules whose connections refuse to be used by a thread other than
+# the one that made them, unless check_same_thread is False.
+thread_bound = ("sqlite3", "pysqlite2.dbapi2")
+
+def get_pool(dbapi, args, kwargs, **options):
+    """
+    Get the pool of connections made with the given arguments and options,
+    creating it if needed.
+
+    Pools are shared by every SQLBackend of a process, so backends thawed for
+    different workunits on a worker reuse the same connections.
+    """
+
+    if dbapi.__name__ in thread_bound:
+        # pooled connections are handed from thread to thread, but never
+        # used by two threads at once
+        kwargs = dict(kwargs)
+        kwargs.setdefault("check_same_thread", False)
+
+    key = (dbapi.__name__, repr(args), repr(sorted(kwargs.items())),
+        repr(sorted(options.items())))
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(dbapi, args, kwargs, **options)
+        return pools[key]
+
 @keyable
 class SQLBackend(object):
     """
     Backend for interfacing with DBAPI-compliant SQL databases.
+
+    Besides handle, connections for concurrent use are taken from a pool
+    with connection(). The pool_size, ping and ping_interval keyword
+    arguments configure the pool; other arguments are given to the DBAPI
+    connect().
     """
 
     handle = None
+    pool = None
 
     def __init__(self, db, *args, **kwargs):
         if db in databases:
@@ -45,20 +186,56 @@ class SQLBackend(object):
         """
         Open a database connection.
 
-        SQLBackend can only have one connection open per instance.
+        SQLBackend can only have one handle open per instance. Connections
+        from the pool are not limited to one.
         """
 
+        options = {}
+        for name, option in (("pool_size", "size"), ("ping", "ping"),
+            ("ping_interval", "ping_interval")):
+            if name in kwargs:
+                options[option] = kwargs.pop(name)
+
         if not self.handle:
             self.handle = self.dbapi.connect(*args, **kwargs)
+            self.pool = get_pool(self.dbapi, args, kwargs, **options)
 
     def disconnect(self):
         """
         Disconnect from the current database, if connected.
+
+        The pool is shared with other instances, and is left open.
         """
 
         if self.handle:
             self.handle.close()
         self.handle = None
+        self.pool = None
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool for the duration of a with block.
+
+        Transactions that are not committed by the end of the block are
+        rolled back, and the connection is discarded if it can't be rolled
+        back.
+        """
+
+        if not self.pool:
+            raise ValueError, "Not connected"
+
+        pool = self.pool
+        connection = pool.acquire()
+        try:
+            yield connection
+        finally:
+            try:
+                connection.rollback()
+            except self.dbapi.Error:
+                pool.discard(connection)
+            else:
+                pool.release(connection)
 
     @property
     def connected(self):
@@ -1,3 +1,6 @@
+from __future__ import with_statement
+
+from contextlib import contextmanager
 import mmap
 import os
 import os.path
@@ -5,14 +8,42 @@ import os.path
 from pydra.cluster.tasks.datasource.slicer import LineSlicer
 from pydra.util.key import keyable
 
+def path_host(path, mounts="/proc/mounts"):
+    """
+    Finds the host that stores a path on its local disk.
+
+    Paths on network filesystems such as NFS are stored by the server of the
+    mount they are on.  Other paths are assumed to be stored locally, and no
+    host is returned since any node may have a path of the same name.
+    """
+
+    path = os.path.realpath(path)
+    best, host = "", None
+    try:
+        with open(mounts) as f:
+            for line in f:
+                device, mount, fstype = line.split()[:3]
+                if path != mount and not path.startswith(mount.rstrip("/") + "/"):
+                    continue
+                if len(mount) > len(best):
+                    best = mount
+                    if fstype.startswith("nfs") and ":" in device:
+                        host = device.split(":", 1)[0]
+                    else:
+                        host = None
+    except IOError:
+        pass
+    return host
+
 @keyable
 class DirSelector(object):
     """
     Selects a directory, yielding files.
     """
 
-    def __init__(self, path, recursive=True):
+    def __init__(self, path, recursive=True, host=None):
         self.path = path
+        self.host = host
         if recursive:
             self.files = set()
             for directory, chaff, files in os.walk(self.path):
@@ -36,14 +67,25 @@ class DirSelector(object):
     def __len__(self):
         return len(self.files)
 
+    def location(self, key):
+        """
+        Returns the host storing the file of a key, or None if unknown.
+        """
+
+        if self.host:
+            return self.host
+        path = getattr(key, "path", key)
+        return path_host(os.path.join(self.path, path))
+
 @keyable
 class FileSelector(object):
     """
     Selects files. Can yield file-based slicers.
     """
 
-    def __init__(self, path):
+    def __init__(self, path, host=None):
         self.path = path
+        self.host = host
 
         self._handle = None
 
@@ -59,10 +101,20 @@ class FileSelector(object):
         self._handle = m
         return m
 
+    def location(self, key=None):
+        """
+        Returns the host storing the file, or None if unknown.
+        """
+
+        return self.host or path_host(self.path)
+
 @keyable
 class SQLSelector(object):
     """
     Selects rows from a SQL database.
+
+    Connections are borrowed from the pool of the backend, if it has one, so
+    that threads using the selector do not share a connection.
     """
 
     def __init__(self, db):
@@ -70,3 +122,30 @@ class SQLSelector(object):
             self.handle = db.handle
         else:
             self.handle = db
+        self.db = db
+        self.dbapi = getattr(db, "dbapi", None)
+        self.pool = getattr(db, "pool", None)
+
+    def __iter__(self):
+        # The database is a single input.
+        yield ()
+
+    def load(self, key):
+        """
+        Returns a cursor of the handle.
+        """
+
+        return self.handle.cursor()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block, from the pool of
+        the backend if it has one.
+        """
+
+        if self.pool:
+            with self.db.connection() as connection:
+                yield connection
+        else:
+            yield self.handle
@@ -46,17 +46,29 @@ def mma(old, new, weight):
 class LineSlicer(IterSlicer):
     """
     Slicer specialized for handling text blobs.
+
+    Separators are found by scanning buffers of buffer_size bytes read from
+    the handle. Handles that can be searched directly, like the mmap of a
+    FileSelector, are scanned in place.
     """
 
-    def __init__(self, handle, sep="\n"):
+    def __init__(self, handle, sep="\n", buffer_size=65536):
+        if buffer_size < len(sep):
+            raise ValueError, "buffer_size must hold at least one separator"
         if not hasattr(handle, "read"):
             handle = cStringIO.StringIO(handle)
         self.handle = handle
         self.sep = sep
+        self.buffer_size = buffer_size
 
         self._endpos = None
 
-        self.handle.seek(0)
+        # Position to scan from, and the buffer read from the handle.
+        self._pos = 0
+        self._offset = 0
+        self._buffer = ""
+        self._eof = False
+
         self._state = self.find_sep()
 
     def __getitem__(self, key):
@@ -64,7 +76,7 @@ class LineSlicer(IterSlicer):
             raise TypeError
         # Hack together a copy of ourselves, set its state, and then expand
         # the final slice to cover the last sep in the handle
-        ls = LineSlicer(self.handle, self.sep)
+        ls = LineSlicer(self.handle, self.sep, self.buffer_size)
         start, stop = key.start, key.stop
         if start > stop:
             start, stop = stop, start
@@ -82,24 +94,58 @@ class LineSlicer(IterSlicer):
             raise StopIteration
         return self._state
 
+    def line(self, pos):
+        """
+        Returns the line following the separator at pos.
+
+        Lines of handles that can be searched directly, like the mmap of a
+        FileSelector, are buffers sharing the memory of the handle instead of
+        copies.
+        """
+
+        start = pos + len(self.sep)
+        saved, self._pos = self._pos, start
+        try:
+            stop = self.find_sep()
+        finally:
+            self._pos = saved
+
+        if hasattr(self.handle, "find"):
+            if stop is None:
+                return buffer(self.handle, start)
+            return buffer(self.handle, start, stop - start)
+
+        self.handle.seek(start)
+        if stop is None:
+            return self.handle.read()
+        return self.handle.read(stop - start)
+
     def find_sep(self):
-        position = self.handle.tell()
-        count = 80
-        s = ""
-        temp = self.handle.read(count)
-        while temp:
-            s += temp
-            index = s.find(self.sep)
-            if index != -1:
-                # Update file handle
-                self.handle.seek(position + index + 1)
-                # Update approximate count
-                count = mma(count, index, 100)
-
-                return position + index
-            temp = self.handle.read(count)
-        # EOF
-        return None
+        if hasattr(self.handle, "find"):
+            index = self.handle.find(self.sep, self._pos)
+            if index == -1:
+                return None
+            self._pos = index + 1
+            return index
+
+        while True:
+            start = self._pos - self._offset
+            if 0 <= start <= len(self._buffer):
+                index = self._buffer.find(self.sep, start)
+                if index != -1:
+                    self._pos = self._offset + index + 1
+                    return self._offset + index
+                if self._eof:
+                    return None
+                # A sep may straddle the end of the buffer
+                end = self._offset + len(self._buffer) - len(self.sep) + 1
+                self._pos = max(self._pos, end)
+
+            # The handle may be shared with other slicers, so always seek
+            self.handle.seek(self._pos)
+            self._offset = self._pos
+            self._buffer = self.handle.read(self.buffer_size)
+            self._eof = len(self._buffer) < self.buffer_size
 
     @property
     def state(self):
@@ -114,4 +160,4 @@ class LineSlicer(IterSlicer):
             self._state, self._endpos = value.start, value.stop
         else:
             self._state = value
-        self.handle.seek(self._state + 1)
+        self._pos = self._state + 1
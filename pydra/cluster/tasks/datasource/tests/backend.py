@@ -1,5 +1,10 @@
 #!/usr/bin/env python
 
+from __future__ import with_statement
+
+import os
+import tempfile
+import threading
 import unittest
 
 from pydra.cluster.tasks.datasource.backend import SQLBackend
@@ -17,5 +22,97 @@ class SQLTest(unittest.TestCase):
         self.assertFalse(sb.connected)
         sb.connect(":memory:")
 
+class PoolTest(unittest.TestCase):
+
+    def setUp(self):
+
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.sb = SQLBackend("sqlite", self.path, pool_size=2)
+
+    def tearDown(self):
+
+        self.sb.pool.close()
+        self.sb.disconnect()
+        os.remove(self.path)
+
+    def test_reuse(self):
+
+        with self.sb.connection() as first:
+            pass
+        with self.sb.connection() as second:
+            self.assertTrue(first is second)
+
+    def test_shared(self):
+
+        sb = SQLBackend("sqlite", self.path, pool_size=2)
+        self.assertTrue(sb.pool is self.sb.pool)
+        self.assertTrue(sb.handle is not self.sb.handle)
+
+    def test_options(self):
+
+        sb = SQLBackend("sqlite", self.path, pool_size=3)
+        self.assertTrue(sb.pool is not self.sb.pool)
+        self.assertEqual(3, sb.pool.size)
+        self.assertEqual(2, self.sb.pool.size)
+        sb.pool.close()
+
+    def test_threads(self):
+
+        with self.sb.connection() as c:
+            c.execute("CREATE TABLE t (v INTEGER)")
+            c.commit()
+
+        def insert():
+            with self.sb.connection() as c:
+                c.execute("INSERT INTO t VALUES (1)")
+                c.commit()
+        t = threading.Thread(target=insert)
+        t.start()
+        t.join()
+        insert()
+
+        with self.sb.connection() as c:
+            self.assertEqual([(2, )], c.execute("SELECT COUNT(*) FROM t").fetchall())
+
+    def test_size(self):
+
+        pool = self.sb.pool
+        connections = [pool.acquire(), pool.acquire()]
+        acquired = []
+        t = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        t.start()
+        t.join(0.1)
+        self.assertEqual([], acquired)
+        pool.release(connections[0])
+        t.join()
+        self.assertTrue(acquired[0] is connections[0])
+        pool.release(connections[1])
+        pool.release(acquired[0])
+
+    def test_health(self):
+
+        pool = self.sb.pool
+        connection = pool.acquire()
+        connection.close()
+        pool.release(connection)
+        pool.ping_interval = 0
+        with self.sb.connection() as c:
+            self.assertTrue(c is not connection)
+            c.execute("SELECT 1")
+        self.assertEqual(1, pool.count)
+
+    def test_rollback(self):
+
+        def fail():
+            with self.sb.connection() as c:
+                c.execute("CREATE TABLE t (v INTEGER)")
+                c.commit()
+                c.execute("INSERT INTO t VALUES (1)")
+                raise KeyError
+        self.assertRaises(KeyError, fail)
+        with self.sb.connection() as c:
+            self.assertEqual([(0, )], c.execute("SELECT COUNT(*) FROM t").fetchall())
+
 if __name__ == "__main__":
     unittest.main()
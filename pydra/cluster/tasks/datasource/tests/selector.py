@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import tempfile
 import unittest
 
-from pydra.cluster.tasks.datasource.selector import DirSelector, FileSelector
+from pydra.cluster.tasks.datasource.selector import (DirSelector, FileSelector,
+    path_host)
 
 class DirSelectorCheeseTest(unittest.TestCase):
 
@@ -18,6 +20,37 @@ class DirSelectorCheeseTest(unittest.TestCase):
 
         self.assertTrue(hasattr(self.ds, "key") and self.ds.key)
 
+class PathHostTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.mounts = tempfile.NamedTemporaryFile()
+        self.mounts.write("/dev/sda1 / ext3 rw 0 0\n"
+            "fileserver:/export/data /mnt/data nfs rw 0 0\n"
+            "/dev/sdb1 /mnt/data/local ext3 rw 0 0\n")
+        self.mounts.flush()
+
+    def tearDown(self):
+
+        self.mounts.close()
+
+    def test_nfs(self):
+
+        host = path_host("/mnt/data/logs/a.log", self.mounts.name)
+        self.assertEqual(host, "fileserver")
+
+    def test_local(self):
+
+        self.assertEqual(path_host("/tmp/a.log", self.mounts.name), None)
+        self.assertEqual(path_host("/mnt/data/local/a.log", self.mounts.name),
+            None)
+        self.assertEqual(path_host("/mnt/datafile", self.mounts.name), None)
+
+    def test_selector_host(self):
+
+        fs = FileSelector("cheeses/cheddar.txt", host="node1")
+        self.assertEqual(fs.location(), "node1")
+
 class FileSelectorTest(unittest.TestCase):
 
     def setUp(self):
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import mmap
+import tempfile
 import unittest
 
 from pydra.cluster.tasks.datasource.slicer import IterSlicer, MapSlicer, LineSlicer
@@ -74,5 +76,61 @@ class LineSlicerTest(unittest.TestCase):
         ls = self.slicer[50:100]
         self.assertEqual([51, 108], [pos for pos in ls])
 
+    def test_line(self):
+
+        self.assertEqual("            Jackdaws love my big sphinx of quartz.",
+            self.slicer.line(0))
+        self.assertEqual("            ", self.slicer.line(161))
+        self.assertEqual([51, 108, 161], [pos for pos in self.slicer])
+
+class LineSlicerBufferTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.s = "".join("line %d\r\n" % i for i in range(1000))
+        self.expected = []
+        pos = self.s.find("\n")
+        while pos != -1:
+            self.expected.append(pos)
+            pos = self.s.find("\n", pos + 1)
+
+    def test_small_buffer(self):
+
+        slicer = LineSlicer(self.s, buffer_size=7)
+        self.assertEqual(self.expected[1:], [pos for pos in slicer])
+
+    def test_sep_across_buffers(self):
+
+        expected = [pos - 1 for pos in self.expected]
+        slicer = LineSlicer(self.s, sep="\r\n", buffer_size=5)
+        self.assertEqual(expected[1:], [pos for pos in slicer])
+
+    def test_buffer_too_small(self):
+
+        self.assertRaises(ValueError, LineSlicer, self.s, sep="\r\n",
+            buffer_size=1)
+
+    def test_getitem(self):
+
+        slicer = LineSlicer(self.s, buffer_size=16)
+        ls = slicer[1000:2000]
+        expected = [pos for pos in self.expected if pos > 1000]
+        self.assertEqual(expected[:expected.index(ls.state.stop) + 1],
+            [pos for pos in ls])
+
+    def test_mmap(self):
+
+        f = tempfile.TemporaryFile()
+        f.write(self.s)
+        f.flush()
+        m = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+        slicer = LineSlicer(m)
+        self.assertEqual(self.expected[1:], [pos for pos in slicer])
+        line = slicer.line(self.expected[0])
+        self.assertTrue(isinstance(line, buffer))
+        self.assertEqual("line 1\r", str(line))
+        m.close()
+        f.close()
+
 if __name__ == "__main__":
     unittest.main()
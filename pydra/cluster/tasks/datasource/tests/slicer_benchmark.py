@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for scanning a text file for lines with LineSlicer.  Three scans
+are measured:
+
+    legacy   - the previous find_sep, reading 80 bytes at a time
+    buffered - LineSlicer over a file handle, reading buffer_size bytes at
+               a time
+    mmap     - LineSlicer over the mmap of a FileSelector, searched in place
+
+usage: python slicer_benchmark.py [line_count ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from pydra.cluster.tasks.datasource.selector import FileSelector
+from pydra.cluster.tasks.datasource.slicer import LineSlicer, mma
+
+class LegacyLineSlicer(LineSlicer):
+    """LineSlicer using the previous find_sep"""
+
+    def find_sep(self):
+        position = self.handle.tell()
+        count = 80
+        s = ""
+        temp = self.handle.read(count)
+        while temp:
+            s += temp
+            index = s.find(self.sep)
+            if index != -1:
+                self.handle.seek(position + index + 1)
+                count = mma(count, index, 100)
+                return position + index
+            temp = self.handle.read(count)
+        return None
+
+def scan(slicer):
+    count = 0
+    for pos in slicer:
+        count += 1
+    return count
+
+def benchmark(line_count):
+    """
+    Times scanning a file of line_count lines of 40 to 120 bytes.
+
+    @returns tuple of lines per second for the legacy, buffered and mmap scans
+    """
+
+    fd, path = tempfile.mkstemp()
+    f = os.fdopen(fd, "w")
+    for i in xrange(line_count):
+        f.write("%d %s\n" % (i, "x" * (40 + i % 80)))
+    f.close()
+
+    rates = []
+    try:
+        for make in (lambda: LegacyLineSlicer(open(path)),
+                     lambda: LineSlicer(open(path)),
+                     lambda: LineSlicer(FileSelector(path).handle)):
+            start = time.time()
+            scan(make())
+            rates.append(line_count / (time.time() - start))
+    finally:
+        os.remove(path)
+
+    return tuple(rates)
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print "%8s %14s %14s %14s" % ("lines", "legacy/s", "buffered/s", "mmap/s")
+    for count in counts:
+        print "%8d %14.0f %14.0f %14.0f" % ((count, ) + benchmark(count))
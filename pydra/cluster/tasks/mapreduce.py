@@ -1,15 +1,24 @@
 from __future__ import with_statement
 
 from threading import Lock
+from bisect import bisect_left
+from operator import itemgetter
 import cPickle as pickle
 import logging
+import math
 import os
+import random
+import time
 
 from twisted.internet import reactor, threads
 
 from tasks import Task, TaskNotFoundException, \
     STATUS_RUNNING, STATUS_COMPLETE
-from pydra.cluster.tasks.datasource import *
+from pydra.cluster.tasks.slicer import FileBlockOutput, FileBlockSubslicer, \
+    ShuffleDir, SQLTableKeyInput, SQLTableOutput
+
+import pydra_settings
+from pydra.util import LRUCache
 
 logger = logging.getLogger('root')
 
@@ -35,6 +44,186 @@ class AppendableDict(dict):
         super(AppendableDict, self).__getitem__(key).append(value)
 
 
+class HashPartitioner(object):
+    """Assigns keys to partitions by their hash.
+
+    Partitioners may be built from a sample of map output keys.  If
+    sample_size is set, the map task is run over that many input keys before
+    the map stage starts, and sample() is given the keys emitted with the
+    number of values emitted for each.  The state of a sampled partitioner is
+    sent to map tasks with get_state() and set_state(), it must be json
+    serializable.
+    """
+
+    sample_size = 0
+
+    def partition(self, key, partitions):
+        # keys are hashed as strings, the default hash of an object is its id
+        # and would differ between the processes running map tasks
+        if not isinstance(key, basestring):
+            key = str(key)
+        return hash(key) % partitions
+
+
+    def sample(self, counts, partitions, split=False):
+        """builds the partitioner from a dictionary of sampled keys and
+        their value counts.  split allows the values of a key to be divided
+        between partitions"""
+        pass
+
+
+    def get_state(self):
+        return None
+
+
+    def set_state(self, state):
+        pass
+
+
+class RangePartitioner(HashPartitioner):
+    """Assigns keys to partitions by ranges of keys.  The ranges are chosen
+    from the sample so that each partition receives about the same number of
+    values.  Partitions hold keys in order, partition 0 the lowest."""
+
+    def __init__(self, sample_size=10):
+        self.sample_size = sample_size
+        self.boundaries = None
+
+
+    def partition(self, key, partitions):
+        if self.boundaries is None:
+            return HashPartitioner.partition(self, key, partitions)
+        return bisect_left(self.boundaries, key)
+
+
+    def sample(self, counts, partitions, split=False):
+        share = sum(counts.itervalues()) / float(partitions)
+        boundaries = []
+        total = 0
+
+        for key in sorted(counts):
+            total += counts[key]
+            if len(boundaries) < partitions - 1 and \
+                    total >= share * (len(boundaries) + 1):
+                boundaries.append(key)
+
+        self.boundaries = boundaries
+
+
+    def get_state(self):
+        return self.boundaries
+
+
+    def set_state(self, state):
+        self.boundaries = state
+
+
+class SkewPartitioner(HashPartitioner):
+    """Hash partitioner that places hot keys by the sample.  A key is hot if
+    it has more than hot times the values of an evenly divided partition.
+    Hot keys are placed in the least loaded partitions.  If split is allowed
+    the values of a hot key are divided between as many partitions as needed
+    to keep each partition under its share, the results of reducing each
+    part are then combined."""
+
+    def __init__(self, sample_size=10, hot=0.5):
+        self.sample_size = sample_size
+        self.hot = hot
+        self.placed = {}
+
+
+    def partition(self, key, partitions):
+        try:
+            return random.choice(self.placed[key])
+        except KeyError:
+            return HashPartitioner.partition(self, key, partitions)
+
+
+    def sample(self, counts, partitions, split=False):
+        share = sum(counts.itervalues()) / float(partitions)
+        loads = [0] * partitions
+        hot = []
+
+        for key, count in counts.iteritems():
+            if count > share * self.hot:
+                hot.append((count, key))
+            else:
+                loads[HashPartitioner.partition(self, key, partitions)] += count
+
+        self.placed = {}
+        for count, key in sorted(hot, reverse=True):
+            parts = int(math.ceil(count / share)) if split else 1
+            parts = max(1, min(parts, partitions))
+
+            placed = sorted(range(partitions), key=loads.__getitem__)[:parts]
+            for p in placed:
+                loads[p] += count / parts
+            self.placed[key] = placed
+
+
+    def get_state(self):
+        return self.placed.items()
+
+
+    def set_state(self, state):
+        self.placed = {}
+        for key, placed in state:
+            if isinstance(key, list):
+                key = tuple(key)
+            self.placed[key] = placed
+
+
+class SpillingOutput(AppendableDict):
+    """AppendableDict which holds a bounded number of values.
+
+    Once limit values have been added the contents are partitioned, sorted
+    and dumped to intermediate results as a run, then cleared.  Runs of each
+    partition are listed in self.runs.  A combiner is applied to each run if
+    one is given.
+    """
+
+    def __init__(self, im, mapid, limit=None, combine=None):
+        super(SpillingOutput, self).__init__()
+        self.im = im
+        self.mapid = mapid
+        self.limit = limit
+        self.combine = combine
+
+        self.count = 0
+        self.runs = {}
+        self.spills = 0
+        self.spilled_bytes = 0
+
+
+    def __setitem__(self, key, value):
+        super(SpillingOutput, self).__setitem__(key, value)
+        self.count += 1
+
+        if self.limit and self.count >= self.limit:
+            self.spill()
+
+
+    def spill(self):
+        """dumps the contents as a run and clears them"""
+
+        pdict = self.im.partition_output(self)
+        if self.combine:
+            pdict = [(p, self.combine(tuples)) for p, tuples in pdict]
+
+        dumped = self.im.dumped_bytes
+        runid = '%s-spill%d' % (self.mapid, self.spills)
+        for p, key in self.im.dump(pdict, runid).iteritems():
+            if p in self.runs:
+                self.runs[p].append(key)
+            else:
+                self.runs[p] = [key]
+
+        self.spills += 1
+        self.spilled_bytes += self.im.dumped_bytes - dumped
+        self.count = 0
+        self.clear()
+
+
 class IntermediateResults(object):
     """Datahandler for not direct input/output handling.
 
@@ -44,7 +233,8 @@ class IntermediateResults(object):
     map stage:
     * map task output is a dictionary;
     * when map._work() is completed output dict is partitioned and dumped;
-    * partition_output() partitions items depending on a partition() function;
+    * partition_output() partitions items depending on a partition() function,
+      and sorts the items of each partition by key;
     * dump() dumps them into a unique file, returns partition-dictionary;
     * every map task's dump partition-dictionary is collected and provided
       to update_partitions() function for future iterator generation.
@@ -59,12 +249,26 @@ class IntermediateResults(object):
       partition;
     * load() returns iterator which is used as a input iterator
       for a reduce task (subslicers);
-    * iterator loads (key, values) tuples from a backend.
+    * iterator merges the sorted (key, values) tuples from a backend and
+      generates (key, values_iterator) tuples, one for each key.
+
+    dumps are named by key(), the key of the dump of a partition by a map task.
+    Workers using intermediate results are given to set_worker().
+
+    pipelined reduce stage:
+    * reduce tasks may start before all map tasks complete;
+    * publish() dumps a manifest listing the dumps of a partition completed so
+      far, and whether all map tasks completed;
+    * published() reads the manifest, reduce tasks merge the dumps as they
+      are listed.
     """
 
     # mapreduce-i9e-(taks_id)-(partition)-(map_id)
     pattern = "mapreduce-i9e-%s-%d-%s"
 
+    # map_id of the manifest listing the completed dumps of a partition
+    manifest = "manifest"
+
 
     def __init__(self):
         self.task_id = "mapreduce_task"
@@ -74,20 +278,39 @@ class IntermediateResults(object):
 
         self.map_output = None
         self.reduce_input = None
+        self.partitioner = HashPartitioner()
+
+        self.dumped_bytes = 0
 
     def clear(self):
         self._partitions.clear()
 
 
+    def remove(self, keys):
+        """removes dumps"""
+        for key in keys:
+            self.map_output.remove(key)
+
+
+    def set_worker(self, worker):
+        """sets the worker the intermediate results are used on"""
+        pass
+
+
+    def key(self, p, mapid):
+        """key of the dump of partition p by map task mapid"""
+        return self.pattern % (self.task_id, p, mapid)
+
+
     def partition(self, key):
         """partition key depending on a number of a reducers"""
-        return hash(str(key)) % self.reducers
+        return self.partitioner.partition(key, self.reducers)
 
 
     def partition_output(self, output):
         """iterates through an output dictionary and partitions it,
         returns a dictionary where key is a partition number and value - items
-        of output dict belonging to this partition"""
+        of output dict belonging to this partition, sorted by key"""
 
         pdict = {}
 
@@ -100,6 +323,9 @@ class IntermediateResults(object):
             else:
                 pdict[p] = [(k, vs)]
 
+        for tuples in pdict.itervalues():
+            tuples.sort(key=itemgetter(0))
+
         return pdict.iteritems()
 
 
@@ -132,25 +358,109 @@ class IntermediateResults(object):
 
         for p, tuples in pdict:
 
-            key = self.pattern % (self.task_id, p, mapid)
+            key = self.key(p, mapid)
             partitions[p] = key
 
             logger.debug("im: dumping %s to %s" % (str(tuples), key))
 
-            self.map_output.dump(key, tuples)
+            self.dumped_bytes += self.map_output.dump(key, tuples) or 0
+
+        return partitions
+
+
+    def publish(self, partitions, final=False):
+        """dumps the manifest of each partition.  final marks that all map
+        tasks have completed and no more dumps will be listed"""
+
+        for p in partitions:
+            key = self.key(p, self.manifest)
+            records = [('keys', self._partitions.get(p, []))]
+            if final:
+                records.append(('final', [True]))
+
+            logger.debug("im: publishing %s to %s" % (records, key))
+            self.map_output.dump(key, records)
+
+
+    def published(self, p, key=None):
+        """reads the manifest of a partition.  returns a list of the dumps
+        of the partition and whether the list is final.  The list is None if
+        the manifest does not exist or is being written.  key is the key of
+        the manifest if it was not published by this worker"""
+
+        if key is None:
+            key = self.key(p, self.manifest)
+        try:
+            manifest = dict((k, list(vs)) for k, vs in self.load([key]))
+        except Exception, e:
+            logger.debug("im: manifest %s not ready: %s" % (key, e))
+            return None, False
+
+        return manifest.get('keys', []), 'final' in manifest
+
+
+    def merge(self, runs, mapid, combine=None, remove=True):
+        """merges the runs of each partition into a single dump and removes
+        the runs unless remove is False.  runs is a dictionary of partitions
+        and lists of keys. returns corresponding partitions-dictionary"""
+
+        partitions = {}
+
+        for p, keys in runs.iteritems():
+
+            key = self.key(p, mapid)
+            partitions[p] = key
+
+            logger.debug("im: merging %s to %s" % (keys, key))
+
+            tuples = ((k, list(vs)) for k, vs in self.load(keys))
+            if combine:
+                tuples = combine(tuples)
+
+            self.dumped_bytes += self.map_output.dump(key, tuples) or 0
+
+            if remove:
+                for run in keys:
+                    self.map_output.remove(run)
 
         return partitions
 
 
 class IntermediateResultsFiles(IntermediateResults):
-    """Storing intermediate results in flat files."""
+    """Storing intermediate results in flat files.
 
-    def __init__(self, dir):
+    Files are written in blocks of records, which may be compressed."""
+
+    def __init__(self, dir, compress=False):
         super(IntermediateResultsFiles, self).__init__()
         self.dir = dir
 
-        self.map_output = FilePickleOutput(dir=dir)
-        self.reduce_input = FileUnpicleSubslicer(dir=dir)
+        self.map_output = FileBlockOutput(dir=dir, compress=compress)
+        self.reduce_input = FileBlockSubslicer(dir=dir)
+
+
+class IntermediateResultsShuffle(IntermediateResultsFiles):
+    """Storing intermediate results in block files on the local disk of the
+    node of the worker that dumped them.
+
+    Keys of dumps are prefixed with the node storing them.  Dumps on other
+    nodes are read chunk_size bytes at a time through the node connections,
+    so no filesystem needs to be shared between nodes.  path defaults to
+    SHUFFLE_DIR and chunk_size to SHUFFLE_CHUNK_SIZE."""
+
+    def __init__(self, path=None, compress=False, chunk_size=None):
+        dir = ShuffleDir(path or pydra_settings.SHUFFLE_DIR,
+                         chunk_size or pydra_settings.SHUFFLE_CHUNK_SIZE)
+        super(IntermediateResultsShuffle, self).__init__(dir, compress)
+
+
+    def set_worker(self, worker):
+        self.dir.worker = worker
+
+
+    def key(self, p, mapid):
+        key = super(IntermediateResultsShuffle, self).key(p, mapid)
+        return self.dir.location(key)
 
 
 class IntermediateResultsSQL(IntermediateResults):
@@ -174,8 +484,38 @@ class MapReduceTask(Task):
     map = None
     reduce = None
 
+    # most values a map task holds in memory before spilling them to
+    # intermediate results.  None never spills.
+    spill_limit = 100000
+
+    # fraction of map tasks that must complete before reduce tasks are
+    # started.  Reduce tasks are only started early once every map task has
+    # started, so that they do not take workers needed by map tasks.  They
+    # merge map outputs as map tasks complete.  None starts reduce tasks once
+    # all map tasks complete.
+    reduce_slowstart = 0.5
+
+    # optional task that merges the values of each key in map outputs before
+    # they are dumped.  If combine_reduce is set it is also applied to the
+    # input of each reduce task, one key at a time as the input is read.
+    combine = None
+    combine_reduce = False
+
     reducers = 1
 
+    # assigns map output keys to reducers, HashPartitioner if None.  Keys
+    # split between reducers by a SkewPartitioner require combine.
+    partitioner = None
+
+    # iterative tasks run rounds of map and reduce stages until converged()
+    # or max_rounds have run.  The output of a round is the state of the next
+    # round, map tasks are given the state as their state argument.  state is
+    # the state of the first round.  Map inputs are cached by the worker that
+    # loaded them and map tasks of later rounds are run on the same worker.
+    iterative = False
+    max_rounds = 10
+    state = None
+
     description = "Abstract Map-Reduce Task"
 
     sequential = False
@@ -190,10 +530,16 @@ class MapReduceTask(Task):
         self.im = self.intermediate
         self.im.task_id = msg
         self.im.reducers = self.reducers
+        if self.partitioner is not None:
+            self.im.partitioner = self.partitioner
 
-        self.maptask = MapWrapper(self.map('MapTask'), self.im, self)
+        combiner = self.combine('CombineTask') if self.combine else None
 
-        self.reducetask = ReduceWrapper(self.reduce('ReduceTask'), self.im,self)
+        self.maptask = MapWrapper(self.map('MapTask'), self.im, self, combiner,
+                                  self.spill_limit)
+
+        self.reducetask = ReduceWrapper(self.reduce('ReduceTask'), self.im,self,
+                                combiner if self.combine_reduce else None)
 
         for src in self.datasources.itervalues():
             src.open()
@@ -227,14 +573,91 @@ class MapReduceTask(Task):
         self._callback_args = callback_args
 
         self._status = STATUS_RUNNING
+        self._round = 0
+        self._map_workers = {}
+        if self.iterative:
+            self.state = self.state or {}
+            self.output = {}
+
+        self.im.set_worker(self.get_worker())
+
+        self._partitioner_state = None
+        if self.im.partitioner.sample_size:
+            self.sample()
+
+        self._start_round()
+
+
+    def _start_round(self):
+        """starts the map stage of a round"""
+
         self._reduce_called = False
+        self._pipelined = False
         self._input_iter = enumerate(self.input)
+        self._map_count = 0
+        self._maps_requested = False
+        self._maps_started = set()
+
+        # only the state changes between rounds, it is read by map tasks from
+        # intermediate results
+        self._state_keys = None
+        if self.iterative:
+            state = dict((k, [v]) for k, v in self.state.iteritems())
+            pdict = self.im.partition_output(state)
+            self._state_keys = self.im.dump(pdict, 'state%d' % self._round) \
+                                   .values()
 
         # let's start the processing
-        logger.debug('mapreduce: map stage')
+        logger.debug('mapreduce: map stage, round %d' % self._round)
 
         self.request_work()
 
+
+    def converged(self, previous, state):
+        """
+        Returns whether an iterative task has converged.  By default a task
+        converges once a round does not change the state.
+
+        @param previous - state before the round
+        @param state - state after the round
+        """
+        return previous == state
+
+
+    def next_round(self):
+        """
+        Starts the next round of an iterative task unless it converged or ran
+        max_rounds.  Returns whether a round was started.
+        """
+        previous, self.state = self.state, self.output
+        self._round += 1
+
+        if self.converged(previous, self.state) or \
+                (self.max_rounds and self._round >= self.max_rounds):
+            logger.debug('mapreduce: finished after %d rounds' % self._round)
+            return False
+
+        self.output = {}
+        self._remove_dumps()
+        self._start_round()
+        return True
+
+
+    def _remove_dumps(self):
+        """
+        Removes the dumps, state and manifests of the round.  The next round,
+        or the next run of the task, names its dumps the same.
+        """
+        keys = [key for keys in self.im for key in keys]
+        if self._state_keys:
+            keys.extend(self._state_keys)
+        if self._pipelined:
+            keys.extend(self.im.key(p, self.im.manifest) \
+                        for p in range(self.reducers))
+        self.im.remove(keys)
+        self.im.clear()
+
+
     def request_work(self):
         """
         Sends work requests to the master.  This function will send either
@@ -244,7 +667,14 @@ class MapReduceTask(Task):
             while self.map_next():
                 pass
 
-        if not self.map_tasks:
+            if self.map_tasks and self.start_reduce_early():
+                logger.debug('mapreduce: starting pipelined reduce stage')
+                self._partition_iter = enumerate(range(self.reducers))
+                self._reduce_called = True
+                self._pipelined = True
+                self.im.publish(range(self.reducers))
+
+        if not self.map_tasks or self._pipelined:
             if not self._reduce_called:
                 self._partition_iter = enumerate(self.im)
                 self._reduce_called = True
@@ -253,23 +683,75 @@ class MapReduceTask(Task):
                 pass
 
 
+    def sample(self):
+        """
+        Builds the partitioner from the keys emitted by the map task for the
+        first input keys.
+        """
+        partitioner = self.im.partitioner
+        counts = {}
+
+        for n, input_key in enumerate(self.input):
+            if n == partitioner.sample_size:
+                break
+
+            output = AppendableDict()
+            self.maptask.task.work(input=self.input.load(input_key), \
+                                   output=output)
+            for k, vs in output.iteritems():
+                counts[k] = counts.get(k, 0) + len(vs)
+
+        logger.debug('mapreduce: sampled %d keys' % len(counts))
+        partitioner.sample(counts, self.reducers, self.combine is not None)
+        self._partitioner_state = partitioner.get_state()
+
+
+    def start_reduce_early(self):
+        """
+        Returns True if reduce tasks should be started before all map tasks
+        have completed.  This requires that all map tasks have been started
+        and that at least reduce_slowstart of them have completed.
+        """
+        if self.reduce_slowstart is None or not self._maps_requested:
+            return False
+
+        if len(self._maps_started) < self._map_count:
+            return False
+
+        completed = self._map_count - len(self.map_tasks)
+        return completed >= self.reduce_slowstart * self._map_count
+
+
     def map_next(self):
         """more work for a map task"""
         try:
             id, i = self._input_iter.next()
         except StopIteration:
+            self._maps_requested = True
             return False
 
         mapid = 'map%d' % id
         self.map_tasks[mapid] = 1
+        self._map_count += 1
         map_args = {
                     'id': mapid,
                     'input_key': i,
                    }
+        if self._partitioner_state is not None:
+            map_args['partitioner'] = self._partitioner_state
+        if self._state_keys is not None:
+            map_args['state'] = self._state_keys
+
+        # the worker that cached the input in an earlier round, or the host
+        # that the datasource stores the input on
+        host = self._map_workers.get(mapid, None)
+        if host is None and hasattr(self.input, 'location'):
+            host = self.input.location(i)
 
         logger.debug("mapreduce: requesting worker for %s: %s"
                 % (mapid, self.maptask.get_key()) )
-        self.parent.request_worker(self.maptask.get_key(), map_args, mapid)
+        self.parent.request_worker(self.maptask.get_key(), map_args, mapid,
+                                   host)
 
         return True
 
@@ -286,7 +768,10 @@ class MapReduceTask(Task):
         self.reduce_tasks[reduceid] = 1
         reduce_args = {
                         'partition': p,
+                        'pipelined': self._pipelined,
                       }
+        if self._pipelined:
+            reduce_args['manifest'] = self.im.key(p, self.im.manifest)
 
         logger.debug("mapreduce: requesting worker for %s: %s"
                 % (reduceid, self.reducetask.get_key()) )
@@ -304,12 +789,22 @@ class MapReduceTask(Task):
             # map/reduce specific post processing
             if id in self.map_tasks:
                 logger.debug('   map result %s: %s' % (id, result))
+                worker_key = result.pop('worker', None)
+                if worker_key:
+                    self._map_workers[id] = worker_key
                 self.im.update_partitions(result)
                 del self.map_tasks[id]
 
+                # list the new dumps for reduce tasks already running
+                if self._pipelined:
+                    if self.map_tasks:
+                        self.im.publish(result.keys())
+                    else:
+                        self.im.publish(range(self.reducers), final=True)
+
             elif id in self.reduce_tasks:
                 logger.debug('   reduce result %s: %s' % (id, result))
-                self.output.update(result)
+                self.update_output(result)
                 del self.reduce_tasks[id]
 
             # call request work to ensure that any additional work gets
@@ -323,12 +818,40 @@ class MapReduceTask(Task):
                 self.get_worker().request_worker_release()
 
             if not self.map_tasks and not self.reduce_tasks:
+                if self.iterative and self.next_round():
+                    return
+
                 # all work is done, call the task specific function to combine
                 # the results
                 self._complete()
                 return
 
 
+    def update_output(self, result):
+        """
+        Adds the results of a reduce task to the output.  Keys split between
+        reduce tasks by the partitioner are combined with results of the same
+        key from other reduce tasks.
+        """
+        for k, v in result.iteritems():
+            if k in self.output and self.combine:
+                v = self.maptask.combine([(k, [self.output[k], v])])[0][1][0]
+            self.output[k] = v
+
+
+    def subtask_started(self, subtask, id):
+        """
+        Overridden to track started map tasks.  Reduce tasks may be started
+        early once all map tasks have started.
+        """
+        Task.subtask_started(self, subtask, id)
+
+        with self.__lock:
+            if id in self.map_tasks:
+                self._maps_started.add(id)
+                self.request_work()
+
+
     def _complete(self):
         """
         Should be called when all map and reduce task have completed
@@ -339,7 +862,12 @@ class MapReduceTask(Task):
             reactor.callLater(1, self._complete)
             return
 
-        self.im.clear()
+        self._remove_dumps()
+
+        # release open input files and cached inputs
+        if hasattr(self.input, 'close'):
+            self.input.close()
+        self.maptask.cache.clear()
 
         logger.debug('mapreduce: finished')
         logger.info(self.output)
@@ -384,14 +912,45 @@ class MapReduceWrapper():
     It stores intermediate results helper (self.im) and overrides:
     * get_key() to assure proper subtask identification,
     * get_subtask() to return self instead of subtask directly,
-    * start() to run special self.work() instead of subtask's"""
+    * start() to run special self.work() instead of subtask's
 
-    def __init__(self, task, im, parent):
+    An optional combiner task merges the values of each key with
+    combine()"""
+
+    logger = logger
+
+    def __init__(self, task, im, parent, combiner=None):
         self.task = task
         self.im = im
         self.parent = parent
         self.task.parent = parent
 
+        self.combiner = combiner
+        if combiner:
+            combiner.parent = parent
+
+
+    def combine(self, tuples):
+        """runs the combiner over (key, values) tuples, returns a list of the
+        combined (key, [value]) tuples sorted by key"""
+
+        output = {}
+        self.combiner.work(input=tuples, output=output)
+        return sorted(((k, [v]) for k, v in output.iteritems()), \
+                      key=itemgetter(0))
+
+
+    def combine_groups(self, groups):
+        """runs the combiner over a stream of (key, values) groups one group
+        at a time, generates the combined (key, [value]) tuples.  Groups keep
+        their order, so only one group is held in memory at a time"""
+
+        for group in groups:
+            output = {}
+            self.combiner.work(input=[group], output=output)
+            for k, v in sorted(output.iteritems()):
+                yield k, [v]
+
 
     def get_key(self):
         return self.task.get_key()
@@ -437,6 +996,47 @@ class MapReduceWrapper():
 
 
 class MapWrapper(MapReduceWrapper):
+    """map task wrapper.  Map output is spilled to intermediate results
+    whenever it holds spill_limit values, the spilled runs are merged once
+    the map task completes.
+
+    Map tasks of an iterative task are given the state of the round.  Their
+    inputs are cached for later rounds, up to cache_size inputs."""
+
+    cache_size = 16
+
+    def __init__(self, task, im, parent, combiner=None, spill_limit=None):
+        MapReduceWrapper.__init__(self, task, im, parent, combiner)
+        self.spill_limit = spill_limit
+
+        self.cache = LRUCache(self.cache_size)
+        self._state_keys = None
+        self._state = None
+
+
+    def load_input(self, input_key):
+        """loads the input of a map task, from the cache if the task is
+        iterative"""
+
+        if not getattr(self.parent, 'iterative', False):
+            return self.parent.input.load(input_key)
+
+        key = repr(input_key)
+        if key not in self.cache:
+            self.cache[key] = list(self.parent.input.load(input_key))
+        return self.cache[key]
+
+
+    def load_state(self, state_keys):
+        """loads the state of a round from intermediate results.  The state
+        is kept for other map tasks of the round"""
+
+        if state_keys != self._state_keys:
+            self._state = dict((k, list(vs)[0]) \
+                               for k, vs in self.im.load(state_keys))
+            self._state_keys = state_keys
+        return self._state
+
 
     def _start(self, args={}, callback=None, callback_args={}):
         """
@@ -447,20 +1047,46 @@ class MapWrapper(MapReduceWrapper):
         logger.debug('%s - MapWrapper.work()'  % self.get_worker().worker_key)
 
         if args.has_key('input_key') and hasattr(self.parent, 'input'):
-            args['input'] = self.parent.input.load(args['input_key'])
+            args['input'] = self.load_input(args['input_key'])
+        if args.has_key('state'):
+            args['state'] = self.load_state(args['state'])
 
-        output = AppendableDict()
-        args['output'] = output
+        self.im.set_worker(self.get_worker())
+
+        state = args.pop('partitioner', None)
+        if state is not None:
+            self.im.partitioner.set_state(state)
 
         id = args['id']
+        combine = self.combine if self.combiner else None
+        output = SpillingOutput(self.im, id, self.spill_limit, combine)
+        args['output'] = output
+
         logger.debug("%s._work()" % id)
 
         self.task._work(**args) # ignoring results
 
-        pdict = self.im.partition_output(output)
+        if output.spills:
+            # spill what remains and merge the runs, partitions are results
+            output.spill()
+            logger.debug("%s._work() merging %d spills" % (id, output.spills))
+            results = self.im.merge(output.runs, id, combine)
+            self.logger.info('%s - spilled %d times, %d bytes' % \
+                             (id, output.spills, output.spilled_bytes))
+
+        else:
+            pdict = self.im.partition_output(output)
+
+            if combine:
+                logger.debug("%s._work() combining i9e" % id)
+                pdict = [(p, combine(tuples)) for p, tuples in pdict]
 
-        logger.debug("%s._work() dumping i9e" % id)
-        results = self.im.dump(pdict, id) # partitions are our results
+            logger.debug("%s._work() dumping i9e" % id)
+            results = self.im.dump(pdict, id) # partitions are our results
+
+        if getattr(self.parent, 'iterative', False):
+            # later rounds are run where the input is cached
+            results['worker'] = self.get_worker().worker_key
 
         logger.debug('%s - MapWrapper - work complete' % \
                      self.get_worker().worker_key)
@@ -477,6 +1103,13 @@ class MapWrapper(MapReduceWrapper):
 
 
 class ReduceWrapper(MapReduceWrapper):
+    """reduce task wrapper.  A pipelined reduce task reads the dumps of its
+    partition as they are published, merging them merge_factor at a time
+    until all map tasks have completed."""
+
+    merge_factor = 10
+    poll_interval = 1
+
 
     def _start(self, args={}, callback=None, callback_args={}):
         """
@@ -485,12 +1118,24 @@ class ReduceWrapper(MapReduceWrapper):
         """
         logger.debug('%s - ReduceWrapper.work()' % self.get_worker().worker_key)
 
-        args['input'] = self.im.load(args['partition'])
+        self.im.set_worker(self.get_worker())
+
+        self.runs = []
+        manifest = args.pop('manifest', None)
+        if args.pop('pipelined', False):
+            args['input'] = self.pipelined_input(args['partition'], manifest)
+        else:
+            args['input'] = self.im.load(args['partition'])
+        if self.combiner:
+            args['input'] = self.combine_groups(args['input'])
         output = args['output'] = {}
 
         self.task._work(**args) # ignoring results
         results = output
 
+        for run in self.runs:
+            self.im.map_output.remove(run)
+
         logger.debug('%s - ReduceWrapper - work complete' % \
                      self.get_worker().worker_key)
 
@@ -504,3 +1149,39 @@ class ReduceWrapper(MapReduceWrapper):
 
         return results
 
+
+    def pipelined_input(self, p, manifest=None):
+        """
+        Waits for the dumps of partition p to be published to the manifest.
+        Dumps are merged into runs of this reduce task while map tasks are
+        still running.  Returns the input for the reduce task once all map
+        tasks completed.
+        """
+        runs = self.runs
+        merged = 0
+
+        while not self.parent.STOP_FLAG:
+            keys, final = self.im.published(p, manifest)
+            if keys is None:
+                time.sleep(self.poll_interval)
+                continue
+
+            pending = keys[merged:]
+            if final:
+                logger.debug('reduce %s - merging %d runs and %d dumps' % \
+                              (p, len(runs), len(pending)))
+                return self.im.load(runs + pending)
+
+            if len(pending) >= self.merge_factor:
+                # runs are named by worker, speculative copies of the
+                # reduce task must not write to the same runs
+                runid = 'reduce-merge-%s-%d' % \
+                        (self.get_worker().worker_key, len(runs))
+                runs.append(self.im.merge({p:pending}, runid, \
+                                          remove=False)[p])
+                merged = len(keys)
+            else:
+                time.sleep(self.poll_interval)
+
+        return []
+
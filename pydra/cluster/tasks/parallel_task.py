@@ -20,6 +20,7 @@
 from __future__ import with_statement
 
 import logging
+from collections import deque
 from threading import Thread, RLock
 from twisted.internet import reactor, threads
 
@@ -31,13 +32,14 @@ class ParallelTask(Task):
     """
     ParallelTask - is a task that can be broken into discrete work units
     """
-    _data = None                # list of data for this task
+    _data = None                # list or iterable of data for this task
     _data_in_progress = {}      # workunits of data
     _workunit_count = 0         # count of workunits handed out.  This is used to identify transactions
-    _workunit_total = 0
+    _workunit_total = None      # count of workunits, None if not known
     _workunit_completed = 0     # count of workunits handed out.  This is used to identify transactions
     subtask_key = None          # cached key from subtask
     _ds = None                  # Datasource slicer.
+    workunit_window = 100       # most workunits requested at once
 
     def __init__(self, msg=None, datasource=None):
         Task.__init__(self, msg)
@@ -46,6 +48,9 @@ class ParallelTask(Task):
         self.__subtask_class = None      # class of subtask
         self.__subtask_args = None       # args for initializing subtask
         self.__subtask_kwargs = None     # kwargs for initializing subtask
+        self._data_in_progress = {}      # workunits of data
+        self._pending = deque()          # data of failed workunits to rerun
+        self._source = None              # iterator over data not handed out
 
         if datasource:
             self._ds = thaw(datasource)
@@ -99,17 +104,20 @@ class ParallelTask(Task):
         """
         Requests workers to process workunits
     
-        expand all the work units eagerly. the master will handles these
-        worker requests. other task implementations (like MapReduceTask) may
-        employ a more sophisticated mechanism that allows dependence between
-        work units.
-        """        
-        data, index = self.get_work_unit()
-        while data is not None:
+        Work units are expanded lazily.  At most workunit_window workunits are
+        requested at once, more are requested as workunits complete.  This
+        keeps the number of requests held by the master, and the data held by
+        this task, constant regardless of the amount of data.  Other task
+        implementations (like MapReduceTask) may employ a more sophisticated
+        mechanism that allows dependence between work units.
+        """
+        while len(self._data_in_progress) < self.workunit_window:
+            data, index = self.get_work_unit()
+            if index is None:
+                break
             self.logger.debug('Paralleltask - assigning remote work: key=%s, args=%s'
                 % ('--', index))
             self.parent.request_worker(self.subtask.get_key(), {'data':data}, index)
-            data, index = self.get_work_unit()
 
 
     def _stop(self):
@@ -127,8 +135,17 @@ class ParallelTask(Task):
         # save data, if any
         if kwargs and kwargs.has_key('data'):
             self._data = kwargs['data']
-            self._workunit_total = len(self._data)
             self.logger.debug('Paralleltask - data was passed in!')
+
+        # data is consumed through an iterator so that it may be a generator
+        # or datasource that is read as workunits are handed out.
+        data = self._data if self._data is not None else self._ds
+        if data is not None:
+            self._source = iter(data)
+            try:
+                self._workunit_total = len(data)
+            except TypeError:
+                self._workunit_total = None
         # request initial workers
         self._request_workers()
         self.logger.debug('Paralleltask - initial work assigned!')
@@ -171,9 +188,11 @@ class ParallelTask(Task):
                 self.get_worker().request_worker_release()
 
             self._workunit_completed += 1
+            self.progress_changed()
 
             #check for more work
-            if not (self._data_in_progress or self._data):
+            if not (self._data_in_progress or self._pending \
+                    or self._source is not None):
                 #all work is done, call the task specific function to combine the results 
                 self.logger.debug('Paralleltask - all workunits complete, calling task post process')
                 results = self.work_complete()
@@ -190,8 +209,8 @@ class ParallelTask(Task):
             #remove data from in progress
             data = self._data_in_progress[index]
             del self._data_in_progress[index]
-            #add data to the end of the list
-            self._data.append(data)
+            #add data to the list of data to rerun
+            self._pending.append(data)
 
 
     @staticmethod
@@ -207,18 +226,25 @@ class ParallelTask(Task):
 
     def get_work_unit(self):
         """
-        Get the next work unit, by default a ParallelTask expects a list of values/tuples.
-        When a arg is retrieved its removed from the list and placed in the in progress list.
-        The arg is saved so that if the node fails the args can be re-run on another node
+        Get the next work unit, by default a ParallelTask expects a list or
+        iterable of values/tuples.  Data of failed workunits is rerun first,
+        then the next value is read from the data.  The value is placed in the
+        in progress list so that if the node fails it can be re-run on another
+        node
 
         This method *MUST* lock while it is altering the lists of data
         """
         data = None
         with self._lock:
 
-            #grab from the beginning of the list
-            if len(self._data) != 0:
-                data = self._data.pop(0)
+            if self._pending:
+                data = self._pending.popleft()
+            elif self._source is not None:
+                try:
+                    data = self._source.next()
+                except StopIteration:
+                    self._source = None
+                    return None, None
             else:
                 return None, None
 
@@ -235,10 +261,14 @@ class ParallelTask(Task):
 
         A parallel task's progress is a derivitive of its workunits:
            COMPLETE_WORKUNITS / TOTAL_WORKUNITS
+
+        If the data does not have a length, the total is the count of
+        workunits handed out so far.
         """
-        data = len(self._data) if self._data else 0
-        total = self._workunit_completed + data + \
-            len(self._data_in_progress)
+        total = self._workunit_total
+        if total is None:
+            total = self._workunit_completed + len(self._pending) + \
+                len(self._data_in_progress)
 
         if total == 0:
             return 0
@@ -1,11 +1,21 @@
 from __future__ import with_statement
 
+from contextlib import contextmanager
 from threading import Lock
 
 import cPickle as pickle
+import errno
+import heapq
+import marshal
+import mmap
+import struct
+import zlib
+from itertools import groupby, islice
+from operator import itemgetter
 import os, logging
 
-import MySQLdb
+from pydra.cluster.tasks.datasource.slicer import LineSlicer
+from pydra.util import LRUCache
 
 logger = logging.getLogger('root')
 
@@ -19,6 +29,105 @@ def chain_subslicer(obj, ss_list):
 
     return last_ss
 
+
+def _decorate_run(run, index):
+    """decorates records of a run so that records with equal keys are
+    ordered by run, then by position, without comparing their values"""
+    for position, (k, vs) in enumerate(run):
+        yield k, index, position, vs
+
+
+def _merged_values(records):
+    """generates the values of merged records.  Values that are not a list
+    are a single value"""
+    for record in records:
+        vs = record[3]
+        if isinstance(vs, list):
+            for v in vs:
+                yield v
+        else:
+            yield vs
+
+
+def merge_sorted(runs):
+    """k-way merge of runs of (key, values) records sorted by key.
+
+    Yields a (key, values_iterator) tuple for every key.  The iterator chains
+    the values of all records with that key.  Only one record of each run is
+    held in memory at a time."""
+
+    merged = heapq.merge(*[_decorate_run(run, i) for i, run in enumerate(runs)])
+
+    for k, records in groupby(merged, itemgetter(0)):
+        yield k, _merged_values(records)
+
+def sql_placeholder(db):
+    """placeholder for query parameters in the paramstyle of the DBAPI module
+    of a database.  Databases without a dbapi attribute are assumed to use
+    the format paramstyle"""
+    paramstyle = getattr(getattr(db, 'dbapi', None), 'paramstyle', 'format')
+    if paramstyle == 'qmark':
+        return '?'
+    if paramstyle in ('format', 'pyformat'):
+        return '%s'
+    raise ValueError('paramstyle %s is not supported' % paramstyle)
+
+
+@contextmanager
+def sql_cursor(db, key=None):
+    """borrows a cursor of a database for the duration of a with block.
+    Databases with a connection pool, such as SQLBackend and SQLSelector,
+    lend each caller a connection of its own.  Cursors of other databases are
+    loaded with db.load(key)"""
+    if getattr(db, 'pool', None) is not None:
+        with db.connection() as connection:
+            yield connection.cursor()
+    else:
+        yield db.load(key)
+
+
+def fetch_rows(cursor, size=1000):
+    """generates the rows of an executed query, fetching size rows at a
+    time"""
+    rows = cursor.fetchmany(size)
+    while rows:
+        for row in rows:
+            yield row
+        rows = cursor.fetchmany(size)
+
+############
+# datasources
+
+class DatasourceDir(object):
+    """directory of files, keyed by their names"""
+
+    def __init__(self, dir):
+        self.dir = dir
+
+
+    def open(self):
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir)
+
+
+    def __iter__(self):
+        for name in sorted(os.listdir(self.dir)):
+            yield (name, )
+
+
+    def filename(self, key):
+        return os.path.join(self.dir, key[0])
+
+
+    def _load(self, key, mode='r'):
+        return open(self.filename(key), mode)
+
+
+    def load(self, key):
+        """opens a file for reading"""
+        return self._load(key, 'rb')
+
+
 ############
 # slicers
 
@@ -80,38 +189,163 @@ class SequenceSlicer(Slicer):
 
 
 class LineFileSlicer(Slicer):
+    """Slicer generating a key for each line of the input files.  Files are
+    memory mapped when first loaded and the mappings of the most recently
+    used files are kept open, so loading a line neither reopens nor reads
+    the file.
+
+    kwargs:
+        buffers - load lines as buffers sharing the memory of the mapping,
+                  without the trailing newline, instead of stripped strings
+                  (default False)
+        open_files - most mappings kept open (default 32)"""
+
+    def __init__(self, **kwargs):
+        Slicer.__init__(self, **kwargs)
+        self._maps = LRUCache(kwargs.get('open_files', 32))
+        self._maps_lock = Lock()
+
 
     def __iter__(self):
         """generates a key == parent_key + (offset, ), where offset is a line position in file"""
         for input_key in self.input:
-            with self.input.load(input_key) as f:
-                #must use readline:
-                # for line in f: consumes whole file and
-                # f.tell() become useless
-                offset = 0
-                line = f.readline()
-
-                while line:
-                    if self.send_as_input:
-                        yield line.strip()
-                    else:
-                        yield input_key + (offset, )
-
-                    offset = f.tell()
-                    line = f.readline()
+            data = self._map(input_key)
+            offset = 0
+            while offset < len(data):
+                line, next = self._line(data, offset)
+                if self.send_as_input:
+                    yield line
+                else:
+                    yield input_key + (offset, )
+                offset = next
 
 
     def _load(self, key):
         """reads particular line in file"""
         parent, offset = key[:-1], key[-1]
-        with self.input.load(parent) as f:
-            f.seek(offset)
-            line = f.readline().strip()
+        return self._line(self._map(parent), offset)[0]
+
+
+    def _map(self, parent):
+        """returns the contents of a file, memory mapped unless the file is
+        empty or not a real file.  Mappings evicted from the cache are
+        closed once nothing refers to them"""
+        with self._maps_lock:
+            if parent not in self._maps:
+                with self.input.load(parent) as f:
+                    try:
+                        data = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+                    except (AttributeError, ValueError, EnvironmentError):
+                        data = f.read()
+                self._maps[parent] = data
+            return self._maps[parent]
+
+
+    def _line(self, data, offset):
+        """returns the line at an offset and the offset of the next line"""
+        end = data.find('\n', offset)
+        if end == -1:
+            end = len(data)
+
+        if self.kwargs.get('buffers'):
+            line = buffer(data, offset, end - offset)
+        else:
+            line = data[offset:end].strip()
+        return line, end + 1
+
+
+    def close(self):
+        """releases the mappings of files.  A mapping is closed once the
+        lines loaded from it are no longer referenced, buffers sharing its
+        memory stay valid until then"""
+        with self._maps_lock:
+            self._maps.clear()
+
+
+def line_ranges(f, count):
+    """splits a file into at most count byte ranges of roughly equal size.
+    Ranges are aligned to line boundaries: each range after the first starts
+    at a line, and each range but the last ends after a line separator.
+
+    Returns a list of (start, stop) offsets."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    lines = LineSlicer(f)
+
+    ranges = []
+    start = 0
+    for i in xrange(1, count + 1):
+        cut = size * i / count
+        if start >= size:
+            break
+        if cut <= start:
+            continue
+
+        # the slice is expanded to the first separator after the cut
+        state = lines[start:cut].state
+        if i < count and isinstance(state, slice):
+            stop = state.stop + 1
+        else:
+            stop = size
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
+
+
+class LineRangeSlicer(LineFileSlicer):
+    """Splits files into byte ranges aligned to line boundaries, rather than
+    into single lines, so that a file becomes a handful of large workunits.
+    Keys are parent_key + (start, stop), and the lines in the range are read
+    when the key is loaded.
+
+    kwargs:
+        ranges - number of ranges each file is split into (default 16)"""
+
+    def __iter__(self):
+        """generates a key == parent_key + (start, stop) for each range"""
+        count = self.kwargs.get('ranges', 16)
+        for input_key in self.input:
+            with self.input.load(input_key) as f:
+                ranges = line_ranges(f, count)
 
-        return line
+            for start, stop in ranges:
+                if self.send_as_input:
+                    for line in self._lines(input_key, start, stop):
+                        yield line
+                else:
+                    yield input_key + (start, stop)
+
+
+    def _lines(self, parent, start, stop):
+        """generates the lines in a range of a file"""
+        data = self._map(parent)
+        offset = start
+        while offset < min(stop, len(data)):
+            line, offset = self._line(data, offset)
+            yield line
+
+
+    def _load(self, key):
+        """streams the lines in a range of a file"""
+        parent, start, stop = key[:-2], key[-2], key[-1]
+        return self._lines(parent, start, stop)
 
 
 class SQLTableSlicer(Slicer):
+    """Slicer generating a key for each row of a table.
+
+    With range_size set, a key is generated for each range of range_size
+    rows instead.  Bounds of ranges are found with keyset pagination on the
+    id column, and each range is loaded with one query whose rows are
+    fetched fetch_size at a time.
+
+    kwargs:
+        table - name of the table
+        id_column - column identifying rows (default 'id')
+        range_size - rows in each range, or None for a key per row
+        fetch_size - rows fetched at a time when loading a range (default
+                     1000)"""
 
     def __iter__(self):
         select_args = {'id_column': 'id'}
@@ -121,26 +355,70 @@ class SQLTableSlicer(Slicer):
                 "SELECT %(id_column)s FROM %(table)s")
 
         for input_key in self.input:
-            c = self.input.load(input_key)
+            with sql_cursor(self.input, input_key) as c:
+                if select_args.get('range_size'):
+                    for id_range in self._ranges(c, select_args):
+                        if self.send_as_input:
+                            yield id_range
+                        else:
+                            yield input_key + id_range
+                    continue
+
+                c.execute(select_query % select_args)
+                row = c.fetchone()
+
+                while row:
+                    id = int(row[0])
+                    if self.send_as_input:
+                        yield id
 
-            c.execute(select_query % select_args)
+                    else:
+                        yield input_key + (id, )
+
+                    row = c.fetchone()
+
+
+    def _ranges(self, c, select_args):
+        """generates (after, last) bounds of ranges of range_size rows.  A
+        range holds the rows with after < id <= last, None is unbounded.
+        No range is generated for an empty table, or for the rows after the
+        last full range if there are none"""
+        first_query = "SELECT %(id_column)s FROM %(table)s " \
+                "ORDER BY %(id_column)s LIMIT 1 OFFSET %(offset)d"
+        next_query = "SELECT %(id_column)s FROM %(table)s " \
+                "WHERE %(id_column)s > %(placeholder)s " \
+                "ORDER BY %(id_column)s LIMIT 1 OFFSET %(offset)d"
+        placeholder = sql_placeholder(self.input)
+
+        def find(after, offset):
+            """returns the id offset rows past after, or None"""
+            args = dict(select_args, offset=offset, placeholder=placeholder)
+            if after is None:
+                c.execute(first_query % args)
+            else:
+                c.execute(next_query % args, (after, ))
             row = c.fetchone()
+            return row and row[0]
 
-            while row:
-                id = int(row[0])
-                if self.send_as_input:
-                    yield id
+        after = None
+        while True:
+            last = find(after, select_args['range_size'] - 1)
+            if last is None:
+                # fewer than range_size rows are left
+                if find(after, 0) is not None:
+                    yield after, None
+                return
 
-                else:
-                    yield input_key + (id, )
-
-                row = c.fetchone()
+            yield after, last
+            after = last
 
 
     def _load(self, key):
-        """reads particular row in table"""
+        """reads particular row in table, or the rows of a range"""
+        if self.kwargs.get('range_size'):
+            return self._load_range(key[:-2], key[-2], key[-1])
+
         parent, id = key[:-1], key[-1]
-        c = self.input.load(parent)
 
         select_args = {'id_column': 'id','id': id}
         select_args.update(self.kwargs)
@@ -148,8 +426,34 @@ class SQLTableSlicer(Slicer):
         load_query = select_args.pop('load_query',
                 "SELECT * FROM %(table)s WHERE %(id_column)s = %(id)d")
 
-        c.execute(load_query % select_args)
-        return c.fetchone()
+        with sql_cursor(self.input, parent) as c:
+            c.execute(load_query % select_args)
+            return c.fetchone()
+
+
+    def _load_range(self, parent, after, last):
+        """reads the rows of a range, ordered by id"""
+        id_column = self.kwargs.get('id_column', 'id')
+        placeholder = sql_placeholder(self.input)
+
+        conditions, params = [], []
+        if after is not None:
+            conditions.append('%s > %s' % (id_column, placeholder))
+            params.append(after)
+        if last is not None:
+            conditions.append('%s <= %s' % (id_column, placeholder))
+            params.append(last)
+
+        sql = 'SELECT * FROM %s' % self.kwargs['table']
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY %s' % id_column
+        logger.debug(sql)
+
+        # the rows are read before the cursor is given back
+        with sql_cursor(self.input, parent) as c:
+            c.execute(sql, params)
+            return list(fetch_rows(c, self.kwargs.get('fetch_size', 1000)))
 
 
 ############
@@ -163,20 +467,25 @@ class Subslicer(Slicer):
 
 
 class FileUnpicleSubslicer(Subslicer):
+    """reads sorted (key, values) records from files and merges them into
+    (key, values_iterator) groups"""
 
     def __iter__(self):
-        dir = self.kwargs['dir']
+        return merge_sorted([self._records(filename) \
+                            for filename in self.input])
 
-        for filename in self.input:
 
-            try:
-                with dir.load((filename, )) as f:
-                    while True:
-                        yield pickle.load(f)
+    def _records(self, filename):
+        dir = self.kwargs['dir']
+
+        try:
+            with dir.load((filename, )) as f:
+                while True:
+                    yield pickle.load(f)
 
-            except EOFError:
-                logger.debug("subslicer: loading from %s done" % f.name)
-                pass
+        except EOFError:
+            logger.debug("subslicer: loading from %s done" % f.name)
+            pass
 
 
 class FilePickleOutput(object):
@@ -185,44 +494,310 @@ class FilePickleOutput(object):
         self.dir = dir
 
     def dump(self, key, values):
+        """dumps values to a file, returns the number of bytes written"""
         with self.dir._load((key, ), mode="w") as f:
             for obj in values:
                 pickle.dump(obj, f)
+            return f.tell()
+
+
+    def remove(self, key):
+        try:
+            os.remove(self.dir.filename((key, )))
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+############
+# block files
+#
+# Block files hold records in blocks of up to block_size records.  Each block
+# is a header followed by the serialized list of its records:
+#
+#   header:  flags (1 byte), length of the serialized records (4 bytes)
+#
+# Records are serialized with marshal if they contain only simple types,
+# otherwise with the highest pickle protocol.  Blocks may be compressed with
+# zlib.  The blocks are followed by an index listing the offset, record count
+# and first key of every block, and a trailer holding the offset of the index.
+
+BLOCK_HEADER = struct.Struct('!BI')
+BLOCK_TRAILER = struct.Struct('!Q4s')
+BLOCK_MAGIC = 'PBLK'
+
+BLOCK_MARSHAL = 1
+BLOCK_ZLIB = 2
+
+
+def write_block(f, records, compress=False):
+    """writes a block of records to a file"""
+    try:
+        data = marshal.dumps(records)
+        flags = BLOCK_MARSHAL
+    except ValueError:
+        data = pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+        flags = 0
+
+    if compress:
+        data = zlib.compress(data)
+        flags |= BLOCK_ZLIB
+
+    f.write(BLOCK_HEADER.pack(flags, len(data)))
+    f.write(data)
+
+
+def read_block(f):
+    """reads the next block of records from a file"""
+    flags, length = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+    data = f.read(length)
+
+    if flags & BLOCK_ZLIB:
+        data = zlib.decompress(data)
+    if flags & BLOCK_MARSHAL:
+        return marshal.loads(data)
+    return pickle.loads(data)
+
+
+def read_block_index(f):
+    """reads the block index of a file, returns the offset of the index and
+    a list of (offset, count, first key) tuples"""
+    f.seek(-BLOCK_TRAILER.size, os.SEEK_END)
+    offset, magic = BLOCK_TRAILER.unpack(f.read(BLOCK_TRAILER.size))
+    if magic != BLOCK_MAGIC:
+        raise IOError('%s is not a block file' % f.name)
+
+    f.seek(offset)
+    return offset, read_block(f)
+
+
+class FileBlockSubslicer(FileUnpicleSubslicer):
+    """reads sorted (key, values) records from block files and merges them
+    into (key, values_iterator) groups"""
+
+    def _records(self, filename):
+        dir = self.kwargs['dir']
+
+        with dir.load((filename, )) as f:
+            end, index = read_block_index(f)
+            f.seek(0)
+
+            while f.tell() < end:
+                for record in read_block(f):
+                    yield record
+
+        logger.debug("subslicer: loading from %s done" % f.name)
+
+
+class FileBlockOutput(FilePickleOutput):
+    """dumps records to block files"""
+
+    def __init__(self, dir, block_size=1000, compress=False):
+        super(FileBlockOutput, self).__init__(dir)
+        self.block_size = block_size
+        self.compress = compress
+
+
+    def dump(self, key, values):
+        """dumps values to a file, returns the number of bytes written"""
+        index = []
+
+        with self.dir._load((key, ), mode="wb") as f:
+            block = []
+            for obj in values:
+                block.append(obj)
+                if len(block) == self.block_size:
+                    index.append((f.tell(), len(block), block[0][0]))
+                    write_block(f, block, self.compress)
+                    block = []
+
+            if block:
+                index.append((f.tell(), len(block), block[0][0]))
+                write_block(f, block, self.compress)
+
+            offset = f.tell()
+            write_block(f, index)
+            f.write(BLOCK_TRAILER.pack(offset, BLOCK_MAGIC))
+            return f.tell()
+
+
+############
+# shuffle
+#
+# Shuffle files are stored on the local disk of the node of the worker that
+# wrote them.  Their keys are locations, the key of the node storing the file
+# and the name of the file separated by a slash.  Files on other nodes are
+# read in chunks through the worker, which relays the requests through its
+# node and the master to the node storing the file.
+
+class ShuffleDir(object):
+    """directory of shuffle files on the local disk of every node.  worker
+    must be set to the worker using the directory"""
+
+    def __init__(self, path, chunk_size=262144):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.worker = None
+
+
+    @property
+    def node(self):
+        """key of the node of the worker"""
+        return self.worker.worker_key.rsplit(':', 1)[0]
+
+
+    def location(self, name):
+        return '%s/%s' % (self.node, name)
+
+
+    def _load(self, key, mode='r'):
+        """opens a file on the local disk"""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        return open(self.filename(key), mode)
+
+
+    def filename(self, key):
+        """path of a file on the local disk"""
+        return os.path.join(self.path, key[0].rsplit('/', 1)[-1])
+
+
+    def load(self, key):
+        """opens a file for reading, wherever it is stored"""
+        node, name = key[0].rsplit('/', 1)
+        if node == self.node:
+            return self._load(key, 'rb')
+        return ShuffleFile(self.worker, key[0], self.chunk_size)
+
+
+class ShuffleFile(object):
+    """read only file stored on another node.  The file is read chunk_size
+    bytes at a time, the last chunk read is buffered"""
+
+    def __init__(self, worker, location, chunk_size):
+        self.worker = worker
+        self.name = location
+        self.chunk_size = chunk_size
+
+        self.size = None
+        self._position = 0
+        self._offset = 0
+        self._buffer = ''
+
+
+    def _fetch(self, offset, size):
+        self.size, self._buffer = self.worker.fetch_shuffle(self.name, offset,
+                                                            size)
+        self._offset = offset
+
+
+    def read(self, size=-1):
+        data = []
+        while size:
+            start = self._position - self._offset
+            if not 0 <= start < len(self._buffer):
+                if self.size is not None and self._position >= self.size:
+                    break
+                self._fetch(self._position, self.chunk_size)
+                start = 0
+                if not self._buffer:
+                    break
+
+            if size > 0:
+                chunk = self._buffer[start:start + size]
+                size -= len(chunk)
+            else:
+                chunk = self._buffer[start:]
+            data.append(chunk)
+            self._position += len(chunk)
+
+        return ''.join(data)
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_END:
+            if self.size is None:
+                self._fetch(0, 0)
+            offset += self.size
+        elif whence == os.SEEK_CUR:
+            offset += self._position
+        self._position = offset
+
+
+    def tell(self):
+        return self._position
+
+
+    def close(self):
+        self._buffer = ''
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
 
 
 class SQLTableKeyInput(Subslicer):
+    """reads the (k, v) rows of partitions, grouped by k.  Rows are streamed
+    fetch_size at a time"""
 
     def __iter__(self):
 
         db = self.kwargs['db']
         table = self.kwargs['table']
-        c = db.load(None)
+        fetch_size = self.kwargs.get('fetch_size', 1000)
 
-        for partition in self.input:
+        partitions = list(self.input)
+        sql = "SELECT k, v FROM %s WHERE partition IN (%s) ORDER BY k" % \
+                (table, ", ".join([sql_placeholder(db)] * len(partitions)))
+        logger.debug(sql)
 
-            sql = "SELECT k, v FROM %s WHERE partition = '%s'" % (table, partition)
-            logger.debug(sql)
+        with sql_cursor(db) as c:
+            c.execute(sql, partitions)
 
-            c.execute(sql)
-            row = c.fetchone()
-
-            while row:
-                yield row
-
-                row = c.fetchone()
+            for k, rows in groupby(fetch_rows(c, fetch_size), itemgetter(0)):
+                yield k, (row[1] for row in rows)
 
 
 class SQLTableOutput(object):
+    """writes (partition, k, v) rows to a table.  Rows are inserted
+    batch_size at a time with one transaction for each dump.  The table and
+    its (partition, k) index are created if they do not exist"""
 
-    def __init__(self, db, table):
+    def __init__(self, db, table, batch_size=1000):
         self.table = table
         self.db = db
-
-
-    def dump(self, key, tuples):
-        c = self.db.load(None)
-        for tuple in tuples:
-            k, vals = tuple
+        self.batch_size = batch_size
+        self._created = False
+
+
+    def create(self, c):
+        c.execute("CREATE TABLE IF NOT EXISTS %s (partition VARCHAR(255), " \
+                  "k VARCHAR(255), v TEXT)" % self.table)
+        c.connection.commit()
+        try:
+            c.execute("CREATE INDEX %s_partition_k ON %s (partition, k)" % \
+                      (self.table, self.table))
+            c.connection.commit()
+        except Exception, e:
+            # not every database supports CREATE INDEX IF NOT EXISTS.  An
+            # index that exists is reported as 'already exists' (sqlite,
+            # postgres) or 'Duplicate key name' (mysql)
+            message = str(e)
+            if 'already exists' not in message \
+                    and 'Duplicate key name' not in message:
+                raise
+            logger.debug("index not created: %s" % e)
+            c.connection.rollback()
+        self._created = True
+
+
+    def _rows(self, key, tuples):
+        for k, vals in tuples:
+            k = '%s' % (k, )
 
             try:
                 vals = iter(vals)
@@ -230,11 +805,49 @@ class SQLTableOutput(object):
                 vals = [vals]
 
             for v in vals:
-                sql = "INSERT INTO %s (partition, k, v) VALUES ('%s', '%s', '%s')" % \
-                        (self.table, key, k, str(v))
-                logger.debug(sql)
+                yield key, k, str(v)
+
 
-                r = c.execute(sql)
-                logger.debug("inserted %s" % r)
+    def dump(self, key, tuples):
+        with sql_cursor(self.db) as c:
+            self._dump(c, key, tuples)
+
+
+    def _dump(self, c, key, tuples):
+        if not self._created:
+            self.create(c)
+
+        placeholder = sql_placeholder(self.db)
+        sql = "INSERT INTO %s (partition, k, v) VALUES (%s, %s, %s)" % \
+                ((self.table, ) + (placeholder, ) * 3)
+        logger.debug(sql)
+
+        rows = self._rows(key, tuples)
+        count = 0
+        try:
+            # a dump replaces the rows of a key dumped before, like a file
+            # that is written again
+            c.execute("DELETE FROM %s WHERE partition = %s" % (self.table,
+                      placeholder), (key, ))
+            batch = list(islice(rows, self.batch_size))
+            while batch:
+                c.executemany(sql, batch)
+                count += len(batch)
+                batch = list(islice(rows, self.batch_size))
+            c.connection.commit()
+        except:
+            c.connection.rollback()
+            raise
+
+        logger.debug("inserted %d rows to %s" % (count, key))
+
+
+    def remove(self, key):
+        sql = "DELETE FROM %s WHERE partition = %s" % (self.table,
+                sql_placeholder(self.db))
+        logger.debug(sql)
+        with sql_cursor(self.db) as c:
+            c.execute(sql, (key, ))
+            c.connection.commit()
 
 
@@ -62,6 +62,10 @@ class SubTaskWrapper():
         return self.parent.request_worker(*args, **kwargs)
 
 
+    def progress_changed(self):
+        return self.parent.progress_changed()
+
+
     def _stop(self, *args, **kwargs):
         return self.task._stop(*args, **kwargs)
 
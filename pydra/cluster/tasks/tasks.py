@@ -68,6 +68,7 @@ class Task(object):
         @param results - return value from work(...)
         """
         self._status = STATUS_COMPLETE
+        self.progress_changed()
 
         if self.__callback:
             self.logger.debug('%s - Task._work() -Making callback' % self)
@@ -203,6 +204,16 @@ class Task(object):
         return self.parent.get_worker()
 
 
+    def progress_changed(self):
+        """
+        Informs the worker that the progress of this task may have changed.
+        Like request_worker(...) this bubbles up through the task tree to the
+        worker running the task, which reports changes to the Master.
+        """
+        if self.parent:
+            self.parent.progress_changed()
+
+
     def request_worker(self, *args, **kwargs):
         """
         Requests a worker for a subtask from the tasks parent.  calling this on any task will
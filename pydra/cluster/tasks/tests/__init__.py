@@ -19,6 +19,8 @@
 
 import unittest
 
+from pydra.cluster.tasks.tests.mapreduce import suite as mapreduce_suite
+from pydra.cluster.tasks.tests.slicer import suite as slicer_suite
 from pydra.cluster.tasks.tests.task_manager import suite as task_manager_suite
 from pydra.cluster.tasks.tests.tasks import suite as task_suite
 
@@ -28,6 +30,8 @@ def suite():
     Build a test suite from all the test suites in tasks
     """
     tasks_suite = unittest.TestSuite()
+    tasks_suite.addTest(mapreduce_suite())
+    tasks_suite.addTest(slicer_suite())
     tasks_suite.addTest(task_manager_suite())
     tasks_suite.addTest(task_suite())
 
@@ -1,11 +1,55 @@
+from __future__ import with_statement
 import unittest
 
-import tempfile, shutil
+import os, tempfile, shutil
+import simplejson
+import sqlite3
+from datetime import datetime
+from threading import Timer
 
 from pydra.cluster.tasks.mapreduce import *
-from pydra.cluster.tasks.tasks import Task
-from pydra.task_cache.mapreduce import *
+from pydra.cluster.tasks.slicer import *
+from pydra.cluster.tasks.tasks import Task, TaskNotFoundException
 from proxies import *
+from slicer import SQLiteDB
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    mapreduce_suite = unittest.TestSuite()
+    for test in (AppendableDict_Test, IntermediateResultsFiles_Test,
+                 IntermediateResultsShuffle_Test, IntermediateResultsSQL_Test,
+                 Partitioner_Test, MapReduceTask_Test, MapReduceWrapper_Test):
+        mapreduce_suite.addTest(unittest.makeSuite(test))
+    return mapreduce_suite
+
+
+class MapWords(Task):
+
+    def work(self, input, output, **kwargs):
+        for word in input:
+            output[word.strip()] = 1
+
+
+class ReduceWords(Task):
+
+    def work(self, input, output, **kwargs):
+        for word, values in input:
+            output[word] = sum(int(v) for v in values)
+
+
+class CountWords(MapReduceTask):
+
+    output = {}
+
+    map = MapWords
+    reduce = ReduceWords
+    combine = ReduceWords
+
+    intermediate = IntermediateResultsFiles(DatasourceDir(tempfile.gettempdir()))
+    reducers = 2
 
 
 class AppendableDict_Test(unittest.TestCase):
@@ -67,13 +111,339 @@ class IntermediateResultsFiles_Test(unittest.TestCase):
         c = { 'a': 0, 'b': 0, 'c': 0 }
         for p in im:
             for k, v in im.load(p):
-                c[k] += 1
+                c[k] += len(list(v))
 
         self.assertEqual(c['a'], 1)
         self.assertEqual(c['b'], 2)
         self.assertEqual(c['c'], 1)
 
 
+    def test_merge(self):
+
+        im = IntermediateResultsFiles(self.dir)
+        im.task_id = self.task_name
+
+        outputs = [{'c': [1], 'a': [2]}, {'b': [3], 'c': [4, 5]}, {'a': [6]}]
+        for i, output in enumerate(outputs):
+            pdict = im.partition_output(output)
+            im.update_partitions(im.dump(pdict, 'map%d' % i))
+
+        # keys are merged in order, with the values of all maps
+        for p in im:
+            merged = [(k, list(vs)) for k, vs in im.load(p)]
+
+        self.assertEqual(merged, [('a', [2, 6]), ('b', [3]), ('c', [1, 4, 5])])
+
+
+    def test_spill(self):
+
+        im = IntermediateResultsFiles(self.dir)
+        im.task_id = self.task_name
+        im.reducers = 2
+
+        maptask = MapWrapper(IdentityMapTask("IdentityMapTask"), im, \
+                             WorkerProxy(), spill_limit=2)
+        input = [('a', 1), ('b', 2), ('a', 3), ('c', 4), ('b', 5)]
+        partitions = maptask._start(args={'input': iter(input), 'id': 'map'})
+
+        # runs are merged into one dump per partition
+        self.assertEqual(sorted(partitions.values()), sorted(os.listdir(self.tempdir)))
+        im.update_partitions(partitions)
+        merged = {}
+        for p in im:
+            for k, vs in im.load(p):
+                merged[k] = list(vs)
+
+        self.assertEqual(merged, {'a': [1, 3], 'b': [2, 5], 'c': [4]})
+
+
+    def test_remove(self):
+        """
+        Verifies removing a dump deletes its file, and removing a missing dump
+        does not create one
+        """
+        output = FileBlockOutput(self.dir)
+        output.dump('dump', [('a', [1])])
+        output.remove('dump')
+        output.remove('missing')
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+
+    def test_state(self):
+        """
+        Verifies map tasks of iterative tasks read the state of the round
+        """
+        im = IntermediateResultsFiles(self.dir)
+        im.task_id = self.task_name
+        im.reducers = 2
+
+        pdict = im.partition_output({'a': [1], 'b': [[2, 3]]})
+        keys = im.dump(pdict, 'state0').values()
+
+        maptask = MapWrapper(IdentityMapTask("IdentityMapTask"), im, \
+                             WorkerProxy())
+        self.assertEqual(maptask.load_state(keys), {'a': 1, 'b': [2, 3]})
+
+    def test_block_format(self):
+
+        output = FileBlockOutput(self.dir, block_size=2, compress=True)
+        records = [('a', [1, 2]), ('b', [3]), ('c', [datetime(2009, 1, 1)])]
+        size = output.dump('blocks', records)
+        self.assertEqual(size, os.path.getsize(os.path.join(self.tempdir, 'blocks')))
+
+        # records are read back from both blocks, the second is pickled
+        input = FileBlockSubslicer(dir=self.dir)
+        self.assertEqual(list(input._records('blocks')), records)
+
+        with self.dir.load(('blocks', )) as f:
+            offset, index = read_block_index(f)
+        self.assertEqual([(count, key) for o, count, key in index], [(2, 'a'), (1, 'c')])
+
+
+    def test_pipelined_reduce(self):
+
+        im = IntermediateResultsFiles(self.dir)
+        im.task_id = self.task_name
+
+        worker = WorkerProxy()
+        worker.STOP_FLAG = False
+        reducetask = ReduceWrapper(ListReduceTask("ListReduceTask"), im, worker)
+        reducetask.merge_factor = 2
+        reducetask.poll_interval = 0.01
+
+        outputs = [{'a': [1]}, {'b': [2]}, {'a': [3]}]
+        for i, output in enumerate(outputs[:2]):
+            im.update_partitions(im.dump(im.partition_output(output), 'map%d' % i))
+        im.publish([0])
+
+        def complete():
+            im.update_partitions(im.dump(im.partition_output(outputs[2]), 'map2'))
+            im.publish([0], final=True)
+        timer = Timer(0.1, complete)
+        timer.start()
+
+        results = reducetask._start(args={'partition': 0, 'pipelined': True})
+        timer.join()
+        self.assertEqual(results, {'a': [1, 3], 'b': [2]})
+
+        # the run merged by the reduce task is named by its worker and removed
+        self.assertEqual(len(reducetask.runs), 1)
+        self.assert_(worker.worker_key in reducetask.runs[0])
+        self.assertEqual(len(os.listdir(self.tempdir)), 4)
+
+
+class ShuffleWorker(object):
+    """worker reading the shuffle files of every node from their directories"""
+
+    def __init__(self, worker_key, dirs):
+        self.worker_key = worker_key
+        self.dirs = dirs
+        self.fetches = 0
+
+    def fetch_shuffle(self, location, offset, size):
+        self.fetches += 1
+        node, name = location.rsplit('/', 1)
+        with open(os.path.join(self.dirs[node], name), 'rb') as f:
+            f.seek(offset)
+            return os.fstat(f.fileno()).st_size, f.read(size)
+
+
+class IntermediateResultsShuffle_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dirs = {'nodeA:11890': tempfile.mkdtemp(),
+                     'nodeB:11890': tempfile.mkdtemp()}
+
+    def tearDown(self):
+        for dir in self.dirs.values():
+            shutil.rmtree(dir)
+
+    def im(self, node):
+        im = IntermediateResultsShuffle(self.dirs[node], chunk_size=16)
+        im.task_id = 'test_task'
+        worker = ShuffleWorker('%s:0' % node, self.dirs)
+        im.set_worker(worker)
+        return im, worker
+
+    def test_remote_load(self):
+        """
+        Verifies dumps are stored on the node that dumped them and are read
+        in chunks by other nodes
+        """
+        map_im, map_worker = self.im('nodeA:11890')
+        pdict = map_im.partition_output({'a': [1, 2], 'b': [3]})
+        keys = map_im.dump(pdict, 'map1').values()
+        self.assertEqual(keys, ['nodeA:11890/mapreduce-i9e-test_task-0-map1'])
+
+        # read locally
+        result = dict((k, list(vs)) for k, vs in map_im.load(keys))
+        self.assertEqual(result, {'a': [1, 2], 'b': [3]})
+        self.assertEqual(map_worker.fetches, 0)
+
+        # read from another node
+        reduce_im, reduce_worker = self.im('nodeB:11890')
+        result = dict((k, list(vs)) for k, vs in reduce_im.load(keys))
+        self.assertEqual(result, {'a': [1, 2], 'b': [3]})
+        self.assert_(reduce_worker.fetches > 2)
+        self.assertFalse(os.listdir(self.dirs['nodeB:11890']))
+
+
+class IntermediateResultsSQL_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SQLiteDB()
+        self.im = IntermediateResultsSQL('im', self.db)
+        self.im.task_id = 'test_task'
+        self.im.reducers = 2
+        self.im.map_output.batch_size = 2
+
+    def test_dump_load(self):
+        """
+        Verifies rows dumped in batches are read back grouped by key, and
+        that values are quoted by the database
+        """
+        pdict = self.im.partition_output({'a': [1, 2, 3], "b'": [4]})
+        p1 = self.im.dump(pdict, 'map1')
+        pdict = self.im.partition_output({'a': [5], 'c': [6]})
+        p2 = self.im.dump(pdict, 'map2')
+
+        keys = [p1.get(p) for p in range(2)] + [p2.get(p) for p in range(2)]
+        result = dict((k, sorted(vs)) for k, vs in \
+                      self.im.load([k for k in keys if k]))
+        self.assertEqual(result, {'a': ['1', '2', '3', '5'], "b'": ['4'],
+                                  'c': ['6']})
+
+        # the (partition, k) index is created with the table
+        c = self.db.load(None)
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        self.assertEqual(c.fetchall(), [('im_partition_k', )])
+
+    def test_create_existing(self):
+        """
+        Verifies an existing index is reused, but other errors are raised
+        """
+        output = SQLTableOutput(self.db, 'im')
+        output.create(self.db.load(None))
+        SQLTableOutput(self.db, 'im').create(self.db.load(None))
+        self.assertRaises(sqlite3.Error, SQLTableOutput(self.db,
+                          'missing table').create, self.db.load(None))
+
+    def test_placeholder(self):
+        self.assertEqual('?', sql_placeholder(self.db))
+        self.assertEqual('%s', sql_placeholder(object()))
+
+    def test_remove(self):
+        pdict = self.im.partition_output({'a': [1], 'b': [2]})
+        partitions = self.im.dump(pdict, 'map1')
+        for key in partitions.values():
+            self.im.map_output.remove(key)
+        self.assertEqual(list(self.im.load(partitions.values())), [])
+
+    def test_dump_again(self):
+        """
+        Verifies dumping a key again replaces its rows
+        """
+        key = self.im.dump(self.im.partition_output({'a': [1]}), 'map0')[0]
+        self.im.dump(self.im.partition_output({'a': [2]}), 'map0')
+        self.assertEqual([(k, list(vs)) for k, vs in self.im.load([key])],
+                         [('a', ['2'])])
+
+    def test_pipelined_reduce(self):
+        """
+        Verifies dumps listed by a manifest published several times are
+        merged once
+        """
+        self.db = SQLiteDB(check_same_thread=False)
+        im = IntermediateResultsSQL('im', self.db)
+        im.task_id = 'test_task'
+
+        worker = WorkerProxy()
+        worker.STOP_FLAG = False
+        reducetask = ReduceWrapper(ListReduceTask("ListReduceTask"), im, worker)
+        reducetask.merge_factor = 2
+        reducetask.poll_interval = 0.01
+
+        def map(i):
+            im.update_partitions(im.dump(im.partition_output({'a': [i]}),
+                                         'map%d' % i))
+        map(1)
+        map(2)
+        im.publish([0])
+
+        def complete():
+            map(3)
+            im.publish([0])
+            map(4)
+            im.publish([0], final=True)
+        timer = Timer(0.1, complete)
+        timer.start()
+
+        results = reducetask._start(args={'partition': 0, 'pipelined': True})
+        timer.join()
+        self.assertEqual(sorted(results['a']), ['1', '2', '3', '4'])
+
+
+class Partitioner_Test(unittest.TestCase):
+
+    def setUp(self):
+        # one hot key and twelve keys with a single value each
+        self.counts = dict((k, 1) for k in 'abcdefghijkl')
+        self.counts['m'] = 12
+
+    def test_hash_partitioner(self):
+        """
+        Verifies keys are hashed by their string
+        """
+        p = HashPartitioner()
+        self.assertEqual(p.partition('a', 4), hash('a') % 4)
+        self.assertEqual(p.partition(u'a', 4), hash('a') % 4)
+        self.assertEqual(p.partition(10, 4), hash('10') % 4)
+        self.assertEqual(p.partition(('a', 1), 4), hash("('a', 1)") % 4)
+
+    def test_range_partitioner(self):
+        """
+        Verifies ranges are chosen so partitions receive similar counts of
+        values, and that keys are kept in order
+        """
+        p = RangePartitioner()
+        p.sample(dict((k, 1) for k in 'abcdefgh'), 4)
+        self.assertEqual(p.get_state(), ['b', 'd', 'f'])
+
+        parts = [p.partition(k, 4) for k in 'abcdefghz']
+        self.assertEqual(parts, [0, 0, 1, 1, 2, 2, 3, 3, 3])
+
+    def test_skew_partitioner_isolate(self):
+        """
+        Verifies a hot key is placed in the least loaded partition when its
+        values may not be split
+        """
+        p = SkewPartitioner()
+        p.sample(self.counts, 4)
+        parts = set(p.partition('m', 4) for i in range(20))
+        self.assertEqual(len(parts), 1)
+
+        loads = [0] * 4
+        for k in 'abcdefghijkl':
+            loads[p.partition(k, 4)] += 1
+        self.assertEqual(loads[parts.pop()], min(loads))
+
+    def test_skew_partitioner_split(self):
+        """
+        Verifies the values of a hot key are divided between partitions, and
+        that the placement survives serialization
+        """
+        p = SkewPartitioner()
+        p.sample(self.counts, 4, split=True)
+
+        state = simplejson.loads(simplejson.dumps(p.get_state()))
+        q = SkewPartitioner()
+        q.set_state(state)
+
+        parts = set(q.partition(u'm', 4) for i in range(100))
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(q.partition('a', 4), hash('a') % 4)
+
+
 class MapReduceTask_Test(unittest.TestCase):
     """
     Tests for verify functionality of MapReduceTask class
@@ -154,6 +524,96 @@ class MapReduceTask_Test(unittest.TestCase):
         self.assertRaises(TaskNotFoundException, self.mapreduce_task.get_subtask, key.split('.'))
 
 
+    def test_start_reduce_early(self):
+        """
+        Verifies reduce tasks start early only once all map tasks have started
+        and enough of them have completed
+        """
+        task = self.mapreduce_task
+        task._maps_requested = True
+        task._map_count = 4
+        task.map_tasks = {'map2': 1, 'map3': 1}
+        task._maps_started = set(['map0', 'map1', 'map2'])
+        self.assertFalse(task.start_reduce_early())
+
+        task._maps_started.add('map3')
+        self.assert_(task.start_reduce_early())
+
+        task.map_tasks['map1'] = 1
+        self.assertFalse(task.start_reduce_early())
+
+
+    def test_update_output(self):
+        """
+        Verifies results of a key split between reduce tasks are combined
+        """
+        task = self.mapreduce_task
+        task.output = {}
+        task.update_output({'a': 1, 'b': 2})
+        task.update_output({'b': 3, 'c': 4})
+        self.assertEqual(task.output, {'a': 1, 'b': 5, 'c': 4})
+
+
+    def test_next_round(self):
+        """
+        Verifies iterative tasks run rounds until the state stops changing or
+        max_rounds have run, and that the output becomes the state
+        """
+        task = self.mapreduce_task
+        task.iterative = True
+        task.max_rounds = 3
+        task.state = {}
+        task._round = 0
+        task._state_keys = None
+        task._pipelined = False
+        rounds = []
+        task._start_round = lambda: rounds.append(task._round)
+
+        task.output = {'a': 1}
+        self.assert_(task.next_round())
+        self.assertEqual(task.state, {'a': 1})
+        self.assertEqual(task.output, {})
+
+        # unchanged state has converged
+        task.output = {'a': 1}
+        self.assertFalse(task.next_round())
+        self.assertEqual(rounds, [1])
+
+        # max_rounds
+        task._round = 2
+        task.output = {'a': 2}
+        self.assertFalse(task.next_round())
+        self.assertEqual(rounds, [1])
+
+
+    def test_next_round_removes_dumps(self):
+        """
+        Verifies the dumps, state and manifests of a round are removed before
+        the next round, which names its dumps the same
+        """
+        task = self.mapreduce_task
+        db = SQLiteDB()
+        task.im = IntermediateResultsSQL('im', db)
+        task.iterative = True
+        task.state = {}
+        task._round = 0
+        task._start_round = lambda: None
+
+        task.im.update_partitions(task.im.dump( \
+            task.im.partition_output({'a': [1]}), 'map0'))
+        task._state_keys = task.im.dump( \
+            task.im.partition_output({'a': [0]}), 'state0').values()
+        task._pipelined = True
+        task.im.publish(range(task.reducers), final=True)
+
+        task.output = {'a': 1}
+        self.assert_(task.next_round())
+        c = db.load(None)
+        c.execute("SELECT COUNT(*) FROM im")
+        self.assertEqual(c.fetchone(), (0, ))
+        self.assertEqual(list(task.im), [])
+
+
     def test_get_worker_mapreducetask(self):
         """
         Verifies that the worker can be retrieved
@@ -192,9 +652,21 @@ class IdentityReduceTask(Task):
             output[k] = v
 
 
+class ListReduceTask(Task):
+
+    def _work(self, input, output, **kwargs):
+
+        for k, vs in input:
+            output[k] = list(vs)
+
+
 class NullIM():
     """dummy intermediate results class"""
 
+    def set_worker(self, worker):
+        pass
+
+
     def partition_output(self, output):
         return output
 
@@ -207,6 +679,45 @@ class NullIM():
         return fs.iteritems()
 
 
+class SumTask(Task):
+
+    def work(self, input, output, **kwargs):
+
+        for k, vs in input:
+            output[k] = sum(vs) + output.get(k, 0)
+
+
+class PartitionIM(NullIM):
+    """dummy intermediate results class placing output in one partition"""
+
+    def partition_output(self, output):
+        return {0: output.items()}.iteritems()
+
+
+    def dump(self, pdict, mapid):
+        return dict((p, list(tuples)) for p, tuples in pdict)
+
+
+class CountingInput(dict):
+    """datasource counting the keys loaded"""
+
+    loads = 0
+
+    def load(self, key):
+        self.loads += 1
+        return iter(self[key])
+
+
+class IterativeParent(WorkerProxy):
+    """parent of map tasks of an iterative task"""
+
+    iterative = True
+
+    def __init__(self, input):
+        WorkerProxy.__init__(self)
+        self.input = input
+
+
 class MapReduceWrapper_Test(unittest.TestCase):
 
     def setUp(self):
@@ -256,3 +767,57 @@ class MapReduceWrapper_Test(unittest.TestCase):
         returned = self.reducetask.get_subtask(key.split('.'))
         self.assert_(returned is expected, 'ReduceTask retrieved was not the expected Task')
 
+
+    def test_work_mapwrapper_cache(self):
+        """
+        Verifies inputs of iterative tasks are loaded once, and that the
+        worker is returned with the results
+        """
+        input = CountingInput(k1=[('a', 1), ('b', 2)])
+        maptask = MapWrapper(IdentityMapTask("IdentityMapTask"), \
+                             PartitionIM(), IterativeParent(input))
+
+        for i in range(3):
+            partitions = maptask._start(args={'input_key': 'k1', 'id': 'map'})
+            self.assertEqual(partitions[0], [('a', [1]), ('b', [2])])
+        self.assertEqual(input.loads, 1)
+        self.assertEqual(partitions['worker'], 'WorkerProxy')
+
+        # the least recently used input is dropped from a full cache
+        maptask.cache.size = 1
+        input['k2'] = [('c', 3)]
+        maptask._start(args={'input_key': 'k2', 'id': 'map'})
+        maptask._start(args={'input_key': 'k1', 'id': 'map'})
+        self.assertEqual(input.loads, 3)
+        self.assertEqual(len(maptask.cache), 1)
+
+
+    def test_work_reducewrapper_combine(self):
+        """
+        Verifies the combiner of a reduce task consumes its input one key
+        group at a time
+        """
+        reducetask = ReduceWrapper(ListReduceTask("ListReduceTask"), \
+                                   NullIM(), self.worker, SumTask("SumTask"))
+        consumed = []
+        def groups():
+            for k, vs in [('a', [1, 2]), ('b', [3]), ('c', [4, 5])]:
+                consumed.append(k)
+                yield k, iter(vs)
+
+        combined = reducetask.combine_groups(groups())
+        self.assertEqual(next(combined), ('a', [3]))
+        self.assertEqual(consumed, ['a'])
+        self.assertEqual(list(combined), [('b', [3]), ('c', [9])])
+
+    def test_work_mapwrapper_combine(self):
+        maptask = MapWrapper(IdentityMapTask("IdentityMapTask"), \
+                             PartitionIM(), self.worker, SumTask("SumTask"))
+        input = [('a', 1), ('b', 1), ('a', 2)]
+
+        partitions = maptask._start(args={'input': iter(input), 'id': 'map'})
+        self.assertEqual(partitions[0], [('a', [3]), ('b', [1])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,16 +33,19 @@ def suite():
     tasks_suite = unittest.TestSuite()
 
     # key generation
-    tasks_suite.addTest(Task_Test('test_key_generation_paralleltask'))
-    tasks_suite.addTest(Task_Test('test_key_generation_paralleltask_child'))
+    tasks_suite.addTest(ParallelTask_Test('test_key_generation_paralleltask'))
+    tasks_suite.addTest(ParallelTask_Test('test_key_generation_paralleltask_child'))
 
     # subtask lookup
-    tasks_suite.addTest(Task_Test('test_get_subtask_paralleltask'))
-    tasks_suite.addTest(Task_Test('test_get_subtask_paralleltask_child'))
+    tasks_suite.addTest(ParallelTask_Test('test_get_subtask_paralleltask'))
+    tasks_suite.addTest(ParallelTask_Test('test_get_subtask_paralleltask_child'))
 
     # worker lookup
-    tasks_suite.addTest(Task_Test('test_get_worker_paralleltask'))
-    tasks_suite.addTest(Task_Test('test_get_worker_paralleltask_child'))
+    tasks_suite.addTest(ParallelTask_Test('test_get_worker_paralleltask'))
+    tasks_suite.addTest(ParallelTask_Test('test_get_worker_paralleltask_child'))
+
+    # workunit requests
+    tasks_suite.addTest(ParallelTask_Test('test_request_workers_window'))
 
     return tasks_suite
 
@@ -128,3 +131,26 @@ class ParallelTask_Test(unittest.TestCase):
         returned = self.parallel_task.subtask.get_worker()
         self.assert_(returned, 'no worker was returned')
         self.assertEqual(returned, self.worker, 'worker retrieved was not the expected worker')    
+
+
+    def test_request_workers_window(self):
+        """
+        Verifies workunits are read lazily and at most workunit_window are
+        requested at once
+        """
+        task = self.parallel_task
+        task.workunit_window = 3
+        task._data = (i for i in range(5))
+        task._work()
+        self.assertEqual([r[2] for r in self.worker.requests], [1, 2, 3])
+        self.assertEqual(task.progress(), 0)
+
+        task._work_unit_complete('results', 1)
+        self.assertEqual([r[2] for r in self.worker.requests], [1, 2, 3, 4])
+
+        # failed workunits are requested again before new data
+        task._worker_failed(2)
+        task._work_unit_complete('results', 3)
+        self.assertEqual([r[1:] for r in self.worker.requests[4:]],
+                         [({'data':1}, 5), ({'data':4}, 6)])
+        self.assertEqual(task._data_in_progress, {4:3, 5:1, 6:4})
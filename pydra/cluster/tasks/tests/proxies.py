@@ -28,12 +28,24 @@ class WorkerProxy():
     """
     worker_key = "WorkerProxy"
 
+    def __init__(self):
+        self.requests = []
+
     def get_worker(self):
         return self
 
     def get_key(self):
         return None
 
+    def progress_changed(self):
+        pass
+
+    def request_worker(self, subtask_key, args, workunit_key, host=None):
+        self.requests.append((subtask_key, args, workunit_key))
+
+    def request_worker_release(self):
+        pass
+
 
 class StartupAndWaitTask(Task):
     """
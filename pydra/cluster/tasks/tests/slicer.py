@@ -0,0 +1,223 @@
+from __future__ import with_statement
+import unittest
+
+import os, tempfile, shutil
+import sqlite3
+
+from pydra.cluster.tasks.slicer import *
+from pydra.cluster.tasks.datasource.backend import SQLBackend
+from pydra.cluster.tasks.datasource.selector import SQLSelector
+
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    slicer_suite = unittest.TestSuite()
+    slicer_suite.addTest(unittest.makeSuite(LineRangeSlicer_Test))
+    slicer_suite.addTest(unittest.makeSuite(SQLTableSlicer_Test))
+    return slicer_suite
+
+
+class LineFiles(object):
+    """datasource loading files of a directory by key"""
+
+    def __init__(self, dir):
+        self.dir = dir
+
+    def __iter__(self):
+        for name in sorted(os.listdir(self.dir)):
+            yield (name, )
+
+    def load(self, key):
+        return open(os.path.join(self.dir, key[0]))
+
+
+class LineRangeSlicer_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.lines = ['line %d%s' % (i, 'x' * (i % 13)) for i in range(1000)]
+        with open(os.path.join(self.dir, 'f'), 'w') as f:
+            f.write('\n'.join(self.lines) + '\n')
+
+        self.slicer = LineRangeSlicer(ranges=4)
+        self.slicer.input = LineFiles(self.dir)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+    def test_ranges(self):
+        keys = list(self.slicer)
+        self.assertEqual(4, len(keys))
+
+        size = os.path.getsize(os.path.join(self.dir, 'f'))
+        self.assertEqual(0, keys[0][1])
+        self.assertEqual(size, keys[-1][2])
+        for previous, key in zip(keys, keys[1:]):
+            self.assertEqual(previous[2], key[1])
+
+
+    def test_load(self):
+        lines = []
+        for key in self.slicer:
+            lines.extend(self.slicer.load(key))
+        self.assertEqual(self.lines, lines)
+
+
+    def test_send_as_input(self):
+        self.slicer.send_as_input = True
+        self.assertEqual(self.lines, list(self.slicer))
+
+
+    def test_buffers(self):
+        slicer = LineRangeSlicer(ranges=4, buffers=True)
+        slicer.input = self.slicer.input
+        lines = []
+        for key in slicer:
+            lines.extend(slicer.load(key))
+
+        self.assertTrue(isinstance(lines[0], buffer))
+        self.assertEqual(self.lines, [str(line) for line in lines])
+        self.assertEqual(1, len(slicer._maps))
+        slicer.close()
+
+
+    def test_open_files(self):
+        for name in 'abc':
+            with open(os.path.join(self.dir, name), 'w') as f:
+                f.write('%s\n' % name)
+        slicer = LineFileSlicer(open_files=2)
+        slicer.input = self.slicer.input
+        lines = [slicer.load(key) for key in slicer]
+        self.assertEqual(['a', 'b', 'c'], lines[:3])
+        self.assertEqual(2, len(slicer._maps))
+        slicer.close()
+        self.assertEqual(0, len(slicer._maps))
+
+
+    def test_line_file_slicer(self):
+        slicer = LineFileSlicer()
+        slicer.input = self.slicer.input
+        keys = list(slicer)
+        self.assertEqual(len(self.lines), len(keys))
+        self.assertEqual(self.lines[10], slicer.load(keys[10]))
+        slicer.close()
+
+
+    def test_short_file(self):
+        with open(os.path.join(self.dir, 'f'), 'w') as f:
+            f.write('a\nb\n')
+
+        slicer = LineRangeSlicer(ranges=8)
+        slicer.input = self.slicer.input
+        keys = list(slicer)
+        self.assertEqual(['a', 'b'], [l for key in keys for l in slicer.load(key)])
+
+
+class SQLiteDB(object):
+    """database loading cursors of a sqlite connection"""
+
+    dbapi = sqlite3
+
+    def __init__(self, **kwargs):
+        self.connection = sqlite3.connect(':memory:', **kwargs)
+
+    def load(self, key):
+        return self.connection.cursor()
+
+
+class SQLiteTables(SQLiteDB):
+    """database with a single input key"""
+
+    def __iter__(self):
+        yield ('db', )
+
+
+class SQLTableSlicer_Test(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SQLiteTables()
+        c = self.db.load(None)
+        c.execute("CREATE TABLE rows (id INTEGER PRIMARY KEY, v TEXT)")
+        c.executemany("INSERT INTO rows (id, v) VALUES (?, ?)",
+                      [(i * 2, 'v%d' % i) for i in range(1, 26)])
+
+    def slicer(self, **kwargs):
+        slicer = SQLTableSlicer(table='rows', **kwargs)
+        slicer.input = self.db
+        return slicer
+
+    def test_rows(self):
+        slicer = self.slicer()
+        keys = list(slicer)
+        self.assertEqual(25, len(keys))
+        self.assertEqual((('db', 2), (2, 'v1')), (keys[0], slicer.load(keys[0])))
+
+    def test_ranges(self):
+        slicer = self.slicer(range_size=10, fetch_size=3)
+        keys = list(slicer)
+        self.assertEqual([('db', None, 20), ('db', 20, 40), ('db', 40, None)],
+                         keys)
+
+        rows = []
+        for key in keys:
+            rows.extend(slicer.load(key))
+        self.assertEqual([(i * 2, 'v%d' % i) for i in range(1, 26)], rows)
+
+    def test_pool(self):
+        """
+        Verifies a selector over a backend borrows connections from its pool
+        """
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            backend = SQLBackend('sqlite', path, pool_size=2)
+            c = backend.handle.cursor()
+            c.execute("CREATE TABLE rows (id INTEGER PRIMARY KEY, v TEXT)")
+            c.executemany("INSERT INTO rows (id, v) VALUES (?, ?)",
+                          [(i, 'v%d' % i) for i in range(1, 6)])
+            backend.handle.commit()
+
+            slicer = SQLTableSlicer(table='rows', range_size=2)
+            slicer.input = SQLSelector(backend)
+            rows = []
+            for key in slicer:
+                rows.extend(slicer.load(key))
+            self.assertEqual([(i, 'v%d' % i) for i in range(1, 6)], rows)
+            # keys and rows were read on connections of their own, and both
+            # were given back
+            self.assertEqual(2, backend.pool.count)
+            self.assertEqual(2, len(backend.pool.idle))
+            backend.pool.close()
+            backend.disconnect()
+        finally:
+            os.remove(path)
+
+    def test_ranges_exact(self):
+        slicer = self.slicer(range_size=25)
+        keys = list(slicer)
+        self.assertEqual([('db', None, 50)], keys)
+        self.assertEqual(25, len(slicer.load(keys[0])))
+
+    def test_ranges_empty(self):
+        self.db.load(None).execute("DELETE FROM rows")
+        self.assertEqual([], list(self.slicer(range_size=10)))
+
+    def test_ranges_shared_cursor(self):
+        """
+        Verifies ranges loaded from a shared cursor do not disturb each other
+        """
+        cursor = self.db.load(None)
+        self.db.load = lambda key: cursor
+        slicer = self.slicer(range_size=10, fetch_size=3)
+        first, second = [slicer.load(key) for key in list(slicer)[:2]]
+        self.assertEqual((2, 'v1'), first[0])
+        self.assertEqual(10, len(list(first)))
+        self.assertEqual((22, 'v11'), second[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
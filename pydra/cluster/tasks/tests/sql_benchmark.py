@@ -0,0 +1,141 @@
+"""
+    Copyright 2009 Oregon State University
+
+    This file is part of Pydra.
+
+    Pydra is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Pydra is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Benchmark for SQL intermediate results throughput on a local sqlite database.
+Map output is dumped to a table and read back by partition.  Three modes are
+measured:
+
+    autocommit - one formatted INSERT per value, each committed on its own,
+                 read back one fetchone() at a time from an unindexed table
+    row        - one formatted INSERT per value in one transaction for each
+                 dump, read back like autocommit
+    bulk       - SQLTableOutput and SQLTableKeyInput: batched executemany
+                 inserts in one transaction, read back with fetchmany using
+                 the (partition, k) index
+
+row and bulk commit equally often, so comparing them measures batching and
+indexing alone.  autocommit adds the cost of a commit per value.
+
+usage: python sql_benchmark.py [value_count ...]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from pydra.cluster.tasks.slicer import SQLTableKeyInput, SQLTableOutput
+
+
+class SQLiteDB(object):
+    """database loading cursors of a sqlite connection"""
+
+    dbapi = sqlite3
+
+    def __init__(self, path, isolation_level=''):
+        self.connection = sqlite3.connect(path, isolation_level=isolation_level)
+
+    def load(self, key):
+        return self.connection.cursor()
+
+
+def row_dump(db, table, key, tuples):
+    c = db.load(None)
+    for k, vals in tuples:
+        for v in vals:
+            c.execute("INSERT INTO %s (partition, k, v) VALUES ('%s', '%s', '%s')" % \
+                      (table, key, k, str(v)))
+    db.connection.commit()
+
+
+def row_load(db, table, keys):
+    c = db.load(None)
+    partitions = ", ".join("'%s'" % key for key in keys)
+    c.execute("SELECT k, v FROM %s WHERE partition IN (%s) ORDER BY k" % \
+              (table, partitions))
+    for k, rows in groupby(iter(c.fetchone, None), itemgetter(0)):
+        for row in rows:
+            pass
+
+
+def bulk_dump(db, table, key, tuples):
+    SQLTableOutput(db, table).dump(key, tuples)
+
+
+def bulk_load(db, table, keys):
+    input = SQLTableKeyInput(db=db, table=table)
+    input.input = keys
+    for k, values in input:
+        for v in values:
+            pass
+
+
+def benchmark(value_count, mode, partitions=4):
+    """
+    Times dumping value_count values, 10 per key, split between partitions,
+    and reading back the first partition.
+
+    @returns tuple of values written per second, values read per second
+    """
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        if mode in ('autocommit', 'row'):
+            db = SQLiteDB(path, None if mode == 'autocommit' else '')
+            db.load(None).execute("CREATE TABLE im (partition VARCHAR(255), " \
+                                  "k VARCHAR(255), v TEXT)")
+            dump, load = row_dump, row_load
+        else:
+            db = SQLiteDB(path)
+            dump, load = bulk_dump, bulk_load
+
+        keys = ['key%d' % i for i in range(partitions)]
+        tuples = [('k%06d' % i, range(10)) for i in range(value_count / 10)]
+        share = len(tuples) / partitions
+
+        start = time.time()
+        for i, key in enumerate(keys):
+            dump(db, 'im', key, tuples[i * share:(i + 1) * share])
+        written = time.time() - start
+
+        start = time.time()
+        load(db, 'im', keys[:1])
+        read = time.time() - start
+        db.connection.close()
+    finally:
+        os.remove(path)
+
+    return value_count / written, value_count / partitions / read
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    modes = ('autocommit', 'row', 'bulk')
+    print '%8s' % 'values',
+    for mode in modes:
+        print '%20s %20s' % (mode + ' write/s', mode + ' read/s'),
+    print
+    for count in counts:
+        print '%8d' % count,
+        for mode in modes:
+            print '%20.0f %20.0f' % benchmark(count, mode),
+        print
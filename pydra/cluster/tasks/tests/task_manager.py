@@ -33,6 +33,15 @@ from pydra.cluster.tasks.task_manager import TaskManager
 from pydra.models import TaskInstance
 from pydra.util import makedirs
 
+
+def suite():
+    """
+    Build a test suite from all the test suites in this module
+    """
+    task_manager_suite = unittest.TestSuite()
+    task_manager_suite.addTest(unittest.makeSuite(TaskManager_Test))
+    return task_manager_suite
+
 class TaskManager_Test(unittest.TestCase):
 
     def setUp(self):
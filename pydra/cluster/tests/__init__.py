@@ -20,6 +20,7 @@
 import unittest
 
 from pydra.cluster.auth.tests import suite as auth_suite
+from pydra.cluster.master.tests import suite as master_suite
 from pydra.cluster.tasks.tests import suite as tasks_suite
 
 
@@ -29,6 +30,7 @@ def suite():
     """
     cluster_suite = unittest.TestSuite()
     cluster_suite.addTest(auth_suite())
+    cluster_suite.addTest(master_suite())
     cluster_suite.addTest(tasks_suite())
 
     return cluster_suite
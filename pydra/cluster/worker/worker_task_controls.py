@@ -17,6 +17,7 @@
     along with Pydra.  If not, see <http://www.gnu.org/licenses/>.
 """
 from __future__ import with_statement
+from collections import deque
 from threading import Lock
 
 import simplejson
@@ -34,15 +35,6 @@ import logging
 logger = logging.getLogger('root')
 
 
-def BatchIterator(batch, key, version, task_class, module_search_path, args,
-                  main_worker, task_id, callback):
-    """Creates an iterator used for cycling through workunits in the batch"""
-    for subtask in batch.keys():
-        workunits = batch[subtask]
-        for workunit in workunits:
-            yield key, version, task_class, module_search_path, args, subtask, \
-                workunit, main_worker, task_id, callback
-
 def BatchIteratorNoArgs(batch):
     """Creates an iterator used for cycling through workunits in the batch"""
     for subtask in batch.keys():
@@ -69,7 +61,8 @@ class WorkerTaskControls(Module):
             ('MASTER', self.receive_results),
             ('MASTER', self.release_worker),
             ('MASTER', self.return_work),
-            ('MASTER', self.subtask_started)
+            ('MASTER', self.subtask_started),
+            ('MASTER', self.steal_work)
         ]
 
         self._friends = {
@@ -85,6 +78,9 @@ class WorkerTaskControls(Module):
         self.__workunit = None
         self.__results = None
         self.__batch = None
+        self.__batch_args = None
+        self.__main_worker = None
+        self.__progress = None
 
         # shutdown tracking
         self.__pending_releases = 0
@@ -122,26 +118,61 @@ class WorkerTaskControls(Module):
     def run_batch(self, key, version, task_class, module_search_path, args,
                   workunits, main_worker=None, task_id=None):
         """
-        Creates the batch iterator which will yield arguments for each
-        run_task call, and then starts the batch cycle
+        Flattens the subtask/workunit structure of the batch into a queue of
+        subtask/workunit combinations, and then starts the batch cycle.
+        Workunits remain in the queue until they are started so that they may
+        be stolen by other workers.
         """
         self.__results = []
-        self.__batch = BatchIterator(workunits, key, version, task_class, \
-                                module_search_path, args, main_worker, \
-                                task_id, self.batched_work_complete)
+        self.__batch_args = (key, version, task_class, module_search_path, \
+                             args, main_worker, task_id)
+        self.__batch = deque(BatchIteratorNoArgs(workunits))
         self.run_next()
 
     def run_next(self):
         """
-        Runs the next subtask in self.__batch which is an iterator that
-        flattens the subtask/workunit structure into a list of subtask/workunit
-        combinations.  If there are no more workunits in the iterator then
-        batch_complete is called to finish this task
+        Runs the next subtask/workunit in self.__batch.  If there are no more
+        workunits in the queue then batch_complete is called to finish this
+        task
         """
-        try:
-            self._run_task(*self.__batch.next())
-        except StopIteration:
+        with self._lock:
+            try:
+                subtask, workunit = self.__batch.popleft()
+            except IndexError:
+                subtask = workunit = None
+
+        if subtask is None:
             self.batch_complete()
+        else:
+            key, version, task_class, module_search_path, args, main_worker, \
+                task_id = self.__batch_args
+            self._run_task(key, version, task_class, module_search_path, args,
+                           subtask, workunit, main_worker, task_id,
+                           self.batched_work_complete)
+
+    def steal_work(self, count):
+        """
+        Removes workunits that have not been started from the end of the
+        current batch so that they can be run by another worker.  The results
+        sent for this batch will not include the removed workunits.
+
+        @param count - maximum number of workunits to remove
+        @returns dictionary of subtask keys and lists of workunit keys that
+                 were removed
+        """
+        stolen = {}
+        with self._lock:
+            if not self.__batch:
+                return stolen
+            for i in range(min(count, len(self.__batch))):
+                subtask, workunit = self.__batch.pop()
+                try:
+                    stolen[subtask].append(workunit)
+                except KeyError:
+                    stolen[subtask] = [workunit]
+        logger.info('%d workunits stolen from batch' % \
+                    sum([len(w) for w in stolen.values()]))
+        return stolen
 
     def run_task(self, key, version, args={}, workunits=None, \
                     main_worker=None, task_id=None):
@@ -192,6 +223,7 @@ class WorkerTaskControls(Module):
             # save what worker is running
             self.__task = key
             self.__subtask = subtask_key
+            self.__main_worker = main_worker
 
         # process args to make sure they are no longer unicode.  This is an
         # issue with the args coming through the django frontend.
@@ -261,7 +293,9 @@ class WorkerTaskControls(Module):
         """
         if self.__task_instance.STOP_FLAG:
             # If stop flag is set for either the main task or local task
-            # then ignore any results and stop the task
+            # then ignore any results and stop the task.  The rest of the
+            # batch is not run.
+            self.batch_complete()
             return
         
         # create traceback if its an error
@@ -377,6 +411,35 @@ class WorkerTaskControls(Module):
             return self.__task_instance.progress()
 
 
+    def progress_changed(self):
+        """
+        Called by tasks when their progress may have changed.  The progress of
+        the root task is pushed to the Master when it differs from the last
+        progress sent.  Only the main worker reports progress because it is the
+        only worker running the root task.
+        """
+        if not self.__task_instance or self.__main_worker != self.worker_key:
+            return
+
+        progress = int(self.__task_instance.progress())
+        with self._lock:
+            if progress == self.__progress:
+                return
+            self.__progress = progress
+
+        # tasks run in threads, remote calls must be made from the reactor
+        reactor.callFromThread(self.send_progress, progress)
+
+
+    def send_progress(self, progress):
+        """
+        Sends the progress of the root task to the Master
+        """
+        with self._lock_connection:
+            if self.master:
+                self.master.callRemote('task_progress', progress)
+
+
     def receive_results(self, worker_key, results, subtask_key):
         """
         Function called to make the subtask receive the results processed by
@@ -410,12 +473,27 @@ class WorkerTaskControls(Module):
         reactor.stop()
 
 
-    def request_worker(self, subtask_key, args, workunit_key):
+    def request_worker(self, subtask_key, args, workunit_key, host=None):
         """
-        Requests a work unit be handled by another worker in the cluster
+        Requests a work unit be handled by another worker in the cluster.  If
+        host is given workers on that host are preferred.
         """
         logger.info('requesting worker for: %s' % subtask_key)
-        deferred = self.master.callRemote('request_worker', subtask_key, args, workunit_key)
+        deferred = self.master.callRemote('request_worker', subtask_key, args, workunit_key, host)
+
+
+    def fetch_shuffle(self, location, offset, size):
+        """
+        Reads a chunk of a shuffle file stored on any node.  This is called
+        from the thread running a task and blocks until the chunk is received.
+
+        @param location - node key and name of the file, separated by a slash
+        @param offset - offset of the chunk
+        @param size - most bytes to read
+        @returns tuple of (size of the file, chunk)
+        """
+        return threads.blockingCallFromThread(reactor, self.master.callRemote,
+                'fetch_shuffle', location, offset, size)
 
 
     def request_worker_release(self):
@@ -24,6 +24,8 @@ import time
 from django.db import models
 import simplejson
 
+from pydra.util import seconds
+
 class Node(models.Model):
     """
     Represents a node in the cluster
@@ -164,6 +166,8 @@ class TaskInstance(AbstractJob):
         self.last_succ_time   = None # when this task last time gets a worker
         self._worker_requests = [] # List of WorkUnit objects
         self.local_workunit   = None # a workunit executed by main worker
+        self._runtimes        = {} # subtask_key: seconds per workunit
+        self._deviations      = {} # subtask_key: deviation of _runtimes
     
         # others
         self._request_lock = Lock()
@@ -184,7 +188,71 @@ class TaskInstance(AbstractJob):
         return super(TaskInstance, self).__getattribute__(key)
 
     
-    def get_batch(self, size=5):
+    def batch_size(self, subtask_key, size=5, workers=1, duration=None):
+        """
+        Computes the size of the next batch for a subtask.
+
+        When a duration is given and workunit runtimes have been recorded for
+        the subtask, the size is the number of workunits expected to complete
+        in that many seconds.  Otherwise the requested size is used.
+
+        The size is then limited to an equal share of the pending workunits
+        for each worker (guided self-scheduling), so batches shrink as the
+        pending work drains and the last batches finish at about the same
+        time.
+
+        @param subtask_key - subtask the batch is for
+        @param size - size used when the runtime is not known
+        @param workers - number of workers the pending work is shared by
+        @param duration - target runtime of a batch, in seconds
+        """
+        runtime = self._runtimes.get(subtask_key, None)
+        if duration and runtime:
+            size = int(duration / runtime)
+        pending = len(self._worker_requests)
+        share = (pending + workers - 1) / workers
+        return max(1, min(size, share))
+
+    def record_runtime(self, subtask_key, started, completed, size=1):
+        """
+        Records the runtime of a batch of workunits.  Exponential moving
+        averages of the runtime per workunit, and of its deviation from the
+        average, are kept for each subtask.
+
+        @param subtask_key - subtask the workunits belong to
+        @param started - datetime the batch started
+        @param completed - datetime the batch completed
+        @param size - number of workunits in the batch
+        """
+        runtime = seconds(completed - started) / size
+        average = self._runtimes.get(subtask_key, None)
+        if average is None:
+            deviation = runtime / 2
+        else:
+            deviation = self._deviations[subtask_key]
+            deviation += (abs(runtime - average) - deviation) * 0.25
+            runtime = average + (runtime - average) * 0.25
+        self._runtimes[subtask_key] = runtime
+        self._deviations[subtask_key] = deviation
+
+    def runtime_limit(self, subtask_key, factor=3):
+        """
+        Computes the longest a workunit of a subtask is expected to run based
+        on the recorded runtimes.  Workunits running longer than this are
+        stragglers.  The limit is the larger of factor times the average
+        runtime, or the average runtime plus four times its mean deviation.
+
+        @param subtask_key - subtask to compute the limit for
+        @param factor - multiple of the average runtime
+        @returns seconds per workunit, or None if no runtimes were recorded
+        """
+        runtime = self._runtimes.get(subtask_key, None)
+        if runtime is None:
+            return None
+        deviation = self._deviations[subtask_key]
+        return max(runtime * factor, runtime + deviation * 4)
+
+    def get_batch(self, size=5, workers=1, duration=None):
         """
         Gets a batch approximatly the size requested.  Batches may consist
         of individual workunits or slices containing multiple workunits.  Slices
@@ -194,13 +262,17 @@ class TaskInstance(AbstractJob):
         Workunits are stored as a dictionary of lists.  The keys for each list
         are composed of the values common to other subtasks.  The lists contain
         the unique values.
+
+        The size is adjusted by batch_size() using the recorded runtimes of
+        the subtask and the number of workers sharing the pending work.
         """
         job = self.poll_worker_request()
         # if this is the TaskInstance, or only a single workunit, just
         # return it.  It will be faster to deal with just that object
         if job == self or len(self._worker_requests)==1:
             return self.pop_worker_request()
-        
+
+        size = self.batch_size(job.subtask_key, size, workers, duration)
         count = 0
         workunits = []
         while job and count < size:
@@ -209,6 +281,10 @@ class TaskInstance(AbstractJob):
             # break and return the current batch.
             if job.size > (size-count)+(size/4) and count:
                 break
+            # workunits with input on different nodes are not batched
+            # together so the batch can be run where its input is.
+            if count and job.host != workunits[0].host:
+                break
             workunits.append(job)
             count += job.size
             self.pop_worker_request()
@@ -237,6 +313,9 @@ class TaskInstance(AbstractJob):
         2) A task with higher priority should obviously have a higher score.
         3) A task that has been out of worker supply for a long time should
            have a relatively higher score.
+
+        The scheduler ranks tasks using a SchedulingPolicy.  This is the score
+        used by the default PriorityPolicy.
         """
         return (self.priority, self.queued)
 
@@ -268,6 +347,30 @@ class TaskInstance(AbstractJob):
         with self._request_lock:
             self._worker_requests.append(request)
 
+    def requeue_worker_requests(self, requests):
+        """
+        Adds worker requests to the front of the queue.  Used for requests
+        that were already dispatched once and should be run next.
+        """
+        with self._request_lock:
+            self._worker_requests[:0] = requests
+
+    def promote_worker_request(self, hosts):
+        """
+        Moves the first worker request with input on one of the hosts to the
+        front of the queue.
+
+        @param hosts - hosts to look for
+        @returns the request moved, or None if there was no request
+        """
+        with self._request_lock:
+            for i, request in enumerate(self._worker_requests):
+                if getattr(request, 'host', None) in hosts:
+                    del self._worker_requests[i]
+                    self._worker_requests.insert(0, request)
+                    return request
+        return None
+
     def pop_worker_request(self):
         """
         A worker request is a tuple of:
@@ -314,6 +417,11 @@ class WorkUnit(AbstractJob):
     workunit      = models.CharField(max_length=255)
     size          = models.IntegerField(default=1)
 
+    # host storing the input of the workunit and when it was requested.  These
+    # are only used for scheduling and are not saved.
+    host = None
+    requested = None
+
     def __getattribute__(self, key):
         if key == 'task_id':
             return self.task_instance.id
@@ -399,6 +507,19 @@ class Batch(AbstractJob):
         except KeyError:
             self._transmitable[workunit.subtask_key] = [workunit.workunit]
     
+    def remove(self, workunit_key):
+        """
+        Removes a workunit from this batch
+
+        @returns the removed workunit
+        """
+        workunit = self.workunits.pop(workunit_key)
+        self._transmitable[workunit.subtask_key].remove(workunit_key)
+        if not self._transmitable[workunit.subtask_key]:
+            del self._transmitable[workunit.subtask_key]
+        self.size -= workunit.size
+        return workunit
+
     def save(self):
         """
         Saves all workunits contained in this batch
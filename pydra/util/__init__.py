@@ -48,3 +48,51 @@ def makedirs(path):
         else:
             logger.critical("Couldn't create directory %s!" % path)
             raise
+
+def seconds(delta):
+    """
+    Returns the total number of seconds in a timedelta as a float.
+    """
+
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
+class LRUCache(object):
+    """
+    Mapping that holds at most size items. Adding an item to a full cache
+    removes the least recently used item.
+
+    LRUCache is not thread-safe; callers sharing a cache between threads must
+    lock it themselves.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._items = {}
+        self._order = []
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, key):
+        value = self._items[key]
+        self._order.remove(key)
+        self._order.append(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._items:
+            self._order.remove(key)
+        elif len(self._items) >= self.size:
+            del self._items[self._order.pop(0)]
+        self._items[key] = value
+        self._order.append(key)
+
+    def values(self):
+        return self._items.values()
+
+    def clear(self):
+        self._items.clear()
+        del self._order[:]
@@ -11,5 +11,23 @@ class InitTest(unittest.TestCase):
 
         f()
 
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evict(self):
+        cache = pydra.util.LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache["a"], 1)
+        cache["c"] = 3
+        self.assertTrue("a" in cache)
+        self.assertFalse("b" in cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_clear(self):
+        cache = pydra.util.LRUCache(2)
+        cache["a"] = 1
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
 if __name__ == "__main__":
     unittest.main()